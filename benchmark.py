@@ -0,0 +1,813 @@
+import gc
+import os
+import sys
+import json
+import time
+import random
+import statistics
+import argparse
+import subprocess
+import platform
+import tracemalloc
+
+# Запуск без окна
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import super_fighters as sf
+
+STORE_FIELDS = tuple(sf.ProjectileStore.FIELDS)
+
+
+# Мир с заданным числом ботов и пуль игрока, разбросанных по арене
+def make_crowded_world(bot_count, bullet_count, seed=0, speed=0):
+    rng = random.Random(seed)
+    world = sf.World(1, sf.BLUE, seed)
+    world.projectiles.max_capacity = None  # замеры идут и за пределом ёмкости матча
+    world.bots = []
+    for _ in range(bot_count):
+        bot = world.create_bot(rng.uniform(0, sf.WIDTH), rng.uniform(0, sf.HEIGHT), rng.randint(1, 3))
+        bot.health = bot.max_health = 10 ** 9  # боты не умирают во время замера
+        world.bots.append(bot)
+    for i in range(bullet_count):
+        x, y = rng.uniform(0, sf.WIDTH), rng.uniform(0, sf.HEIGHT)
+        angle = rng.uniform(0, sf.math.pi * 2)
+        kind = sf.BULLET_SPINNING if i % 10 == 0 else sf.BULLET_NORMAL
+        world.projectiles.spawn(x, y, sf.math.cos(angle) * speed, sf.math.sin(angle) * speed,
+                                0, sf.BLUE, 7, 0, sf.TEAM_PLAYER, kind, x, y)
+    return world
+
+
+# Сохранение и восстановление снарядов между повторами замера
+def save_store(store):
+    return store.count, {name: getattr(store, name)[:store.count].copy() for name in STORE_FIELDS}
+
+
+def restore_store(store, saved):
+    count, arrays = saved
+    for name in STORE_FIELDS:
+        getattr(store, name)[:count] = arrays[name]
+    store.count = count
+
+
+# Прежняя проверка: каждая пуля против каждого бота через math.sqrt
+def collide_brute_force(bullets, bots):
+    hits = 0
+    for bx, by, radius in bullets:
+        for bot in bots:
+            distance = sf.math.sqrt((bx - bot.x) ** 2 + (by - bot.y) ** 2)
+            if distance < radius + bot.radius:
+                hits += 1
+                break
+    return hits
+
+
+def time_per_frame(func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats
+
+
+def bench_collisions():
+    """Стоимость проверки попаданий за кадр: сетка против полного перебора"""
+    print("Попадания пуль по ботам (мс за кадр, мкс на пулю)")
+    print(f"{'боты':>6} {'пули':>6} | {'сетка, мс':>10} {'мкс/пуля':>9} | {'перебор, мс':>11}")
+    for bot_count in (3, 30, 300, 1000):
+        for bullet_count in (100, 1000, 5000):
+            world = make_crowded_world(bot_count, bullet_count)
+            store = world.projectiles
+            saved = save_store(store)
+            repeats = max(3, 20000 // bullet_count)
+
+            def grid_frame():
+                restore_store(store, saved)
+                store.collide(sf.TEAM_PLAYER, world.bots, world.damage_bot)
+            grid = time_per_frame(grid_frame, repeats)
+
+            # Полный перебор слишком медленный на больших размерах
+            if bot_count * bullet_count <= 300000:
+                bullets = list(zip(saved[1]["x"], saved[1]["y"], saved[1]["radius"]))
+                brute = time_per_frame(lambda: collide_brute_force(bullets, world.bots), 1)
+                brute_text = f"{brute * 1000:11.2f}"
+            else:
+                brute_text = f"{'-':>11}"
+
+            print(f"{bot_count:6d} {bullet_count:6d} | {grid * 1000:10.2f} "
+                  f"{grid / bullet_count * 1e6:9.2f} | {brute_text}")
+
+
+def bench_projectiles():
+    """Полный тик снарядов: полёт, удаление за экраном и попадания по 30 ботам"""
+    print("Тик снарядов при 30 ботах (мс за тик)")
+    print(f"{'снаряды':>8} | {'полёт, мс':>9} {'попадания, мс':>13} {'итого, мс':>9} {'тиков/с':>8}")
+    for bullet_count in (1000, 10000, 30000, 100000):
+        world = make_crowded_world(30, bullet_count, speed=3)
+        store = world.projectiles
+        saved = save_store(store)
+        repeats = max(3, 200000 // bullet_count)
+
+        def move():
+            restore_store(store, saved)
+            store.update(sf.WIDTH, sf.HEIGHT)
+
+        def full_tick():
+            move()
+            store.collide(sf.TEAM_PLAYER, world.bots, world.damage_bot)
+
+        move_time = time_per_frame(move, repeats)
+        tick_time = time_per_frame(full_tick, repeats)
+        print(f"{bullet_count:8d} | {move_time * 1000:9.2f} {(tick_time - move_time) * 1000:13.2f} "
+              f"{tick_time * 1000:9.2f} {1 / tick_time:8.0f}")
+
+
+# Прежняя отрисовка фона: заливка, линии сетки и препятствия каждый кадр
+def draw_arena_immediate(surface, obstacles):
+    surface.fill(sf.BACKGROUND)
+    for x in range(0, sf.WIDTH, 50):
+        sf.pygame.draw.line(surface, sf.GRID_COLOR, (x, 0), (x, sf.HEIGHT), 1)
+    for y in range(0, sf.HEIGHT, 50):
+        sf.pygame.draw.line(surface, sf.GRID_COLOR, (0, y), (sf.WIDTH, y), 1)
+    for obstacle in obstacles:
+        obstacle.draw(surface)
+
+
+def bench_arena():
+    """Отрисовка фона арены: каждый кадр заново против готового слоя"""
+    print("Фон арены (мс за кадр)")
+    world = sf.World(1, sf.BLUE)
+    target = sf.init_display()
+    layer = sf.ArenaLayer()
+    repeats = 500
+    immediate = time_per_frame(lambda: draw_arena_immediate(target, world.obstacles), repeats)
+    cached = time_per_frame(lambda: layer.draw(target, world.obstacle_grid), repeats)
+    print(f"каждый кадр: {immediate * 1000:.3f} мс, готовый слой: {cached * 1000:.3f} мс, "
+          f"экономия {(immediate - cached) * 1000:.3f} мс за кадр, нарисовано кусков: {layer.builds}")
+
+
+def bench_entities():
+    """Отрисовка персонажей и снарядов из кэша спрайтов"""
+    print("Отрисовка из кэша спрайтов (мкс на объект)")
+    world = make_crowded_world(200, 2000)
+    for i, bot in enumerate(world.bots):
+        bot.health = bot.max_health * (i % 10 + 1) / 10  # разная длина полосок здоровья
+    target = sf.init_display()
+    repeats = 30
+
+    def draw_fighters():
+        for bot in world.bots:
+            bot.draw(target)
+
+    fighters = time_per_frame(draw_fighters, repeats)
+    bullets = time_per_frame(lambda: world.projectiles.draw(target), repeats)
+    cache = sf.sprite_cache
+    print(f"персонаж: {fighters / len(world.bots) * 1e6:.1f} мкс, "
+          f"снаряд: {bullets / len(world.projectiles) * 1e6:.2f} мкс, "
+          f"спрайтов в кэше: {len(cache.sprites)}, попаданий: {cache.hits}, промахов: {cache.misses}")
+
+
+# Прежний выбор цели: каждый бот перебирает всех бойцов через math.sqrt
+def choose_targets_scalar(bots, fighters):
+    targets = []
+    for bot in bots:
+        closest_enemy = None
+        closest_distance = float('inf')
+        for player in fighters:
+            if player != bot:
+                distance = sf.math.sqrt((bot.x - player.x) ** 2 + (bot.y - player.y) ** 2)
+                priority_distance = distance * 0.7 if player.player_type == 0 else distance
+                if priority_distance < closest_distance and distance < 400:
+                    closest_distance = priority_distance
+                    closest_enemy = player
+        targets.append(closest_enemy)
+    return targets
+
+
+def bench_perception():
+    """Выбор целей ботами: матрица дистанций против перебора в каждом боте"""
+    print("Восприятие ботов (мс за тик)")
+    print(f"{'боты':>6} | {'матрица, мс':>11} | {'перебор, мс':>11}")
+    for bot_count in (3, 30, 100, 300, 1000):
+        world = make_crowded_world(bot_count, 0)
+        fighters = [world.player] + world.bots
+        repeats = max(3, 3000 // bot_count)
+        batched = time_per_frame(lambda: sf.choose_targets(world.bots, fighters), repeats)
+        if bot_count <= 300:
+            scalar = time_per_frame(lambda: choose_targets_scalar(world.bots, fighters), 3)
+            scalar_text = f"{scalar * 1000:11.2f}"
+        else:
+            scalar_text = f"{'-':>11}"
+        print(f"{bot_count:6d} | {batched * 1000:11.2f} | {scalar_text}")
+
+
+# Прежняя проверка препятствий: каждое препятствие на каждом шаге
+class ObstacleList(list):
+    width = sf.WIDTH
+    height = sf.HEIGHT
+
+    def query(self, min_x, min_y, max_x, max_y):
+        return self
+
+
+def bench_movement():
+    """Движение бойцов среди множества стен: сетка препятствий против перебора"""
+    print("Движение ботов среди стен (мс за тик)")
+    print(f"{'стены':>6} {'боты':>6} | {'сетка, мс':>10} | {'перебор, мс':>11}")
+    for wall_count in (6, 100, 500):
+        rng = random.Random(wall_count)
+        walls = [sf.Obstacle(rng.uniform(0, sf.WIDTH - 60), rng.uniform(0, sf.HEIGHT - 60),
+                             rng.choice((30, 60)), rng.choice((30, 60)), sf.GRID_COLOR)
+                 for _ in range(wall_count)]
+        grid = sf.ObstacleGrid(walls)
+        everything = ObstacleList(walls)
+        for bot_count in (30, 300):
+            world = make_crowded_world(bot_count, 0)
+            moves = [(bot, sf.math.cos(a), sf.math.sin(a))
+                     for bot, a in zip(world.bots, (rng.uniform(0, 6.28) for _ in world.bots))]
+            starts = [(bot.x, bot.y) for bot in world.bots]
+
+            def tick(obstacles):
+                for (bot, dx, dy), (x, y) in zip(moves, starts):
+                    bot.x, bot.y = x, y
+                    bot.move(dx, dy, obstacles)
+
+            repeats = max(3, 3000 // bot_count)
+            with_grid = time_per_frame(lambda: tick(grid), repeats)
+            brute = time_per_frame(lambda: tick(everything), repeats)
+            print(f"{wall_count:6d} {bot_count:6d} | {with_grid * 1000:10.2f} | {brute * 1000:11.2f}")
+
+
+# Прежний снаряд: отдельный объект со словарём атрибутов на каждый выстрел
+class LegacyBullet:
+    def __init__(self, x, y, dx, dy, damage, color, radius):
+        self.x = x
+        self.y = y
+        self.dx = dx
+        self.dy = dy
+        self.damage = damage
+        self.color = color
+        self.radius = radius
+
+
+def legacy_bullet_bytes(count=10000):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    bullets = [LegacyBullet(float(i), float(i), 1.5, 2.5, 10.0, (i % 256, 0, 0), 5.0)
+               for i in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del bullets
+    return used / count
+
+
+def fight_gc_stats(ticks, legacy):
+    """Сборки мусора за тяжёлый бой; legacy - как раньше, объект на каждый выстрел"""
+    scenario = SCENARIOS[1]
+    world, rng = scenario.build()
+    pilot = sf.AutoPilot(0)
+    store = world.projectiles
+    live = []
+    if legacy:
+        spawn = store.spawn
+
+        def spawn_object(x, y, dx, dy, damage, color, radius, *args):
+            spawn(x, y, dx, dy, damage, color, radius, *args)
+            live.append(LegacyBullet(x, y, dx, dy, damage, tuple(color), radius))
+        store.spawn = spawn_object
+
+    pauses = []
+    started = {}
+
+    def on_gc(phase, info):
+        if phase == "start":
+            started["at"] = time.perf_counter()
+        else:
+            pauses.append((info["generation"], time.perf_counter() - started["at"]))
+
+    gc.collect()
+    gc.callbacks.append(on_gc)
+    try:
+        for _ in range(ticks):
+            world.step(pilot.next_input(world))
+            if legacy:
+                # Улетевшие и попавшие снаряды становятся мусором
+                del live[:max(0, len(live) - len(store))]
+    finally:
+        gc.callbacks.remove(on_gc)
+    return pauses, store
+
+
+def bench_memory():
+    """Память на снаряд и паузы сборщика мусора в бою с 200 ботами"""
+    print("Память на снаряд и сборки мусора")
+    print(f"снаряд в массивах: {sf.ProjectileStore.slot_bytes()} байт, "
+          f"прежний объект: {legacy_bullet_bytes():.0f} байт")
+    ticks = 1200
+    print(f"{'вариант':>16} | {'сборок/1000 тиков':>17} {'поколение 2':>11} "
+          f"{'пауз, мс':>9} {'макс., мс':>9}")
+    for legacy in (True, False):
+        pauses, store = fight_gc_stats(ticks, legacy)
+        oldest = sum(1 for generation, _ in pauses if generation == 2)
+        total = sum(pause for _, pause in pauses)
+        longest = max((pause for _, pause in pauses), default=0.0)
+        name = "объекты" if legacy else "массивы"
+        print(f"{name:>16} | {len(pauses) * 1000 / ticks:17.1f} {oldest:11d} "
+              f"{total * 1000:9.2f} {longest * 1000:9.2f}")
+    print(f"хранилище: ёмкость {store.capacity}, пик {store.peak}, "
+          f"перевыделений {store.grows}, не поместилось {store.overflow}")
+
+
+# Запуск игры: от старта процесса до первого кадра меню
+def time_process(args, marker=None):
+    """Секунды от запуска процесса до строки marker (или до его завершения)"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable] + args, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    elapsed = None
+    for line in process.stdout:
+        if marker is not None and line.strip() == marker:
+            elapsed = time.perf_counter() - start
+    process.wait()
+    if elapsed is None:
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def bench_startup(repeats=5):
+    """Время запуска: пустой интерпретатор, импорт модуля, первый кадр меню"""
+    print("Запуск игры (с, медиана из {})".format(repeats))
+    check = ("import super_fighters as sf, pygame; "
+             "print(pygame.display.get_init(), sf.screen is None, sf.stats is None)")
+    output = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+    print(f"после импорта: дисплей открыт {output[-3]}, окно не создано {output[-2]}, "
+          f"статистика не прочитана {output[-1]}")
+    cases = (
+        ("интерпретатор", ["-c", "pass"], None),
+        ("импорт модуля", ["-c", "import super_fighters"], None),
+        ("первый кадр меню", ["super_fighters.py", "--startup-probe"], sf.STARTUP_MARKER),
+    )
+    for name, args, marker in cases:
+        times = sorted(time_process(args, marker) for _ in range(repeats))
+        print(f"{name:>18}: {times[len(times) // 2]:.3f}")
+
+
+# Прежняя отрисовка большой арены: всё подряд, без отсечения по виду
+def draw_world_unculled(surface, world, alpha, camera):
+    offset = camera.offset
+    sf.arena_layer.draw(surface, world.obstacle_grid, offset)
+    for bot in world.bots:
+        bot.draw(surface, alpha, offset)
+    world.player.draw(surface, alpha, offset)
+    store = world.projectiles
+    n = store.count
+    for x, y, radius, color in zip(store.x[:n], store.y[:n], store.radius[:n], store.color[:n].tolist()):
+        sf.blit_centered(surface, sf.sprite_cache.bullet(color, int(radius)),
+                         x - offset[0], y - offset[1])
+
+
+def bench_camera():
+    """Большая арена за камерой: отрисовка только видимого против всего"""
+    print("Арена 3x3 окна, 300 ботов (мс за кадр)")
+    world = sf.World(1, sf.BLUE, 0, width=sf.WIDTH * 3, height=sf.HEIGHT * 3, bot_count=300)
+    pilot = sf.AutoPilot(0)
+    for _ in range(120):
+        world.step(pilot.next_input(world))
+    target = sf.init_display()
+    camera = sf.Camera()
+    camera.follow(world.player.x, world.player.y, world.width, world.height)
+    repeats = 30
+    culled = time_per_frame(lambda: sf.draw_world(target, world, 0.5, camera), repeats)
+    everything = time_per_frame(lambda: draw_world_unculled(target, world, 0.5, camera), repeats)
+    print(f"ботов {len(world.bots)}, снарядов {len(world.projectiles)}: "
+          f"видимое {culled * 1000:.2f} мс, всё {everything * 1000:.2f} мс, "
+          f"кусков фона {len(sf.arena_layer.chunks)}")
+
+
+def bench_ai_scheduler():
+    """Решения ботов на большой арене: каждый тик, по уровням детализации, с бюджетом"""
+    print("Планировщик ИИ: арена 3x3 окна, 300 ботов, 600 тиков")
+    print(f"{'режим':>22} | {'тиков/с':>8} {'ИИ, мс/тик':>10} {'решений/тик':>11} {'отложено/тик':>12}")
+    ticks = 600
+    modes = (
+        ("все каждый тик", None, False),
+        ("уровни детализации", None, True),
+        (f"бюджет {sf.AI_DECISION_BUDGET}", sf.AI_DECISION_BUDGET, True),
+    )
+    for name, budget, lod in modes:
+        world = sf.World(1, sf.BLUE, 0, width=sf.WIDTH * 3, height=sf.HEIGHT * 3, bot_count=300)
+        immortal(world.player)
+        world.ai = sf.AIScheduler(budget, lod)
+        world.timer = sf.PhaseTimer()
+        pilot = sf.AutoPilot(0)
+        start = time.perf_counter()
+        for _ in range(ticks):
+            world.step(pilot.next_input(world))
+        elapsed = time.perf_counter() - start
+        ai_time = world.timer.totals["perception"] + world.timer.totals["bots"]
+        print(f"{name:>22} | {ticks / elapsed:8.0f} {ai_time / ticks * 1000:10.2f} "
+              f"{world.ai.total_decisions / ticks:11.1f} {world.ai.total_deferred / ticks:12.1f}")
+
+
+# Прежнее поведение: боты всегда идут к цели по прямой
+class StraightNavigation(sf.NavigationGrid):
+    def heading(self, bot, target):
+        return None
+
+
+def wall_stuck_share(navigation_class, seeds=5, ticks=1200):
+    """Доля шагов ботов к цели, на которых они упёрлись в стену и не сдвинулись"""
+    moving = stuck = 0
+    for seed in range(seeds):
+        world = sf.World(1, sf.BLUE, seed)
+        immortal(world.player)
+        world.navigation = navigation_class(world.obstacle_grid)
+        pilot = sf.AutoPilot(seed)
+        for _ in range(ticks):
+            world.step(pilot.next_input(world))
+            for bot in world.bots:
+                if not bot.target or not (bot.move_x or bot.move_y):
+                    continue
+                # Упор в край арены и боты, появившиеся внутри стены, не считаем
+                if not (bot.radius < bot.x < world.width - bot.radius and
+                        bot.radius < bot.y < world.height - bot.radius):
+                    continue
+                if any(bot.check_collision(o, bot.x, bot.y) for o in world.obstacles):
+                    continue
+                moving += 1
+                if abs(bot.x - bot.prev_x) + abs(bot.y - bot.prev_y) < 0.5:
+                    stuck += 1
+    return stuck / moving
+
+
+def bench_navigation():
+    """Поля направлений: цена построения и сколько ботов застревает у стен"""
+    print("Поля направлений к целям")
+    for scale in (1, 3):
+        world = sf.World(1, sf.BLUE, 0, width=sf.WIDTH * scale, height=sf.HEIGHT * scale)
+        navigation = world.navigation
+        goals = [navigation.cell(x, world.height / 2)
+                 for x in range(0, world.width, sf.NAV_CELL)]
+        start = time.perf_counter()
+        for goal in goals:
+            navigation.build(goal)
+        per_field = (time.perf_counter() - start) / len(goals)
+        print(f"  арена {scale}x{scale}: сетка {navigation.cols}x{navigation.rows}, "
+              f"поле строится за {per_field * 1000:.2f} мс")
+    print(f"  упор в стену: напрямую {wall_stuck_share(StraightNavigation):.2%}, "
+          f"по полю {wall_stuck_share(sf.NavigationGrid):.2%} шагов к цели")
+
+
+def bench_line_of_sight():
+    """Видимость бойцов друг другу: кэш пар клеток и ответы тика против точной проверки"""
+    print("Прямая видимость: запросы настоящего матча (мкс на запрос)")
+    print(f"{'арена':>6} {'запросов':>9} | {'точно':>7} {'с кэшем':>8} | "
+          f"{'за тик':>7} {'пары':>6} {'без отрезка':>11}")
+    for scale, bot_count in ((1, 3), (3, 300)):
+        world = sf.World(4, sf.BLUE, 0, width=sf.WIDTH * scale, height=sf.HEIGHT * scale,
+                         bot_count=bot_count)
+        immortal(world.player)
+        pilot = sf.AutoPilot(0)
+        # Запросы по тикам: каждый бот к своей цели, каждая турель к каждому боту рядом
+        ticks = []
+        for _ in range(300):
+            world.step(pilot.next_input(world))
+            queries = [(bot.x, bot.y, bot.target.x, bot.target.y) for bot in world.bots if bot.target]
+            queries += [(turret.x, turret.y, bot.x, bot.y)
+                        for turret in world.player.turrets for bot in world.bots
+                        if (bot.x - turret.x) ** 2 + (bot.y - turret.y) ** 2 < sf.Turret.RANGE ** 2]
+            ticks.append(queries)
+        count = sum(len(queries) for queries in ticks)
+
+        start = time.perf_counter()
+        for queries in ticks:
+            for query in queries:
+                sf.segment_clear(world.obstacle_grid, *query)
+        exact = (time.perf_counter() - start) / count
+
+        sight = sf.LineOfSight(world.obstacle_grid)
+        start = time.perf_counter()
+        for queries in ticks:
+            sight.new_tick()
+            for query in queries:
+                sight.visible(*query)
+        cached = (time.perf_counter() - start) / count
+        print(f"{scale}x{scale:<4} {count:9d} | {exact * 1e6:7.2f} {cached * 1e6:8.2f} | "
+              f"{sight.memo_hits / count:7.1%} {sight.pair_hits / count:6.1%} {sight.hit_rate():11.1%}")
+
+
+def legacy_spawn(rng, world):
+    """Прежний выбор места: до 10 случайных точек не ближе 150 к игроку, стены не учитывались"""
+    player = world.player
+    for _ in range(10):
+        x = rng.randint(50, world.width - 50)
+        y = rng.randint(50, world.height - 50)
+        if (x - player.x) ** 2 + (y - player.y) ** 2 > 150 ** 2:
+            return x, y
+    return None
+
+
+def inside_wall(world, x, y, radius=32):
+    return any(sf.math.hypot(max(o.x, min(x, o.x + o.width)) - x,
+                             max(o.y, min(y, o.y + o.height)) - y) < radius
+               for o in world.obstacles)
+
+
+def bench_spawns():
+    """Появление ботов: индекс свободных клеток против случайных попыток"""
+    print("Места появления ботов")
+    print(f"{'арена':>6} {'игрок':>8} | {'попытки, мкс':>12} {'сорвалось':>9} {'в стене':>7} | "
+          f"{'индекс, мкс':>11} {'в стене':>7}")
+    count = 5000
+    for scale in (1, 3):
+        world = sf.World(1, sf.BLUE, 0, width=sf.WIDTH * scale, height=sf.HEIGHT * scale)
+        # Игрок в центре и в углу: в маленькой арене угол оставляет мало места
+        for place, (x, y) in (("центр", (world.width / 2, world.height / 2)), ("угол", (60, 60))):
+            world.player.x, world.player.y = x, y
+            rng = random.Random(0)
+            start = time.perf_counter()
+            legacy = [legacy_spawn(rng, world) for _ in range(count)]
+            legacy_time = (time.perf_counter() - start) / count
+            failed = legacy.count(None)
+            legacy_walls = sum(inside_wall(world, *spot) for spot in legacy if spot)
+
+            rng = random.Random(0)
+            start = time.perf_counter()
+            spots = [world.spawns.sample(rng, x, y) for _ in range(count)]
+            index_time = (time.perf_counter() - start) / count
+            index_walls = sum(inside_wall(world, *spot) for spot in spots)
+            print(f"{scale}x{scale:<4} {place:>8} | {legacy_time * 1e6:12.2f} {failed / count:9.1%} "
+                  f"{legacy_walls / count:7.1%} | {index_time * 1e6:11.2f} {index_walls / count:7.1%}")
+
+    world = sf.World(1, sf.BLUE, 0, width=sf.WIDTH * 3, height=sf.HEIGHT * 3)
+    start = time.perf_counter()
+    world.spawn_wave(500, min_distance=sf.WIDTH / 2)
+    print(f"  волна из 500 ботов за экраном: {(time.perf_counter() - start) * 1000:.2f} мс")
+
+
+def bench_world_state():
+    """Двоичный снимок мира: сохранение и восстановление в зависимости от числа сущностей"""
+    print("Снимок мира (WorldState): сохранение и загрузка в уже созданный мир")
+    print(f"{'боты':>6} {'пули':>6} | {'КБ':>7} | {'сохр., мс':>9} {'МБ/с':>7} | "
+          f"{'загр., мс':>9} {'МБ/с':>7} | {'новый мир, мс':>13}")
+    for bot_count, bullet_count in ((3, 20), (3, 200), (30, 500), (300, 2000), (1000, 8000)):
+        world = make_crowded_world(bot_count, bullet_count)
+        data = sf.WorldState.to_bytes(world)
+        repeats = max(5, 200 // (1 + bot_count // 30))
+        save = time_per_frame(lambda: sf.WorldState.to_bytes(world), repeats)
+        target = sf.World(1, sf.BLUE, 1)
+        load = time_per_frame(lambda: sf.WorldState.from_bytes(data, target), repeats)
+        fresh = time_per_frame(lambda: sf.WorldState.from_bytes(data), max(3, repeats // 10))
+        megabytes = len(data) / 1e6
+        print(f"{bot_count:6d} {bullet_count:6d} | {len(data) / 1024:7.1f} | {save * 1000:9.3f} "
+              f"{megabytes / save:7.0f} | {load * 1000:9.3f} {megabytes / load:7.0f} | {fresh * 1000:13.2f}")
+
+
+def bench_killcam(ticks=300):
+    """Запись повтора killcam: цена записи тика, память и восстановление тиков"""
+    print("Повтор последних секунд (KillCam): запись каждого тика движущегося матча")
+    print(f"{'боты':>6} {'пули':>6} | {'тик, мс':>7} {'запись, мкс':>11} | {'Б/тик':>6} {'сжатие':>6} "
+          f"{'с в бюджете':>11} | {'распаковка, мкс':>15} {'кадр, мс':>8}")
+    surface = sf.pygame.Surface((sf.WIDTH, sf.HEIGHT))
+    for bot_count, bullet_count in ((3, 20), (30, 500), (300, 2000)):
+        world = make_crowded_world(bot_count, bullet_count, speed=2)
+        immortal(world.player)
+        pilot = sf.AutoPilot(0)
+        killcam = sf.KillCam(seconds=ticks / sf.TICK_RATE)
+        step = 0.0
+        for _ in range(ticks):
+            start = time.perf_counter()
+            world.step(pilot.next_input(world))
+            step += time.perf_counter() - start
+            killcam.capture(world)
+        per_tick = killcam.bytes / len(killcam)
+        ratio = killcam.captured_raw / killcam.captured_bytes
+        covered = killcam.budget / per_tick / sf.TICK_RATE
+        decode = time_per_frame(lambda: [killcam.frame(i) for i in range(len(killcam))], 1) / len(killcam)
+        camera = sf.Camera()
+        draw = time_per_frame(lambda: [killcam.draw(surface, i + 0.5, camera) for i in range(0, len(killcam) - 1, 5)],
+                              1) / len(range(0, len(killcam) - 1, 5))
+        print(f"{bot_count:6d} {bullet_count:6d} | {step / ticks * 1000:7.2f} {killcam.capture_cost() * 1e6:11.0f} | "
+              f"{per_tick:6.0f} {ratio:5.1f}x {covered:11.1f} | {decode * 1e6:15.0f} {draw * 1000:8.2f}")
+
+
+# Сценарии полного тика: фиксированное зерно, автопилот и известная нагрузка
+SCENARIO_TICKS = 600
+PHASES = ("input", "player", "perception", "bots", "projectiles", "collisions")
+BASELINE_FILE = "benchmark_baseline.json"
+# Фаза дешевле этого времени на тик считается шумом при сравнении с эталоном
+NOISE_FLOOR = 2e-6
+
+
+def immortal(fighter):
+    fighter.health = fighter.max_health = 10 ** 9
+
+
+class Scenario:
+    """Заранее подготовленный мир и то, что делается с ним перед каждым тиком"""
+
+    def __init__(self, name, player_type, bot_count=None, bullet_count=0, gadgets=False, scale=1):
+        self.name = name
+        self.player_type = player_type
+        self.bot_count = bot_count  # None - обычные три бота
+        self.bullet_count = bullet_count  # сколько пуль игрока держать в воздухе
+        self.gadgets = gadgets  # все турели и мины Гения расставлены
+        self.scale = scale  # арена scale x scale окон
+
+    def build(self, seed=0):
+        world = sf.World(self.player_type, sf.BLUE, seed,
+                         width=sf.WIDTH * self.scale, height=sf.HEIGHT * self.scale)
+        rng = random.Random(seed)
+        if self.bot_count is not None:
+            immortal(world.player)
+            world.bots = []
+            world.bot_hash.clear()
+            for _ in range(self.bot_count):
+                bot = world.create_bot(rng.uniform(0, world.width), rng.uniform(0, world.height),
+                                       rng.randint(1, 3))
+                world.bots.append(bot)
+                world.bot_hash.insert(bot)
+        if self.bullet_count:
+            immortal(world.player)
+        if self.gadgets:
+            player = world.player
+            for i in range(player.max_turrets):
+                angle = i * 2 * sf.math.pi / player.max_turrets
+                player.turrets.append(sf.Turret(
+                    player.x + sf.math.cos(angle) * 60, player.y + sf.math.sin(angle) * 60,
+                    player.bullet_damage * 0.8, sf.CYAN, world.projectiles, player.uid))
+            for i in range(player.max_mines):
+                player.mines.append(sf.Mine(rng.uniform(0, sf.WIDTH), rng.uniform(0, sf.HEIGHT),
+                                            player.bullet_damage * 1.5, sf.CYAN))
+        return world, rng
+
+    def prepare(self, world, rng):
+        """Восполняет нагрузку перед тиком (не входит в замер)"""
+        store = world.projectiles
+        while len(store) < self.bullet_count:
+            angle = rng.uniform(0, sf.math.pi * 2)
+            store.spawn(rng.uniform(0, sf.WIDTH), rng.uniform(0, sf.HEIGHT),
+                        sf.math.cos(angle) * 6, sf.math.sin(angle) * 6,
+                        1, sf.BLUE, 5, world.player.uid, sf.TEAM_PLAYER)
+        if self.gadgets:
+            for mine in world.player.mines:
+                mine.active = True
+
+
+SCENARIOS = (
+    Scenario("1 игрок + 3 бота", 1),
+    Scenario("200 ботов", 1, bot_count=200),
+    Scenario("5000 пуль", 1, bullet_count=5000),
+    Scenario("Гений: все турели и мины", 4, bot_count=30, gadgets=True),
+    Scenario("Арена 3x3 окна, 300 ботов", 1, bot_count=300, scale=3),
+)
+
+
+def run_scenario(scenario, ticks, track_memory=False, seed=0):
+    """Играет ticks тиков сценария и возвращает PhaseTimer"""
+    timer = sf.PhaseTimer(track_memory)
+    world, rng = scenario.build(seed)
+    pilot = sf.AutoPilot(seed)
+    world.timer = timer
+    for _ in range(ticks):
+        if world.over:  # обычный матч может закончиться раньше - начинаем заново
+            world, rng = scenario.build(seed + world.tick)
+            world.timer = timer
+        scenario.prepare(world, rng)
+        world.step(pilot.next_input(world))
+    return timer
+
+
+def measure(scenario, ticks, repeats):
+    """Время на тик по каждой фазе (медиана повторов) и байт на тик"""
+    # Медиана, а не лучший повтор: один удачный прогон эталона не делает
+    # обычные прогоны --check регрессией
+    samples = {phase: [] for phase in PHASES}
+    for _ in range(repeats):
+        totals = run_scenario(scenario, ticks).totals
+        for phase in PHASES:
+            samples[phase].append(totals.get(phase, 0.0) / ticks)
+    median = {phase: statistics.median(samples[phase]) for phase in PHASES}
+    tracemalloc.start()
+    allocated = run_scenario(scenario, ticks // 4, track_memory=True).allocated
+    tracemalloc.stop()
+    total = sum(median.values())
+    return {
+        "phases": median,
+        "total": total,
+        "bytes_per_tick": {phase: allocated.get(phase, 0) / (ticks // 4) for phase in PHASES},
+    }
+
+
+def rate(seconds):
+    return 1 / seconds if seconds > 0 else float("inf")
+
+
+def print_result(name, result):
+    print(f"{name}: {rate(result['total']):.0f} тиков/с ({result['total'] * 1000:.3f} мс на тик)")
+    print(f"  {'фаза':12} {'тиков/с':>10} {'мкс/тик':>9} {'КБ/тик':>8}")
+    for phase in PHASES:
+        seconds = result["phases"][phase]
+        kilobytes = result["bytes_per_tick"][phase] / 1024
+        print(f"  {phase:12} {rate(seconds):10.0f} {seconds * 1e6:9.1f} {kilobytes:8.2f}")
+
+
+def regressions(results, baseline, threshold):
+    """Фазы, замедлившиеся относительно эталона больше чем на threshold"""
+    found = []
+    for name, result in results.items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        checks = list(result["phases"].items()) + [("total", result["total"])]
+        base_times = dict(base["phases"], total=base["total"])
+        for phase, seconds in checks:
+            base_seconds = base_times.get(phase)
+            if base_seconds is None:
+                continue
+            if seconds > base_seconds * (1 + threshold) + NOISE_FLOOR:
+                found.append((name, phase, rate(base_seconds), rate(seconds)))
+    return found
+
+
+def run_suite(args):
+    results = {}
+    for scenario in SCENARIOS:
+        results[scenario.name] = measure(scenario, args.ticks, args.repeats)
+        print_result(scenario.name, results[scenario.name])
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "ticks": args.ticks,
+                "scenarios": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"Эталон сохранён в {args.baseline}")
+    if args.check:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.threshold)
+        for name, phase, before, after in found:
+            print(f"РЕГРЕССИЯ {name} / {phase}: {before:.0f} -> {after:.0f} тиков/с")
+        if found:
+            return 1
+        print(f"Регрессий больше {args.threshold:.0%} нет")
+    return 0
+
+
+def run_micro():
+    bench_collisions()
+    print()
+    bench_projectiles()
+    print()
+    bench_arena()
+    print()
+    bench_entities()
+    print()
+    bench_perception()
+    print()
+    bench_movement()
+    print()
+    bench_memory()
+    print()
+    bench_camera()
+    print()
+    bench_ai_scheduler()
+    print()
+    bench_navigation()
+    print()
+    bench_line_of_sight()
+    print()
+    bench_spawns()
+    print()
+    bench_world_state()
+    print()
+    bench_killcam()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры скорости симуляции по фазам тика")
+    parser.add_argument("--ticks", type=int, default=SCENARIO_TICKS, help="тиков на сценарий")
+    parser.add_argument("--repeats", type=int, default=5, help="повторов (берётся медиана)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="файл эталонных результатов")
+    parser.add_argument("--save-baseline", action="store_true", help="записать результаты как эталон")
+    parser.add_argument("--check", action="store_true",
+                        help="сравнить с эталоном и завершиться с ошибкой при регрессии")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="допустимое замедление фазы (0.25 = 25%%)")
+    parser.add_argument("--micro", action="store_true", help="отдельные замеры компонентов")
+    parser.add_argument("--startup", action="store_true", help="время запуска до первого кадра меню")
+    args = parser.parse_args()
+    if args.startup:
+        bench_startup()
+        return 0
+    if args.micro:
+        run_micro()
+        return 0
+    return run_suite(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
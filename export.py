@@ -0,0 +1,303 @@
+import os
+import sys
+import time
+import zlib
+import queue
+import struct
+import argparse
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Экспорт без окна
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import super_fighters as sf
+
+# Экспорт матча или повтора в кадры PNG или видео без окна. Мир считается и
+# рисуется на поверхности в памяти, а готовые кадры сжимаются в фоновых
+# потоках (zlib отпускает GIL) или уходят по трубе внешнему кодировщику.
+# Пока кадр кодируется, следующий уже считается и рисуется; очередь кадров
+# ограничена, поэтому память не растёт, если кодирование не успевает
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_LEVEL = 3  # уровень zlib: кадры игры сжимаются хорошо и на низких уровнях
+PENDING_PER_WORKER = 2  # сколько кадров может ждать кодирования на один поток
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)))
+
+
+def pixel_layout(surface):
+    """Шаг строки в байтах и места байтов R, G, B в пикселе 32-битной поверхности"""
+    if surface.get_bytesize() != 4:
+        raise ValueError("нужна 32-битная поверхность")
+    shifts = surface.get_shifts()[:3]
+    if sys.byteorder == "little":
+        return surface.get_pitch(), tuple(shift // 8 for shift in shifts)
+    return surface.get_pitch(), tuple(3 - shift // 8 for shift in shifts)
+
+
+def to_rgb(raw, width, height, layout):
+    """Байты поверхности (pixel_layout) в массив RGB height x width x 3"""
+    pitch, channels = layout
+    pixels = np.frombuffer(raw, np.uint8).reshape(height, pitch)[:, :width * 4].reshape(height, width, 4)
+    rgb = np.empty((height, width, 3), np.uint8)
+    for i, channel in enumerate(channels):
+        rgb[:, :, i] = pixels[:, :, channel]
+    return rgb
+
+
+def encode_png(rgb, level=PNG_LEVEL):
+    """PNG из массива RGB. У каждой строки фильтр Up (разница со строкой выше):
+    однотонный фон и сетка становятся нулями и сжимаются быстро"""
+    height, width = rgb.shape[:2]
+    rows = rgb.reshape(height, width * 3)
+    filtered = np.empty((height, width * 3 + 1), np.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = rows[0]
+    np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)  # 8 бит на канал, RGB
+    return (PNG_SIGNATURE + png_chunk(b"IHDR", header) +
+            png_chunk(b"IDAT", zlib.compress(filtered, level)) + png_chunk(b"IEND", b""))
+
+
+class PngSink:
+    """Кадры в папку как frame_00000.png; сжатие в пуле потоков (workers=0 - в том же потоке)"""
+
+    def __init__(self, folder, width, height, workers, level=PNG_LEVEL):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.width = width
+        self.height = height
+        self.level = level
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(workers) if workers else None
+        self.pending = deque()
+        self.frames = 0
+        self.bytes = 0
+        self.encode_time = 0.0  # суммарное время кодирования во всех потоках
+        self.wait_time = 0.0  # сколько экспорт простоял, ожидая кодирования
+
+    def save(self, index, raw, layout):
+        start = time.perf_counter()
+        data = encode_png(to_rgb(raw, self.width, self.height, layout), self.level)
+        with open(os.path.join(self.folder, f"frame_{index:05d}.png"), "wb") as f:
+            f.write(data)
+        return len(data), time.perf_counter() - start
+
+    def collect(self, future):
+        size, elapsed = future.result()  # ошибка записи всплывает здесь
+        self.bytes += size
+        self.encode_time += elapsed
+
+    def write(self, raw, layout):
+        index = self.frames
+        self.frames += 1
+        if self.pool is None:
+            size, elapsed = self.save(index, raw, layout)
+            self.bytes += size
+            self.encode_time += elapsed
+            self.wait_time += elapsed
+            return
+        start = time.perf_counter()
+        while len(self.pending) >= self.workers * PENDING_PER_WORKER:
+            self.collect(self.pending.popleft())
+        self.wait_time += time.perf_counter() - start
+        self.pending.append(self.pool.submit(self.save, index, raw, layout))
+
+    def close(self):
+        start = time.perf_counter()
+        while self.pending:
+            self.collect(self.pending.popleft())
+        if self.pool is not None:
+            self.pool.shutdown()
+        self.wait_time += time.perf_counter() - start
+
+
+class VideoSink:
+    """Сырые кадры RGB по трубе во внешний кодировщик (ffmpeg); в трубу пишет
+    отдельный поток, поэтому экспорт ждёт только при полной очереди"""
+
+    def __init__(self, path, width, height, fps, encoder="ffmpeg"):
+        command = [encoder, "-y", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", f"{fps:g}",
+                   "-i", "-", "-pix_fmt", "yuv420p", path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.path = path
+        self.width = width
+        self.height = height
+        self.frames = 0
+        self.encode_time = 0.0  # перевод в RGB и запись в трубу (кодирование идёт в кодировщике)
+        self.wait_time = 0.0
+        self.error = None
+        self.queue = queue.Queue(maxsize=8)
+        self.thread = threading.Thread(target=self.feed, daemon=True)
+        self.thread.start()
+
+    def feed(self):
+        pipe = self.process.stdin
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                continue  # кодировщик упал: остальные кадры только выбираются из очереди
+            start = time.perf_counter()
+            try:
+                pipe.write(to_rgb(*frame))
+            except OSError as error:
+                self.error = error
+            self.encode_time += time.perf_counter() - start
+        try:
+            pipe.close()
+        except OSError as error:
+            self.error = self.error or error
+
+    def fail(self):
+        code = self.process.wait()
+        raise RuntimeError(f"кодировщик завершился с кодом {code}") from self.error
+
+    def write(self, raw, layout):
+        if self.error is not None:
+            self.fail()
+        start = time.perf_counter()
+        self.queue.put((raw, self.width, self.height, layout))
+        self.wait_time += time.perf_counter() - start
+        self.frames += 1
+
+    def close(self):
+        start = time.perf_counter()
+        self.queue.put(None)
+        self.thread.join()
+        self.process.wait()
+        self.wait_time += time.perf_counter() - start
+        if self.error is not None or self.process.returncode != 0:
+            self.fail()
+
+    @property
+    def bytes(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+
+def render_frame(surface, world, camera, font):
+    """Кадр матча на поверхности в памяти: камера у игрока, мир и интерфейс"""
+    player = world.player
+    camera.follow(player.x, player.y, world.width, world.height)
+    sf.draw_world(surface, world, 1.0, camera)
+    sf.draw_hud(surface, world, font)
+
+
+def export(world, next_input, ticks, sink, every=1, size=None):
+    """Считает до ticks тиков и отдаёт sink каждый every-й кадр; size - размер кадра после масштабирования"""
+    surface = pygame.Surface((sf.WIDTH, sf.HEIGHT), 0, 32)
+    camera = sf.Camera(sf.WIDTH, sf.HEIGHT)
+    font = sf.get_font(28)
+    layout = None
+    timer = sf.PhaseTimer()
+    start = time.perf_counter()
+    timer.start()
+    while world.tick < ticks and not world.over:
+        world.step(next_input(world))
+        timer.mark("simulation")
+        if world.tick % every and not world.over:
+            continue
+        render_frame(surface, world, camera, font)
+        frame = surface if size is None else pygame.transform.smoothscale(surface, size)
+        timer.mark("draw")
+        # Из кадра только копируются байты; в RGB их переводят потоки кодирования
+        if layout is None:
+            layout = pixel_layout(frame)
+        raw = frame.get_buffer().raw
+        timer.mark("grab")
+        sink.write(raw, layout)
+        timer.mark("queue")
+    sink.close()
+    timer.mark("queue")
+    return time.perf_counter() - start, timer.totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт матча или повтора в кадры PNG или видео без окна")
+    parser.add_argument("--replay", help="файл повтора (.sfr); без него играет автопилот")
+    parser.add_argument("--class", dest="player_type", type=int, default=1, choices=(1, 2, 3, 4),
+                        help="класс игрока автопилота")
+    parser.add_argument("--seed", type=int, default=0, help="зерно матча автопилота")
+    parser.add_argument("--arena", type=int, default=1, help="арена NxN окон для автопилота")
+    parser.add_argument("--ticks", type=int,
+                        help="наибольшее число тиков (по умолчанию весь повтор или 10 с автопилота)")
+    parser.add_argument("--every", type=int, default=1, help="кадр раз в столько тиков")
+    parser.add_argument("--scale", type=float, default=1.0, help="масштаб кадра")
+    parser.add_argument("--png", help="папка для кадров PNG")
+    parser.add_argument("--video", help="файл видео (кадры передаются кодировщику)")
+    parser.add_argument("--encoder", default="ffmpeg", help="внешний кодировщик видео")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="потоков сжатия PNG (0 - сжимать в том же потоке)")
+    parser.add_argument("--level", type=int, default=PNG_LEVEL, help="уровень сжатия PNG (0-9)")
+    args = parser.parse_args()
+    if (args.png is None) == (args.video is None):
+        parser.error("нужен ровно один из --png и --video")
+
+    if args.replay:
+        replay = sf.Replay.load(args.replay)
+        world = sf.World(replay.player_type, replay.player_color, replay.seed,
+                         width=replay.width, height=replay.height, bot_count=replay.bot_count)
+        inputs = replay.inputs
+
+        def next_input(world):
+            return sf.PlayerInput.decode(inputs, world.tick * sf.PlayerInput.SIZE)
+        ticks = replay.ticks if args.ticks is None else min(args.ticks, replay.ticks)
+    else:
+        world = sf.World(args.player_type, sf.BLUE, args.seed,
+                         width=sf.WIDTH * args.arena, height=sf.HEIGHT * args.arena,
+                         bot_count=3 * args.arena * args.arena)
+        next_input = sf.AutoPilot(args.seed).next_input
+        ticks = 10 * sf.TICK_RATE if args.ticks is None else args.ticks
+
+    # Видео в yuv420p требует чётных размеров кадра
+    width = round(sf.WIDTH * args.scale) // 2 * 2
+    height = round(sf.HEIGHT * args.scale) // 2 * 2
+    size = None if (width, height) == (sf.WIDTH, sf.HEIGHT) else (width, height)
+    every = max(1, args.every)
+    if args.png:
+        try:
+            sink = PngSink(args.png, width, height, max(0, args.workers), args.level)
+        except OSError as error:
+            print(f"Не удалось создать папку для кадров: {error}")
+            sys.exit(1)
+        target = args.png
+    else:
+        try:
+            sink = VideoSink(args.video, width, height, sf.TICK_RATE / every, args.encoder)
+        except FileNotFoundError:
+            print(f"Кодировщик {args.encoder} не найден; кадры можно выгрузить в PNG (--png)")
+            sys.exit(1)
+        target = args.video
+
+    try:
+        elapsed, phases = export(world, next_input, ticks, sink, every, size)
+    except (RuntimeError, OSError) as error:
+        # RuntimeError - упал кодировщик видео, OSError - не записался кадр PNG
+        print(f"Экспорт прерван: {error}")
+        sys.exit(1)
+    frames = max(sink.frames, 1)
+    print(f"{sink.frames} кадров {width}x{height} за {elapsed:.2f} с: {sink.frames / elapsed:.1f} кадров/с, "
+          f"{sink.bytes / 1e6:.1f} МБ в {target}")
+    print("на кадр: " + ", ".join(f"{phase} {total / frames * 1000:.2f} мс" for phase, total in phases.items()))
+    if args.png:
+        workers = f"{sink.workers} потоках" if sink.workers else "том же потоке"
+        print(f"сжатие PNG в {workers}: {sink.encode_time / frames * 1000:.2f} мс на кадр, "
+              f"экспорт ждал его {sink.wait_time / frames * 1000:.2f} мс на кадр")
+    else:
+        print(f"перевод в RGB и запись в кодировщик в отдельном потоке: {sink.encode_time / frames * 1000:.2f} мс "
+              f"на кадр, экспорт ждал {sink.wait_time / frames * 1000:.2f} мс на кадр")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,530 @@
+import os
+import sys
+import time
+import zlib
+import math
+import random
+import socket
+import struct
+import asyncio
+import argparse
+
+import numpy as np
+
+# Сервер и клиенты без окна
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import super_fighters as sf
+
+# Сервер матча: мир считается только на сервере, клиенты присылают ввод
+# и получают снимки мира. Снимки квантованы (позиции в четвертях пикселя,
+# здоровье в десятых) и передаются разницей с последним снимком, который
+# клиент подтвердил: поля XOR-ятся с тем же объектом в базовом снимке и
+# сжимаются zlib, поэтому неподвижное почти ничего не стоит
+
+PROTOCOL_VERSION = 2
+DEFAULT_PORT = 7777
+SNAPSHOT_EVERY = 2  # снимок раз в столько тиков (30 в секунду)
+HISTORY = 64  # сколько последних снимков хранить для разниц
+MAX_BUFFERED = 256 * 1024  # клиенту с такой очередью на отправку снимок не шлём
+
+# Сообщения: длина (без заголовка) и тип
+FRAME = struct.Struct("<IB")
+MSG_HELLO = 1  # клиент: версия протокола
+MSG_WELCOME = 2  # сервер: номер клиента, роль и параметры матча
+MSG_INPUT = 3  # клиент: номер ввода и PlayerInput.encode()
+MSG_ACK = 4  # клиент: тик полученного снимка
+MSG_SNAPSHOT = 5  # сервер: снимок мира
+MSG_BYE = 6  # сервер: матч окончен
+
+HELLO = struct.Struct("<B")
+WELCOME = struct.Struct("<HBBHHHBB")
+INPUT = struct.Struct("<I")
+ACK = struct.Struct("<I")
+SNAPSHOT = struct.Struct("<IIIHB")  # тик, базовый тик (0 - без базы), последний ввод, убийства, флаги
+BYE = struct.Struct("<IH")
+
+ROLE_PLAYER = 1  # управляет игроком
+ROLE_SPECTATOR = 2
+
+# Квантование
+POSITION_SCALE = 4
+HEALTH_SCALE = 10
+DIRECTION_STEPS = 256
+
+# Виды сущностей снимка: тип номера и поля без номера.
+# Номер - uid бойца (у игрока 0), постоянный номер снаряда,
+# порядковый номер турели или мины
+KINDS = {
+    "fighters": (np.dtype("<u4"), np.dtype([
+        ("type", "u1"), ("x", "<u2"), ("y", "<u2"), ("direction", "u1"), ("health", "<u2"),
+    ])),
+    "bullets": (np.dtype("<u4"), np.dtype([
+        ("x", "<u2"), ("y", "<u2"), ("radius", "u1"), ("team", "u1"), ("kind", "u1"), ("color", "u1", 3),
+    ])),
+    "turrets": (np.dtype("u1"), np.dtype([
+        ("x", "<u2"), ("y", "<u2"), ("health", "u1"),
+    ])),
+    "mines": (np.dtype("u1"), np.dtype([
+        ("x", "<u2"), ("y", "<u2"), ("active", "u1"),
+    ])),
+}
+COUNT = struct.Struct("<H")
+
+
+def quantize_position(values):
+    return np.clip(np.round(np.asarray(values, dtype=np.float64) * POSITION_SCALE), 0, 65535)
+
+
+def quantize_health(values):
+    return np.clip(np.round(np.asarray(values, dtype=np.float64) * HEALTH_SCALE), 0, 65535)
+
+
+class Snapshot:
+    """Квантованное состояние мира на тик: номера и поля по видам сущностей"""
+
+    def __init__(self, tick, kills=0, over=False, input_seq=0):
+        self.tick = tick
+        self.kills = kills
+        self.over = over
+        self.input_seq = input_seq  # последний применённый ввод управляющего клиента
+        self.kinds = {}  # вид -> (номера по возрастанию, поля)
+
+    @classmethod
+    def capture(cls, world, input_seq=0):
+        snapshot = cls(world.tick, world.kills, world.over, input_seq)
+        player = world.player
+
+        fighters = [player] + world.bots
+        ids = np.array([0] + [bot.uid for bot in world.bots], dtype=KINDS["fighters"][0])
+        fields = np.zeros(len(fighters), dtype=KINDS["fighters"][1])
+        fields["type"] = [f.player_type for f in fighters]
+        fields["x"] = quantize_position([f.x for f in fighters])
+        fields["y"] = quantize_position([f.y for f in fighters])
+        fields["direction"] = [round(f.direction % math.tau / math.tau * DIRECTION_STEPS) % DIRECTION_STEPS
+                               for f in fighters]
+        fields["health"] = quantize_health([f.health for f in fighters])
+        snapshot.add("fighters", ids, fields)
+
+        store = world.projectiles
+        n = store.count
+        fields = np.zeros(n, dtype=KINDS["bullets"][1])
+        fields["x"] = quantize_position(store.x[:n])
+        fields["y"] = quantize_position(store.y[:n])
+        fields["radius"] = np.clip(store.radius[:n], 0, 255)
+        fields["team"] = store.team[:n]
+        fields["kind"] = store.kind[:n]
+        fields["color"] = store.color[:n]
+        snapshot.add("bullets", store.id[:n].astype(KINDS["bullets"][0]), fields)
+
+        turrets = getattr(player, "turrets", ())
+        fields = np.zeros(len(turrets), dtype=KINDS["turrets"][1])
+        fields["x"] = quantize_position([t.x for t in turrets])
+        fields["y"] = quantize_position([t.y for t in turrets])
+        fields["health"] = np.clip([t.health for t in turrets], 0, 255)
+        snapshot.add("turrets", np.arange(len(turrets), dtype=KINDS["turrets"][0]), fields)
+
+        mines = getattr(player, "mines", ())
+        fields = np.zeros(len(mines), dtype=KINDS["mines"][1])
+        fields["x"] = quantize_position([m.x for m in mines])
+        fields["y"] = quantize_position([m.y for m in mines])
+        fields["active"] = [m.active for m in mines]
+        snapshot.add("mines", np.arange(len(mines), dtype=KINDS["mines"][0]), fields)
+        return snapshot
+
+    def add(self, kind, ids, fields):
+        order = np.argsort(ids, kind="stable")
+        self.kinds[kind] = (ids[order], fields[order])
+
+    def digest(self):
+        """Контрольная сумма состояния: у сервера и клиента должна совпадать"""
+        crc = zlib.crc32(struct.pack("<IHB", self.tick, self.kills, self.over))
+        for kind in KINDS:
+            ids, fields = self.kinds[kind]
+            crc = zlib.crc32(ids.tobytes(), crc)
+            crc = zlib.crc32(fields.tobytes(), crc)
+        return crc
+
+    def raw_bytes(self):
+        """Размер того же состояния без квантования (по 8 байт на число)"""
+        return sum(len(ids) * (1 + len(fields.dtype.names)) * 8 for ids, fields in self.kinds.values())
+
+
+def aligned(base, kind, ids):
+    """Поля базового снимка для тех же номеров (нули для новых сущностей) в виде байтов"""
+    record = KINDS[kind][1]
+    result = np.zeros((len(ids), record.itemsize), dtype=np.uint8)
+    if base is None:
+        return result
+    base_ids, base_fields = base.kinds[kind]
+    if not len(base_ids) or not len(ids):
+        return result
+    pos = np.minimum(np.searchsorted(base_ids, ids), len(base_ids) - 1)
+    match = base_ids[pos] == ids
+    result[match] = base_fields.view(np.uint8).reshape(-1, record.itemsize)[pos[match]]
+    return result
+
+
+def encode_snapshot(snapshot, base=None):
+    """Тело сообщения MSG_SNAPSHOT: заголовок и сжатая разница с base"""
+    parts = []
+    for kind, (ids, fields) in snapshot.kinds.items():
+        record = KINDS[kind][1]
+        raw = fields.view(np.uint8).reshape(-1, record.itemsize)
+        parts.append(COUNT.pack(len(ids)))
+        parts.append(ids.tobytes())
+        parts.append((raw ^ aligned(base, kind, ids)).tobytes())
+    header = SNAPSHOT.pack(snapshot.tick, base.tick if base else 0, snapshot.input_seq,
+                           snapshot.kills, snapshot.over)
+    return header + zlib.compress(b"".join(parts), 6)
+
+
+def decode_snapshot(body, history):
+    """Восстанавливает снимок; history - уже полученные снимки по тикам"""
+    tick, base_tick, input_seq, kills, over = SNAPSHOT.unpack_from(body)
+    base = history[base_tick] if base_tick else None
+    snapshot = Snapshot(tick, kills, bool(over), input_seq)
+    data = zlib.decompress(body[SNAPSHOT.size:])
+    offset = 0
+    for kind, (id_type, record) in KINDS.items():
+        (count,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        ids = np.frombuffer(data, dtype=id_type, count=count, offset=offset)
+        offset += count * id_type.itemsize
+        delta = np.frombuffer(data, dtype=np.uint8, count=count * record.itemsize, offset=offset)
+        offset += count * record.itemsize
+        raw = delta.reshape(-1, record.itemsize) ^ aligned(base, kind, ids)
+        snapshot.kinds[kind] = (ids.copy(), raw.view(record).reshape(-1))
+    return snapshot
+
+
+def trim_history(history, oldest):
+    """Удаляет снимки старше тика oldest (тики снимков идут не строго через равный шаг)"""
+    for tick in [tick for tick in history if tick < oldest]:
+        del history[tick]
+
+
+async def read_message(reader):
+    length, kind = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return kind, await reader.readexactly(length)
+
+
+def frame(kind, body):
+    return FRAME.pack(len(body), kind) + body
+
+
+def no_delay(writer):
+    """Снимки и ввод уходят сразу, без склейки мелких пакетов"""
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def percentiles(values):
+    if not values:
+        return 0.0, 0.0, 0.0
+    return tuple(float(v) for v in np.percentile(values, (50, 95, 99)))
+
+
+# Подключённый клиент на стороне сервера
+class ClientSlot:
+    def __init__(self, number, role, writer):
+        self.number = number
+        self.role = role
+        self.writer = writer
+        self.ack = 0  # последний подтверждённый тик снимка
+        self.sent = 0  # байт отправлено
+        self.snapshots = 0
+        self.full = 0  # снимков без базы
+        self.dropped = 0  # пропущено из-за переполненной очереди
+
+
+class MatchServer:
+    def __init__(self, world, snapshot_every=SNAPSHOT_EVERY):
+        self.world = world
+        self.snapshot_every = snapshot_every
+        self.clients = []  # подключённые сейчас
+        self.slots = []  # все клиенты матча (для отчёта)
+        self.next_number = 1
+        self.controller = None  # клиент, управляющий игроком
+        self.input = sf.PlayerInput()
+        self.input_seq = 0
+        self.history = {}  # тик -> Snapshot
+        self.digests = {}  # тик -> контрольная сумма (для проверки клиентов)
+        self.tick_times = []  # время тика: симуляция и рассылка
+        self.encode_times = []
+        self.raw_bytes = 0  # то же без квантования и сжатия
+        self.full_bytes = 0  # то же без разниц
+        self.overruns = 0  # тиков дольше 1 / TICK_RATE
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        """Приём одного клиента: приветствие, затем ввод и подтверждения"""
+        no_delay(writer)
+        try:
+            kind, body = await read_message(reader)
+            if kind != MSG_HELLO or HELLO.unpack(body)[0] != PROTOCOL_VERSION:
+                return
+            role = ROLE_PLAYER if self.controller is None else ROLE_SPECTATOR
+            client = ClientSlot(self.next_number, role, writer)
+            self.next_number += 1
+            if role == ROLE_PLAYER:
+                self.controller = client
+            self.clients.append(client)
+            self.slots.append(client)
+            world = self.world
+            writer.write(frame(MSG_WELCOME, WELCOME.pack(
+                client.number, role, world.player_type, world.width, world.height,
+                world.bot_count, sf.TICK_RATE, self.snapshot_every)))
+
+            while True:
+                kind, body = await read_message(reader)
+                if kind == MSG_INPUT and client is self.controller:
+                    (seq,) = INPUT.unpack_from(body)
+                    if seq > self.input_seq:
+                        self.input_seq = seq
+                        latest = sf.PlayerInput.decode(body, INPUT.size)
+                        # Нажатия ждут ближайшего тика, как в main_game: новый
+                        # ввод заменяет движение и прицел, но не отменяет их
+                        latest.shoot |= self.input.shoot
+                        latest.special |= self.input.special
+                        latest.mine |= self.input.mine
+                        self.input = latest
+                elif kind == MSG_ACK:
+                    client.ack = max(client.ack, ACK.unpack(body)[0])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if self.controller is not None and self.controller.writer is writer:
+                self.controller = None
+                self.input = sf.PlayerInput()
+            self.clients = [c for c in self.clients if c.writer is not writer]
+            writer.close()
+
+    def broadcast(self):
+        world = self.world
+        snapshot = Snapshot.capture(world, self.input_seq)
+        self.history[snapshot.tick] = snapshot
+        trim_history(self.history, snapshot.tick - HISTORY * self.snapshot_every)
+        self.digests[snapshot.tick] = snapshot.digest()
+        self.raw_bytes += snapshot.raw_bytes() * len(self.clients)
+
+        start = time.perf_counter()
+        encoded = {}  # одинаковые базы кодируются один раз
+        for client in self.clients:
+            if client.writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                client.dropped += 1
+                continue
+            base = self.history.get(client.ack)
+            key = base.tick if base else 0
+            if key not in encoded:
+                encoded[key] = frame(MSG_SNAPSHOT, encode_snapshot(snapshot, base))
+            message = encoded[key]
+            client.writer.write(message)
+            client.sent += len(message)
+            client.snapshots += 1
+            if base is None:
+                client.full += 1
+        self.encode_times.append(time.perf_counter() - start)
+        # Для отчёта: сколько стоил бы тот же снимок без разницы
+        full = encoded.get(0) or frame(MSG_SNAPSHOT, encode_snapshot(snapshot))
+        self.full_bytes += len(full) * len(self.clients)
+
+    async def run(self, ticks=None, wait_for=1):
+        """Шаги мира в реальном времени; ticks=None - до гибели игрока"""
+        while len(self.clients) < wait_for:
+            await asyncio.sleep(0.01)
+        world = self.world
+        period = 1 / sf.TICK_RATE
+        next_tick = time.perf_counter()
+        while not world.over and (ticks is None or world.tick < ticks):
+            start = time.perf_counter()
+            world.step(self.input)
+            self.input.shoot = self.input.special = self.input.mine = False
+            if world.tick % self.snapshot_every == 0 or world.over:
+                self.broadcast()
+            elapsed = time.perf_counter() - start
+            self.tick_times.append(elapsed)
+            if elapsed > period:
+                self.overruns += 1
+            next_tick += period
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                next_tick = time.perf_counter()  # отстали - не догоняем пачкой тиков
+                await asyncio.sleep(0)
+
+        for client in self.clients:
+            client.writer.write(frame(MSG_BYE, BYE.pack(world.tick, world.kills)))
+        await asyncio.sleep(0.1)
+        self.server.close()
+        await self.server.wait_closed()
+
+    def report(self):
+        seconds = len(self.tick_times) / sf.TICK_RATE
+        p50, p95, p99 = percentiles(self.tick_times)
+        e50, e95, _ = percentiles(self.encode_times)
+        ending = "игрок погиб" if self.world.over else "лимит тиков"
+        print(f"Сервер: {len(self.tick_times)} тиков ({ending}), тик p50/p95/p99 "
+              f"{p50 * 1000:.2f} / {p95 * 1000:.2f} / {p99 * 1000:.2f} мс, "
+              f"дольше {1000 / sf.TICK_RATE:.1f} мс: {self.overruns}")
+        print(f"  кодирование снимков p50/p95 {e50 * 1000:.2f} / {e95 * 1000:.2f} мс")
+        total = sum(client.sent for client in self.slots) or 1
+        print(f"  отправлено {total / 1024:.0f} КБ; полными снимками было бы {self.full_bytes / 1024:.0f} КБ "
+              f"({self.full_bytes / total:.1f}x), без квантования и сжатия {self.raw_bytes / 1024:.0f} КБ "
+              f"({self.raw_bytes / total:.1f}x)")
+        for client in self.slots:
+            role = "игрок" if client.role == ROLE_PLAYER else "зритель"
+            print(f"  клиент {client.number} ({role}): {client.sent * 8 / 1000 / max(seconds, 1e-9):.1f} кбит/с, "
+                  f"снимков {client.snapshots} (полных {client.full}), "
+                  f"в среднем {client.sent / max(client.snapshots, 1):.0f} байт, пропущено {client.dropped}")
+
+
+# Управление игроком по снимку: держит дистанцию до ближайшего бота и стреляет в него
+def pilot_input(snapshot, rng):
+    ids, fighters = snapshot.kinds["fighters"]
+    if len(ids) < 2 or ids[0] != 0:
+        return sf.PlayerInput()
+    xs = fighters["x"].astype(np.float64) / POSITION_SCALE
+    ys = fighters["y"].astype(np.float64) / POSITION_SCALE
+    distance = np.hypot(xs[1:] - xs[0], ys[1:] - ys[0])
+    nearest = int(np.argmin(distance)) + 1
+    aim = math.atan2(ys[nearest] - ys[0], xs[nearest] - xs[0])
+    towards = 1 if distance[nearest - 1] > 300 else -1 if distance[nearest - 1] < 150 else 0
+    dx = round(math.cos(aim) * towards) if towards else rng.choice((-1, 0, 1))
+    dy = round(math.sin(aim) * towards) if towards else rng.choice((-1, 0, 1))
+    return sf.PlayerInput(dx, dy, aim, shoot=True, special=rng.random() < 0.02)
+
+
+class HeadlessClient:
+    """Клиент без окна: восстанавливает снимки, подтверждает их и (если управляет) шлёт ввод"""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.role = None
+        self.number = None
+        self.snapshot_every = SNAPSHOT_EVERY
+        self.history = {}  # тик -> Snapshot
+        self.digests = {}  # тик -> контрольная сумма
+        self.received = 0  # байт получено
+        self.snapshots = 0
+        self.input_sent = {}  # номер ввода -> время отправки
+        self.round_trips = []  # от ввода до снимка, в котором он применён
+        self.seq = 0
+        self.result = None  # (тик, убийства) из MSG_BYE
+
+    async def run(self, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        no_delay(writer)
+        writer.write(frame(MSG_HELLO, HELLO.pack(PROTOCOL_VERSION)))
+        kind, body = await read_message(reader)
+        welcome = WELCOME.unpack(body)
+        self.number, self.role = welcome[:2]
+        self.snapshot_every = welcome[-1]
+        try:
+            while True:
+                kind, body = await read_message(reader)
+                self.received += FRAME.size + len(body)
+                if kind == MSG_BYE:
+                    self.result = BYE.unpack(body)
+                    break
+                if kind != MSG_SNAPSHOT:
+                    continue
+                snapshot = decode_snapshot(body, self.history)
+                now = time.perf_counter()
+                self.snapshots += 1
+                self.history[snapshot.tick] = snapshot
+                trim_history(self.history, snapshot.tick - 2 * HISTORY * self.snapshot_every)
+                self.digests[snapshot.tick] = snapshot.digest()
+                for seq in [s for s in self.input_sent if s <= snapshot.input_seq]:
+                    self.round_trips.append(now - self.input_sent.pop(seq))
+                writer.write(frame(MSG_ACK, ACK.pack(snapshot.tick)))
+                if self.role == ROLE_PLAYER and not snapshot.over:
+                    self.seq += 1
+                    self.input_sent[self.seq] = now
+                    writer.write(frame(MSG_INPUT, INPUT.pack(self.seq) + pilot_input(snapshot, self.rng).encode()))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+
+    def report(self):
+        role = "игрок" if self.role == ROLE_PLAYER else "зритель"
+        line = f"  клиент {self.number} ({role}): снимков {self.snapshots}, {self.received / 1024:.0f} КБ"
+        if self.round_trips:
+            p50, p95, p99 = percentiles(self.round_trips)
+            line += f", ввод до снимка p50/p95/p99 {p50 * 1000:.1f} / {p95 * 1000:.1f} / {p99 * 1000:.1f} мс"
+        print(line)
+
+
+async def run_local(args):
+    """Сервер и несколько клиентов без окна на localhost"""
+    world = sf.World(args.player_type, sf.BLUE, args.seed, width=sf.WIDTH * args.arena,
+                     height=sf.HEIGHT * args.arena, bot_count=args.bots)
+    server = MatchServer(world, args.snapshot_every)
+    port = await server.start("127.0.0.1", 0)
+    clients = [HeadlessClient(i) for i in range(args.clients)]
+    tasks = [asyncio.create_task(client.run("127.0.0.1", port)) for client in clients]
+    await server.run(args.ticks, wait_for=args.clients)
+    server.report()
+    await asyncio.gather(*tasks)
+
+    print("Клиенты:")
+    mismatches = 0
+    for client in clients:
+        client.report()
+        mismatches += sum(server.digests.get(tick) != digest for tick, digest in client.digests.items())
+    print(f"Снимков с расхождением сервер/клиент: {mismatches}")
+    return 1 if mismatches else 0
+
+
+async def run_server(args):
+    world = sf.World(args.player_type, sf.BLUE, args.seed, width=sf.WIDTH * args.arena,
+                     height=sf.HEIGHT * args.arena, bot_count=args.bots)
+    server = MatchServer(world, args.snapshot_every)
+    port = await server.start(args.host, args.port)
+    print(f"Сервер слушает {args.host}:{port}, ждём клиента")
+    await server.run(args.ticks)
+    server.report()
+    return 0
+
+
+async def run_client(args):
+    host, _, port = args.connect.rpartition(":")
+    client = HeadlessClient(args.seed)
+    await client.run(host or "127.0.0.1", int(port or DEFAULT_PORT))
+    client.report()
+    if client.result:
+        print(f"Матч окончен на тике {client.result[0]}, убийств {client.result[1]}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер матча и клиенты без окна")
+    parser.add_argument("--serve", action="store_true", help="только сервер на --host:--port")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="только клиент без окна")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--clients", type=int, default=4, help="клиентов в проверке на localhost")
+    parser.add_argument("--ticks", type=int, default=600, help="длина матча в тиках")
+    parser.add_argument("--player-type", type=int, default=4, help="класс игрока 1-4")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--arena", type=int, default=1, help="арена N x N окон")
+    parser.add_argument("--bots", type=int, default=3)
+    parser.add_argument("--snapshot-every", type=int, default=SNAPSHOT_EVERY, help="снимок раз в N тиков")
+    args = parser.parse_args()
+
+    if args.connect:
+        return asyncio.run(run_client(args))
+    if args.serve:
+        return asyncio.run(run_server(args))
+    return asyncio.run(run_local(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,14 +4,30 @@ import random
 import math
 import json
 import os
-
-# Инициализация Pygame
-pygame.init()
+import queue
+import atexit
+import sqlite3
+import struct
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import OrderedDict, deque
+import numpy as np
 
 # Настройки окна
 WIDTH, HEIGHT = 1000, 700
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("super fighters")
+# Окно игры; открывается в init_display(), импорт модуля ничего не запускает
+screen = None
+
+# Симуляция: фиксированное число тиков в секунду. Все скорости
+# и перезарядки в игре заданы на один тик
+TICK_RATE = 60
+TICK_SECONDS = 1 / TICK_RATE
+# Самый длинный кадр, который симуляция догоняет (иначе игра замедляется)
+MAX_FRAME_TIME = 0.25
+# Ограничение частоты кадров отрисовки (0 - без ограничения)
+RENDER_FPS = 144
 
 # Цвета
 BACKGROUND = (40, 44, 52)
@@ -28,24 +44,273 @@ BLACK = (30, 30, 30)
 GRAY = (120, 120, 120)
 LIGHT_BLUE = (100, 200, 255)
 
-# Файл для сохранения статистики
-STATS_FILE = "brawl_stats.json"
+def init_display():
+    """Открывает окно игры при первом вызове и возвращает его"""
+    global screen
+    if screen is None:
+        pygame.display.init()
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("super fighters")
+    return screen
 
-# Класс для управления статистикой
-class GameStats:
+# Общие шрифты: один объект на каждый размер
+fonts = {}
+
+def get_font(size):
+    """Возвращает системный шрифт нужного размера, создавая его один раз"""
+    font = fonts.get(size)
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = fonts[size] = pygame.font.SysFont(None, size)
+    return font
+
+# Кэш отрисованных надписей (LRU)
+class TextCache:
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()  # (шрифт, текст, цвет) -> поверхность
+        self.hits = 0
+        self.misses = 0
+    
+    def render(self, font, text, color):
+        key = (font, text, tuple(color))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)  # выбрасываем самую старую надпись
+        return surface
+    
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+
+# Глобальный кэш надписей
+text_cache = TextCache()
+
+def render_text(font, text, color):
+    """Отрисовывает надпись со сглаживанием через общий кэш"""
+    return text_cache.render(font, text, color)
+
+# Кэш заранее отрисованных спрайтов персонажей, снарядов, мин и турелей
+class SpriteCache:
+    # Сколько направлений взгляда различается при отрисовке
+    DIRECTION_STEPS = 64
+    # Прозрачный цвет: копирование с colorkey быстрее попиксельной альфы
+    COLORKEY = (255, 0, 255)
+    
     def __init__(self):
+        self.sprites = {}  # ключ -> поверхность
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key, build):
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = build(*key[1:])
+        sprite.set_colorkey(self.COLORKEY, pygame.RLEACCEL)
+        # Формат экрана ускоряет копирование, если окно уже открыто
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert()
+        self.sprites[key] = sprite
+        return sprite
+    
+    def clear(self):
+        self.sprites.clear()
+        self.hits = 0
+        self.misses = 0
+    
+    @classmethod
+    def canvas(cls, extent):
+        """Прозрачная поверхность с центром в точке (extent, extent)"""
+        sprite = pygame.Surface((extent * 2 + 1, extent * 2 + 1))
+        sprite.fill(cls.COLORKEY)
+        return sprite
+    
+    def fighter(self, color, radius, genius, direction):
+        """Тело персонажа с глазами (или очками Гения)"""
+        if genius:
+            step = 0  # очки не поворачиваются
+        else:
+            step = round(direction / (math.pi * 2) * self.DIRECTION_STEPS) % self.DIRECTION_STEPS
+        return self.get(("fighter", tuple(color), radius, genius, step), self.build_fighter)
+    
+    def build_fighter(self, color, radius, genius, step):
+        extent = radius + 1
+        sprite = self.canvas(extent)
+        c = extent
+        pygame.draw.circle(sprite, color, (c, c), radius)
+        
+        if genius:
+            # Очки
+            glasses_width = radius * 1.5
+            glasses_height = radius // 2
+            pygame.draw.rect(sprite, BLACK,
+                            (c - glasses_width//2, c - radius//3,
+                             glasses_width, glasses_height), 2)
+            # Линзы очков
+            pygame.draw.circle(sprite, LIGHT_BLUE,
+                             (int(c - glasses_width//4), int(c - radius//6)), radius//4)
+            pygame.draw.circle(sprite, LIGHT_BLUE,
+                             (int(c + glasses_width//4), int(c - radius//6)), radius//4)
+        else:
+            direction = step * math.pi * 2 / self.DIRECTION_STEPS
+            # Глаз
+            eye_x = c + math.cos(direction) * (radius * 0.6)
+            eye_y = c + math.sin(direction) * (radius * 0.6)
+            pygame.draw.circle(sprite, WHITE, (int(eye_x), int(eye_y)), radius // 4)
+            # Зрачок
+            pupil_x = eye_x + math.cos(direction) * (radius // 8)
+            pupil_y = eye_y + math.sin(direction) * (radius // 8)
+            pygame.draw.circle(sprite, BLACK, (int(pupil_x), int(pupil_y)), radius // 8)
+        return sprite
+    
+    def health_bar(self, width, height, ratio, color=None):
+        """Полоска здоровья; без color цвет зависит от запаса здоровья"""
+        if color is None:
+            color = GREEN if ratio > 0.5 else YELLOW if ratio > 0.25 else RED
+        filled = max(0, min(width, int(width * ratio)))
+        return self.get(("health", width, height, filled, color), self.build_health_bar)
+    
+    def build_health_bar(self, width, height, filled, color):
+        bar = pygame.Surface((width, height))
+        bar.fill(BLACK)
+        if filled:
+            bar.fill(color, (0, 0, filled, height))
+        return bar
+    
+    def bullet(self, color, radius):
+        return self.get(("bullet", tuple(color), radius), self.build_bullet)
+    
+    def build_bullet(self, color, radius):
+        sprite = self.canvas(radius + 1)
+        c = radius + 1
+        pygame.draw.circle(sprite, color, (c, c), radius)
+        # Эффект свечения
+        pygame.draw.circle(sprite, WHITE, (c, c), radius // 2)
+        return sprite
+    
+    def mine(self, color, radius, lit):
+        return self.get(("mine", tuple(color), radius, lit), self.build_mine)
+    
+    def build_mine(self, color, radius, lit):
+        sprite = self.canvas(radius + 1)
+        c = radius + 1
+        outer, inner = (color, YELLOW) if lit else (YELLOW, color)
+        pygame.draw.circle(sprite, outer, (c, c), radius)
+        pygame.draw.circle(sprite, inner, (c, c), radius // 2)
+        return sprite
+    
+    def turret(self, color, radius):
+        return self.get(("turret", tuple(color), radius), self.build_turret)
+    
+    def build_turret(self, color, radius):
+        extent = max(radius, 10) + 1
+        sprite = self.canvas(extent)
+        c = extent
+        # Основание турели
+        pygame.draw.circle(sprite, color, (c, c), radius)
+        # Верхняя часть
+        pygame.draw.rect(sprite, (color[0]//2, color[1]//2, color[2]//2), (c - 10, c - 10, 20, 20))
+        return sprite
+
+# Глобальный кэш спрайтов
+sprite_cache = SpriteCache()
+
+def blit_centered(surface, sprite, x, y):
+    """Рисует спрайт так, чтобы его центр оказался в точке (x, y)"""
+    surface.blit(sprite, (int(x) - sprite.get_width() // 2, int(y) - sprite.get_height() // 2))
+
+# Боец в точке вида (x, y): тело, полоска здоровья (health - его доля) и имя
+def draw_fighter(surface, x, y, color, radius, genius, direction, health, name):
+    # Тело с глазами или очками
+    body = sprite_cache.fighter(color, radius, genius, direction)
+    blit_centered(surface, body, x, y)
+    
+    # Полоска здоровья
+    health_width = 50
+    health_x = x - health_width // 2
+    health_y = y - radius - 15
+    bar = sprite_cache.health_bar(health_width, 6, health)
+    surface.blit(bar, (int(health_x), int(health_y)))
+    
+    # Имя или тип
+    name_text = render_text(get_font(20), name, WHITE)
+    surface.blit(name_text, (x - name_text.get_width() // 2, y + radius + 5))
+
+# Файл для сохранения статистики (SQLite) и прежний файл JSON для переноса
+STATS_FILE = "brawl_stats.db"
+LEGACY_STATS_FILE = "brawl_stats.json"
+
+# Класс для управления статистикой.
+# На диске - снимок статистики и журнал сыгранных после него матчей. Запись идёт
+# в отдельном потоке пачками, каждая пачка - одна транзакция SQLite (WAL).
+# Журнал периодически сворачивается в снимок, поэтому загрузка не зависит
+# от числа сыгранных матчей
+class GameStats:
+    COMPACT_EVERY = 100  # матчей в журнале до сворачивания в снимок
+    
+    def __init__(self, path=STATS_FILE, legacy_path=LEGACY_STATS_FILE):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.jobs = queue.Queue()  # задания для потока записи
+        self.writer = None
         self.stats = self.load_stats()
+        atexit.register(self.close)
         
     def load_stats(self):
-        """Загружает статистику из файла"""
-        if os.path.exists(STATS_FILE):
+        """Загружает снимок и журнал после него"""
+        if os.path.exists(self.path):
+            try:
+                connection = self.connect()
+                try:
+                    return self.read(connection)
+                finally:
+                    connection.close()
+            except sqlite3.DatabaseError as error:
+                # Повреждённый файл не удаляем молча, а откладываем в сторону
+                broken = self.path + ".broken"
+                print(f"Файл статистики повреждён ({error}), сохранён как {broken}")
+                os.replace(self.path, broken)
+            # Прежний JSON уже перенесён в базу; второй раз его не переносим
+            return self.create_default_stats()
+        
+        # Перенос статистики из прежнего файла JSON
+        if os.path.exists(self.legacy_path):
             try:
-                with open(STATS_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return self.create_default_stats()
+                with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                    stats = json.load(f)
+            except (OSError, ValueError) as error:
+                print(f"Не удалось прочитать {self.legacy_path}: {error}")
+            else:
+                self.migrate(stats)
+                return stats
         return self.create_default_stats()
     
+    def migrate(self, stats):
+        """Записывает перенесённую статистику сразу и убирает прежний JSON"""
+        try:
+            connection = self.connect()
+            try:
+                with connection:
+                    self.write_snapshot(connection, json.dumps(stats, ensure_ascii=False))
+            finally:
+                connection.close()
+            os.replace(self.legacy_path, self.legacy_path + ".migrated")
+        except (sqlite3.Error, OSError) as error:
+            print(f"Не удалось перенести {self.legacy_path}: {error}")
+    
     def create_default_stats(self):
         """Создает статистику по умолчанию"""
         return {
@@ -62,35 +327,114 @@ class GameStats:
             }
         }
     
+    def connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot (id INTEGER PRIMARY KEY CHECK (id = 1), data TEXT NOT NULL)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS games (id INTEGER PRIMARY KEY, player_type INTEGER NOT NULL, "
+            "kills INTEGER NOT NULL)"
+        )
+        return connection
+    
+    def read(self, connection):
+        """Снимок плюс матчи из журнала"""
+        row = connection.execute("SELECT data FROM snapshot WHERE id = 1").fetchone()
+        stats = json.loads(row[0]) if row else self.create_default_stats()
+        for player_type, kills in connection.execute("SELECT player_type, kills FROM games ORDER BY id"):
+            self.apply_game(stats, kills, player_type)
+        return stats
+    
     def save_stats(self):
-        """Сохраняет статистику в файл"""
-        try:
-            with open(STATS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.stats, f, ensure_ascii=False, indent=2)
-        except:
-            print("Ошибка сохранения статистики")
+        """Ставит в очередь запись полного снимка статистики"""
+        self.enqueue(("snapshot", json.dumps(self.stats, ensure_ascii=False)))
     
-    def add_kills(self, kills, player_type):
-        """Добавляет убийства в статистику"""
-        self.stats["total_kills"] += kills
-        self.stats["games_played"] += 1
-        self.stats["best_score"] = max(self.stats["best_score"], kills)
+    def enqueue(self, job):
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.write_loop, name="stats-writer", daemon=True)
+            self.writer.start()
+        self.jobs.put(job)
+    
+    def write_loop(self):
+        """Поток записи: всё, что накопилось в очереди, пишется одной транзакцией"""
+        connection = self.connect()
+        running = True
+        while running:
+            batch = [self.jobs.get()]
+            while True:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with connection:
+                    for job in batch:
+                        if job is None:  # сигнал завершения
+                            running = False
+                        elif job[0] == "snapshot":
+                            self.write_snapshot(connection, job[1])
+                        else:
+                            connection.execute("INSERT INTO games (player_type, kills) VALUES (?, ?)", job[1])
+                self.compact(connection)
+            except sqlite3.Error as error:
+                print(f"Ошибка сохранения статистики: {error}")
+            for _ in batch:
+                self.jobs.task_done()
+        connection.close()
+    
+    def write_snapshot(self, connection, data):
+        connection.execute("INSERT OR REPLACE INTO snapshot (id, data) VALUES (1, ?)", (data,))
+        connection.execute("DELETE FROM games")
+    
+    def compact(self, connection):
+        """Сворачивает журнал в снимок, когда он становится длинным"""
+        count = connection.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+        if count < self.COMPACT_EVERY:
+            return
+        with connection:
+            stats = self.read(connection)
+            self.write_snapshot(connection, json.dumps(stats, ensure_ascii=False))
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    def flush(self):
+        """Ждёт, пока всё поставленное в очередь окажется на диске"""
+        if self.writer is not None:
+            self.jobs.join()
+    
+    def close(self):
+        """Дописывает очередь и останавливает поток записи"""
+        if self.writer is not None:
+            self.jobs.put(None)
+            self.writer.join()
+            self.writer = None
+    
+    def apply_game(self, stats, kills, player_type):
+        """Учитывает один матч в словаре статистики"""
+        stats["total_kills"] += kills
+        stats["games_played"] += 1
+        stats["best_score"] = max(stats["best_score"], kills)
         
         # Обновляем прогресс разблокировки Гения
-        if not self.stats["unlocked_genius"]:
-            self.stats["genius_unlock_progress"] += kills
-            if self.stats["genius_unlock_progress"] >= 10:
-                self.stats["unlocked_genius"] = True
+        if not stats["unlocked_genius"]:
+            stats["genius_unlock_progress"] += kills
+            if stats["genius_unlock_progress"] >= 10:
+                stats["unlocked_genius"] = True
         
         # Обновляем статистику по классам
         class_key = str(player_type)
-        if class_key in self.stats["class_stats"]:
-            self.stats["class_stats"][class_key]["kills"] += kills
-            self.stats["class_stats"][class_key]["games"] += 1
+        if class_key in stats["class_stats"]:
+            stats["class_stats"][class_key]["kills"] += kills
+            stats["class_stats"][class_key]["games"] += 1
         else:
-            self.stats["class_stats"][class_key] = {"kills": kills, "games": 1}
-        
-        self.save_stats()
+            stats["class_stats"][class_key] = {"kills": kills, "games": 1}
+    
+    def add_kills(self, kills, player_type):
+        """Добавляет убийства в статистику; на диск матч попадает в фоне"""
+        self.apply_game(self.stats, kills, player_type)
+        self.enqueue(("game", (player_type, kills)))
     
     def get_unlock_progress(self):
         """Возвращает прогресс разблокировки Гения"""
@@ -103,14 +447,22 @@ class GameStats:
         self.stats = self.create_default_stats()
         self.save_stats()
 
-# Глобальный объект статистики
-stats = GameStats()
+# Глобальный объект статистики; читается с диска при первом get_stats()
+stats = None
+
+def get_stats():
+    global stats
+    if stats is None:
+        stats = GameStats()
+    return stats
 
 # Класс игрока
 class Player:
-    def __init__(self, x, y, color, player_type=0):
+    def __init__(self, x, y, color, player_type=0, projectiles=None):
         self.x = x
         self.y = y
+        self.prev_x = x  # позиция до последнего тика (для плавной отрисовки)
+        self.prev_y = y
         self.color = color
         self.player_type = player_type  # 0 - игрок, 1-3 - боты разных типов, 4 - Гений
         self.radius = 25
@@ -120,7 +472,10 @@ class Player:
         self.direction = 0  # угол в радианах
         self.cooldown = 0
         self.cooldown_max = 20  # задержка между выстрелами
-        self.bullets = []
+        # Общее хранилище снарядов (у мира оно одно на всех)
+        self.projectiles = projectiles if projectiles is not None else ProjectileStore()
+        self.uid = 0  # номер владельца снарядов
+        self.team = TEAM_PLAYER
         self.special_cooldown = 0
         self.special_cooldown_max = 100  # задержка для спец-атаки
         
@@ -179,68 +534,34 @@ class Player:
             self.bullet_radius = 7
             self.name = "Игрок"
     
-    def draw(self, surface):
-        # Тело игрока
-        pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
-        
-        # Уникальный вид для Гения
-        if self.player_type == 4:
-            # Очки
-            glasses_width = self.radius * 1.5
-            glasses_height = self.radius // 2
-            pygame.draw.rect(surface, BLACK, 
-                            (self.x - glasses_width//2, self.y - self.radius//3, 
-                             glasses_width, glasses_height), 2)
-            # Линзы очков
-            pygame.draw.circle(surface, LIGHT_BLUE, 
-                             (int(self.x - glasses_width//4), int(self.y - self.radius//6)), 
-                             self.radius//4)
-            pygame.draw.circle(surface, LIGHT_BLUE, 
-                             (int(self.x + glasses_width//4), int(self.y - self.radius//6)), 
-                             self.radius//4)
-        else:
-            # Глаза для обычных персонажей
-            eye_x = self.x + math.cos(self.direction) * (self.radius * 0.6)
-            eye_y = self.y + math.sin(self.direction) * (self.radius * 0.6)
-            pygame.draw.circle(surface, WHITE, (int(eye_x), int(eye_y)), self.radius // 4)
-            
-            # Зрачок
-            pupil_x = eye_x + math.cos(self.direction) * (self.radius // 8)
-            pupil_y = eye_y + math.sin(self.direction) * (self.radius // 8)
-            pygame.draw.circle(surface, BLACK, (int(pupil_x), int(pupil_y)), self.radius // 8)
-        
-        # Полоска здоровья
-        health_width = 50
-        health_height = 6
-        health_x = self.x - health_width // 2
-        health_y = self.y - self.radius - 15
-        
-        # Фон полоски здоровья
-        pygame.draw.rect(surface, BLACK, (health_x, health_y, health_width, health_height))
-        
-        # Сама полоска здоровья
-        health_ratio = self.health / self.max_health
-        health_color = GREEN if health_ratio > 0.5 else YELLOW if health_ratio > 0.25 else RED
-        pygame.draw.rect(surface, health_color, 
-                        (health_x, health_y, int(health_width * health_ratio), health_height))
-        
-        # Имя или тип
-        font = pygame.font.SysFont(None, 20)
-        name_text = font.render(self.name, True, WHITE)
-        surface.blit(name_text, (self.x - name_text.get_width() // 2, self.y + self.radius + 5))
-    
-    def move(self, dx, dy, obstacles):
+    def draw(self, surface, alpha=1.0, offset=(0, 0)):
+        # Позиция между двумя последними тиками (offset - левый верхний угол вида)
+        x = self.prev_x + (self.x - self.prev_x) * alpha - offset[0]
+        y = self.prev_y + (self.y - self.prev_y) * alpha - offset[1]
+        draw_fighter(surface, x, y, self.color, self.radius, self.player_type == 4, self.direction,
+                     self.health / self.max_health, self.name)
+    
+    def move(self, dx, dy, obstacle_grid):
         # Рассчитываем новую позицию
-        new_x = self.x + dx * self.speed
-        new_y = self.y + dy * self.speed
-        
-        # Проверка границ экрана (не даём выйти за пределы)
-        new_x = max(self.radius, min(new_x, WIDTH - self.radius))
-        new_y = max(self.radius, min(new_y, HEIGHT - self.radius))
+        step_x = self.x + dx * self.speed
+        step_y = self.y + dy * self.speed
+        
+        # Проверка границ арены (не даём выйти за пределы)
+        width = obstacle_grid.width
+        height = obstacle_grid.height
+        new_x = max(self.radius, min(step_x, width - self.radius))
+        new_y = max(self.radius, min(step_y, height - self.radius))
+        
+        # Проверяем только препятствия рядом с путём за этот шаг
+        radius = self.radius
+        nearby = obstacle_grid.query(
+            min(self.x, step_x) - radius, min(self.y, step_y) - radius,
+            max(self.x, step_x) + radius, max(self.y, step_y) + radius
+        )
         
         # Проверка столкновений с препятствиями
         collision_occurred = False
-        for obstacle in obstacles:
+        for obstacle in nearby:
             if self.check_collision(obstacle, new_x, new_y):
                 collision_occurred = True
                 
@@ -271,16 +592,18 @@ class Player:
             self.y = new_y
         else:
             # Применяем скорректированные позиции
-            self.x = max(self.radius, min(new_x, WIDTH - self.radius))
-            self.y = max(self.radius, min(new_y, HEIGHT - self.radius))
+            self.x = max(self.radius, min(new_x, width - self.radius))
+            self.y = max(self.radius, min(new_y, height - self.radius))
     
     def check_collision(self, obstacle, x, y):
         # Упрощенная проверка столкновения с прямоугольным препятствием
         closest_x = max(obstacle.x, min(x, obstacle.x + obstacle.width))
         closest_y = max(obstacle.y, min(y, obstacle.y + obstacle.height))
         
-        distance = math.sqrt((x - closest_x) ** 2 + (y - closest_y) ** 2)
-        return distance < self.radius
+        # Сравниваем квадраты расстояний, без извлечения корня
+        offset_x = x - closest_x
+        offset_y = y - closest_y
+        return offset_x * offset_x + offset_y * offset_y < self.radius * self.radius
     
     def update_direction(self, mouse_pos):
         self.direction = math.atan2(mouse_pos[1] - self.y, mouse_pos[0] - self.x)
@@ -294,20 +617,22 @@ class Player:
                 
                 # В реальной игре здесь бы искали ближайшего бота
                 # Для простоты стреляем обычной пулей
-                self.bullets.append(Bullet(
+                self.projectiles.spawn(
                     self.x, self.y, 
                     math.cos(self.direction) * self.bullet_speed,
                     math.sin(self.direction) * self.bullet_speed,
-                    self.bullet_damage, self.bullet_color, self.bullet_radius
-                ))
+                    self.bullet_damage, self.bullet_color, self.bullet_radius,
+                    self.uid, self.team
+                )
             else:
                 # Обычные персонажи
-                self.bullets.append(Bullet(
+                self.projectiles.spawn(
                     self.x, self.y, 
                     math.cos(self.direction) * self.bullet_speed,
                     math.sin(self.direction) * self.bullet_speed,
-                    self.bullet_damage, self.bullet_color, self.bullet_radius
-                ))
+                    self.bullet_damage, self.bullet_color, self.bullet_radius,
+                    self.uid, self.team
+                )
             
             self.cooldown = self.cooldown_max
     
@@ -316,39 +641,43 @@ class Player:
             if self.player_type == 1:  # Стрелок - тройной выстрел
                 for angle_offset in [-0.2, 0, 0.2]:
                     angle = self.direction + angle_offset
-                    self.bullets.append(Bullet(
+                    self.projectiles.spawn(
                         self.x, self.y, 
                         math.cos(angle) * self.bullet_speed * 1.5,
                         math.sin(angle) * self.bullet_speed * 1.5,
-                        self.bullet_damage * 0.7, YELLOW, self.bullet_radius
-                    ))
+                        self.bullet_damage * 0.7, YELLOW, self.bullet_radius,
+                        self.uid, self.team
+                    )
                     
             elif self.player_type == 2:  # Танк - ударная волна
                 for i in range(8):
                     angle = (math.pi * 2 / 8) * i
-                    self.bullets.append(Bullet(
+                    self.projectiles.spawn(
                         self.x, self.y, 
                         math.cos(angle) * 5,
                         math.sin(angle) * 5,
-                        self.bullet_damage * 0.5, ORANGE, 15
-                    ))
+                        self.bullet_damage * 0.5, ORANGE, 15,
+                        self.uid, self.team
+                    )
                     
             elif self.player_type == 3:  # Маг - вращающиеся снаряды
                 for i in range(3):
                     angle = self.direction + (math.pi * 2 / 3) * i
-                    self.bullets.append(SpinningBullet(
+                    self.projectiles.spawn(
                         self.x, self.y, 
                         math.cos(angle) * 4,
                         math.sin(angle) * 4,
                         self.bullet_damage, PURPLE, self.bullet_radius,
+                        self.uid, self.team, BULLET_SPINNING,
                         self.x, self.y  # центр вращения
-                    ))
+                    )
             
             elif self.player_type == 4:  # Гений - турель
                 if len(self.turrets) < self.max_turrets:
                     self.turrets.append(Turret(
                         self.x, self.y,
-                        self.bullet_damage * 0.8, CYAN
+                        self.bullet_damage * 0.8, CYAN,
+                        self.projectiles, self.uid
                     ))
             
             self.special_cooldown = self.special_cooldown_max
@@ -359,7 +688,7 @@ class Player:
             self.mines.append(Mine(self.x, self.y, self.bullet_damage * 1.5, CYAN))
             self.mine_cooldown = 30
     
-    def update(self, obstacles, bots=None):
+    def update(self, obstacles, bots=None, sight=None):
         # Обновление перезарядки
         if self.cooldown > 0:
             self.cooldown -= 1
@@ -375,35 +704,29 @@ class Player:
             
             # Обновление турелей
             if bots:
-                for turret in self.turrets:
-                    turret.update(bots)
+                targets = nearest_in_range(self.turrets, bots, Turret.RANGE, sight)
+                for turret, target in zip(self.turrets, targets):
+                    turret.update(target)
             
             # Обновление мин
             for mine in self.mines:
                 mine.update()
-        
-        # Обновление пуль
-        for bullet in self.bullets[:]:
-            bullet.update()
-            # Удаление пуль за пределами экрана
-            if (bullet.x < -bullet.radius or bullet.x > WIDTH + bullet.radius or
-                bullet.y < -bullet.radius or bullet.y > HEIGHT + bullet.radius):
-                self.bullets.remove(bullet)
     
-    def draw_bullets(self, surface):
-        for bullet in self.bullets:
-            bullet.draw(surface)
-        
+    def draw_gadgets(self, surface, offset=(0, 0)):
         # Отрисовка мин и турелей (только для Гения)
         if self.player_type == 4:
             for mine in self.mines:
-                mine.draw(surface)
+                mine.draw(surface, offset)
             for turret in self.turrets:
-                turret.draw(surface)
+                turret.draw(surface, offset)
 
 # Класс турели для Гения
 class Turret:
-    def __init__(self, x, y, damage, color):
+    RANGE = 300  # Дальность стрельбы
+    __slots__ = ("x", "y", "damage", "color", "radius", "cooldown", "cooldown_max",
+                 "projectiles", "owner", "health", "max_health")
+    
+    def __init__(self, x, y, damage, color, projectiles, owner=0):
         self.x = x
         self.y = y
         self.damage = damage
@@ -411,66 +734,45 @@ class Turret:
         self.radius = 15
         self.cooldown = 0
         self.cooldown_max = 60
-        self.bullets = []
+        self.projectiles = projectiles
+        self.owner = owner
         self.health = 50
         self.max_health = 50
     
-    def update(self, bots):
+    def update(self, closest_bot):
+        """closest_bot - ближайший бот в радиусе стрельбы (выбирает nearest_in_range)"""
         if self.cooldown > 0:
             self.cooldown -= 1
         
-        # Ищем ближайшего бота
-        if bots and self.cooldown <= 0:
-            closest_bot = None
-            min_distance = 300  # Дальность стрельбы
-            
-            for bot in bots:
-                distance = math.sqrt((self.x - bot.x) ** 2 + (self.y - bot.y) ** 2)
-                if distance < min_distance:
-                    min_distance = distance
-                    closest_bot = bot
-            
-            # Стреляем в ближайшего бота
-            if closest_bot:
-                angle = math.atan2(closest_bot.y - self.y, closest_bot.x - self.x)
-                self.bullets.append(Bullet(
-                    self.x, self.y,
-                    math.cos(angle) * 5,
-                    math.sin(angle) * 5,
-                    self.damage, self.color, 5
-                ))
-                self.cooldown = self.cooldown_max
-        
-        # Обновляем пули турели
-        for bullet in self.bullets[:]:
-            if not bullet.update():
-                self.bullets.remove(bullet)
-    
-    def draw(self, surface):
-        # Основание турели
-        pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
-        
-        # Верхняя часть (поворачивается)
-        pygame.draw.rect(surface, (self.color[0]//2, self.color[1]//2, self.color[2]//2),
-                        (self.x - 10, self.y - 10, 20, 20))
+        # Стреляем в ближайшего бота
+        if closest_bot and self.cooldown <= 0:
+            angle = math.atan2(closest_bot.y - self.y, closest_bot.x - self.x)
+            self.projectiles.spawn(
+                self.x, self.y,
+                math.cos(angle) * 5,
+                math.sin(angle) * 5,
+                self.damage, self.color, 5,
+                self.owner, TEAM_PLAYER
+            )
+            self.cooldown = self.cooldown_max
+    
+    def draw(self, surface, offset=(0, 0)):
+        x = self.x - offset[0]
+        y = self.y - offset[1]
+        # Основание и верхняя часть турели
+        blit_centered(surface, sprite_cache.turret(self.color, self.radius), x, y)
         
         # Полоска здоровья
         health_width = 30
-        health_height = 4
-        health_x = self.x - health_width // 2
-        health_y = self.y - self.radius - 10
-        
-        pygame.draw.rect(surface, BLACK, (health_x, health_y, health_width, health_height))
-        health_ratio = self.health / self.max_health
-        pygame.draw.rect(surface, GREEN, 
-                        (health_x, health_y, int(health_width * health_ratio), health_height))
-        
-        # Отрисовка пуль турели
-        for bullet in self.bullets:
-            bullet.draw(surface)
+        health_x = x - health_width // 2
+        health_y = y - self.radius - 10
+        bar = sprite_cache.health_bar(health_width, 4, self.health / self.max_health, GREEN)
+        surface.blit(bar, (int(health_x), int(health_y)))
 
 # Класс мины для Гения
 class Mine:
+    __slots__ = ("x", "y", "damage", "color", "radius", "active", "blink_timer")
+    
     def __init__(self, x, y, damage, color):
         self.x = x
         self.y = y
@@ -483,62 +785,298 @@ class Mine:
     def update(self):
         self.blink_timer = (self.blink_timer + 1) % 30
     
-    def draw(self, surface):
+    def draw(self, surface, offset=(0, 0)):
         if self.active:
             # Мигающий эффект
-            if self.blink_timer < 15:
-                pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
-                pygame.draw.circle(surface, YELLOW, (int(self.x), int(self.y)), self.radius // 2)
-            else:
-                pygame.draw.circle(surface, YELLOW, (int(self.x), int(self.y)), self.radius)
-                pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius // 2)
+            sprite = sprite_cache.mine(self.color, self.radius, self.blink_timer < 15)
+            blit_centered(surface, sprite, self.x - offset[0], self.y - offset[1])
 
-# Класс пули
-class Bullet:
-    def __init__(self, x, y, dx, dy, damage, color, radius):
-        self.x = x
-        self.y = y
-        self.dx = dx
-        self.dy = dy
-        self.damage = damage
-        self.color = color
-        self.radius = radius
+# Виды снарядов
+BULLET_NORMAL = 0
+BULLET_SPINNING = 1
+
+# Стороны: игрок с турелями против ботов
+TEAM_PLAYER = 0
+TEAM_BOTS = 1
+
+# Ёмкость хранилища снарядов матча: выделяется один раз и не растёт
+PROJECTILE_CAPACITY = 8192
+
+# Общее хранилище всех снарядов в массивах NumPy (структура массивов).
+# Снаряды - строки массивов, а не объекты: выстрел только заполняет свободную строку
+class ProjectileStore:
+    # Граница за экраном, после которой снаряд удаляется
+    CULL_MARGIN = 50
+    # Скорость вращения и удаления от центра вращающихся снарядов
+    SPIN_SPEED = 0.1
+    SPIN_GROWTH = 0.5
+    # Поля снаряда: имя -> (тип, число компонент)
+    FIELDS = {
+        "x": (np.float64, 1), "y": (np.float64, 1),
+        "prev_x": (np.float64, 1), "prev_y": (np.float64, 1),  # позиция до последнего тика
+        "dx": (np.float64, 1), "dy": (np.float64, 1),
+        "damage": (np.float64, 1), "radius": (np.float64, 1), "color": (np.uint8, 3),
+        "center_x": (np.float64, 1), "center_y": (np.float64, 1),
+        "angle": (np.float64, 1), "distance": (np.float64, 1),
+        "owner": (np.int32, 1), "team": (np.uint8, 1), "kind": (np.uint8, 1),
+        "id": (np.uint32, 1),  # постоянный номер снаряда, не меняется при уплотнении
+    }
     
-    def update(self):
-        self.x += self.dx
-        self.y += self.dy
+    def __init__(self, capacity=1024, max_capacity=None):
+        self.count = 0
+        self.max_capacity = max_capacity  # None - растёт без ограничений
+        self.peak = 0  # наибольшее число снарядов одновременно
+        self.grows = 0  # сколько раз массивы перевыделялись
+        self.overflow = 0  # выстрелы, не поместившиеся в max_capacity
+        self.next_id = 0  # номер следующего снаряда
+        self.allocate(capacity)
+    
+    def allocate(self, capacity):
+        """Выделяет массивы заданной ёмкости, сохраняя живые снаряды"""
+        n = self.count
+        for name, (dtype, width) in self.FIELDS.items():
+            array = np.zeros(capacity if width == 1 else (capacity, width), dtype=dtype)
+            if n:
+                array[:n] = getattr(self, name)[:n]
+            setattr(self, name, array)
+        self.capacity = capacity
+    
+    @classmethod
+    def slot_bytes(cls):
+        """Память на один снаряд во всех массивах"""
+        return sum(np.dtype(dtype).itemsize * width for dtype, width in cls.FIELDS.values())
+    
+    def __len__(self):
+        return self.count
+    
+    def clear(self):
+        self.count = 0
+    
+    def spawn(self, x, y, dx, dy, damage, color, radius, owner=0, team=TEAM_PLAYER,
+              kind=BULLET_NORMAL, center_x=0, center_y=0):
+        """Добавляет снаряд; при заполненной max_capacity выстрел пропадает"""
+        if self.count == self.capacity:
+            if self.max_capacity is not None and self.capacity >= self.max_capacity:
+                self.overflow += 1
+                return
+            capacity = self.capacity * 2
+            if self.max_capacity is not None:
+                capacity = min(capacity, self.max_capacity)
+            self.allocate(capacity)
+            self.grows += 1
+        i = self.count
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.dx[i] = dx
+        self.dy[i] = dy
+        self.damage[i] = damage
+        self.color[i] = color
+        self.radius[i] = radius
+        self.owner[i] = owner
+        self.team[i] = team
+        self.kind[i] = kind
+        self.center_x[i] = center_x
+        self.center_y[i] = center_y
+        self.angle[i] = 0
+        self.distance[i] = math.sqrt((x - center_x) ** 2 + (y - center_y) ** 2) if kind == BULLET_SPINNING else 0
+        self.id[i] = self.next_id
+        self.next_id = (self.next_id + 1) & 0xFFFFFFFF
+        self.count += 1
+        if self.count > self.peak:
+            self.peak = self.count
+    
+    def remove_owner(self, owner):
+        """Удаляет все снаряды владельца (например, погибшего бота)"""
+        n = self.count
+        if n:
+            self.keep(self.owner[:n] != owner)
+    
+    def keep(self, mask):
+        """Оставляет только снаряды, отмеченные в mask (порядок сохраняется)"""
+        n = self.count
+        kept = int(np.count_nonzero(mask))
+        if kept == n:
+            return
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[:kept] = array[:n][mask]
+        self.count = kept
+    
+    def update(self, width, height):
+        """Двигает все снаряды и удаляет улетевшие за экран"""
+        n = self.count
+        if n == 0:
+            return
+        x = self.x[:n]
+        y = self.y[:n]
+        self.prev_x[:n] = x
+        self.prev_y[:n] = y
+        x += self.dx[:n]
+        y += self.dy[:n]
+        
+        # Вращающиеся снаряды летят по раскручивающейся спирали
+        spinning = np.flatnonzero(self.kind[:n] == BULLET_SPINNING)
+        if spinning.size:
+            angle = self.angle[spinning] + self.SPIN_SPEED
+            distance = self.distance[spinning]
+            self.angle[spinning] = angle
+            x[spinning] = self.center_x[spinning] + np.cos(angle) * distance
+            y[spinning] = self.center_y[spinning] + np.sin(angle) * distance
+            self.distance[spinning] = distance + self.SPIN_GROWTH
+        
+        margin = self.CULL_MARGIN
+        inside = (x >= -margin) & (x <= width + margin) & (y >= -margin) & (y <= height + margin)
+        self.keep(inside)
+    
+    def collide(self, team, targets, on_hit):
+        """Находит попадания снарядов стороны team по целям и вызывает on_hit(target, damage)"""
+        # Каждый снаряд попадает не больше чем в одну цель. Цели обрабатываются
+        # по порядку; снаряды, прилетевшие в уже убитую цель, летят дальше
+        n = self.count
+        if n == 0 or not targets:
+            return
+        candidates = np.flatnonzero(self.team[:n] == team)
+        if candidates.size == 0:
+            return
         
-        # Проверка границ для пуль (не даём им уходить слишком далеко)
-        if self.x < -50 or self.x > WIDTH + 50 or self.y < -50 or self.y > HEIGHT + 50:
-            return False
-        return True
+        target_x = np.fromiter((t.x for t in targets), np.float64, len(targets))
+        target_y = np.fromiter((t.y for t in targets), np.float64, len(targets))
+        target_r = np.fromiter((t.radius for t in targets), np.float64, len(targets))
+        pair_target, pair_bullet = self.find_overlaps(candidates, target_x, target_y, target_r)
+        if pair_target.size == 0:
+            return
+        
+        # Обычно за тик никто не погибает: тогда каждый снаряд достаётся
+        # первой задевшей его цели, а урон суммируется одним bincount
+        first = np.lexsort((pair_target, pair_bullet))
+        pair_bullet_sorted = pair_bullet[first]
+        is_first = np.ones(first.size, dtype=bool)
+        is_first[1:] = pair_bullet_sorted[1:] != pair_bullet_sorted[:-1]
+        bullet_ids = pair_bullet_sorted[is_first]
+        bullet_targets = pair_target[first][is_first]
+        dealt = np.bincount(bullet_targets, weights=self.damage[bullet_ids], minlength=len(targets))
+        health = np.fromiter((t.health for t in targets), np.float64, len(targets))
+        hit_targets = np.flatnonzero(dealt)
+        if not np.any(health[hit_targets] - dealt[hit_targets] <= 0):
+            consumed = np.zeros(n, dtype=bool)
+            consumed[bullet_ids] = True
+            self.keep(~consumed)
+            for index in np.unique(bullet_targets).tolist():
+                on_hit(targets[index], float(dealt[index]))
+            return
+        
+        # Кто-то погибает: разбираем цели по очереди. Пары отсортированы
+        # по цели, внутри цели - по порядку снарядов
+        consumed = np.zeros(n, dtype=bool)
+        hits = []
+        bounds = np.flatnonzero(np.diff(pair_target)) + 1
+        starts = np.concatenate(([0], bounds))
+        for start, bullets in zip(starts, np.split(pair_bullet, bounds)):
+            target = targets[int(pair_target[start])]
+            bullets = bullets[~consumed[bullets]]
+            if bullets.size == 0:
+                continue
+            # Снаряды после смертельного попадания не тратятся
+            dealt = np.cumsum(self.damage[bullets])
+            lethal = np.flatnonzero(target.health - dealt <= 0)
+            if lethal.size:
+                bullets = bullets[:lethal[0] + 1]
+            consumed[bullets] = True
+            hits.append((target, float(dealt[bullets.size - 1])))
+        
+        # Сначала убираем попавшие снаряды: on_hit может менять хранилище
+        self.keep(~consumed)
+        for target, damage in hits:
+            on_hit(target, damage)
     
-    def draw(self, surface):
-        pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
-        # Эффект свечения
-        pygame.draw.circle(surface, WHITE, (int(self.x), int(self.y)), self.radius // 2)
-
-# Класс вращающейся пули для мага
-class SpinningBullet(Bullet):
-    def __init__(self, x, y, dx, dy, damage, color, radius, center_x, center_y):
-        super().__init__(x, y, dx, dy, damage, color, radius)
-        self.center_x = center_x
-        self.center_y = center_y
-        self.angle = 0
-        self.distance = math.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
-        self.rotation_speed = 0.1
+    def find_overlaps(self, candidates, target_x, target_y, target_r):
+        """Возвращает пары (цель, снаряд) пересекающихся кругов"""
+        x = self.x[candidates]
+        y = self.y[candidates]
+        r = self.radius[candidates]
+        
+        # Немного снарядов и целей - проверяем все пары сразу
+        if candidates.size * target_x.size <= 4096:
+            reach = target_r[:, None] + r[None, :]
+            hit = (target_x[:, None] - x) ** 2 + (target_y[:, None] - y) ** 2 < reach * reach
+            pair_target, pair_index = np.nonzero(hit)
+            return pair_target, candidates[pair_index]
+        
+        # Иначе раскладываем снаряды по ячейкам сетки размером с наибольшую
+        # дистанцию попадания и у каждой цели смотрим только 3x3 соседние ячейки
+        size = float(r.max() + target_r.max())
+        cell_x = np.floor(x / size).astype(np.int64)
+        cell_y = np.floor(y / size).astype(np.int64)
+        stride = int(cell_y.max() - cell_y.min()) + 4
+        base_y = int(cell_y.min()) - 1
+        keys = cell_x * stride + (cell_y - base_y)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        
+        target_cx = np.floor(target_x / size).astype(np.int64)
+        target_cy = np.floor(target_y / size).astype(np.int64) - base_y
+        offsets = np.arange(-1, 2)
+        query_x = (target_cx[:, None, None] + offsets[None, :, None])
+        query_y = np.clip(target_cy[:, None, None] + offsets[None, None, :], 0, stride - 1)
+        query_keys = (query_x * stride + query_y).ravel()
+        query_target = np.repeat(np.arange(target_x.size), 9)
+        
+        low = np.searchsorted(sorted_keys, query_keys, side="left")
+        high = np.searchsorted(sorted_keys, query_keys, side="right")
+        counts = high - low
+        total = int(counts.sum())
+        if total == 0:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        pair_target = np.repeat(query_target, counts)
+        starts = np.repeat(low - np.cumsum(counts) + counts, counts)
+        pair_pos = order[starts + np.arange(total)]
+        
+        reach = target_r[pair_target] + r[pair_pos]
+        hit = ((target_x[pair_target] - x[pair_pos]) ** 2 +
+               (target_y[pair_target] - y[pair_pos]) ** 2 < reach * reach)
+        pair_target = pair_target[hit]
+        pair_bullet = candidates[pair_pos[hit]]
+        
+        # Сортируем по цели, затем по порядку снарядов
+        order = np.lexsort((pair_bullet, pair_target))
+        return pair_target[order], pair_bullet[order]
     
-    def update(self):
-        # Вращение вокруг центра
-        self.angle += self.rotation_speed
-        self.x = self.center_x + math.cos(self.angle) * self.distance
-        self.y = self.center_y + math.sin(self.angle) * self.distance
-        self.distance += 0.5  # Постепенное удаление от центра
-        
-        # Проверка границ
-        if self.x < -50 or self.x > WIDTH + 50 or self.y < -50 or self.y > HEIGHT + 50:
-            return False
-        return True
+    def draw(self, surface, alpha=1.0, offset=(0, 0)):
+        n = self.count
+        if n == 0:
+            return
+        # Позиция между двумя последними тиками
+        x = self.x[:n]
+        y = self.y[:n]
+        if alpha < 1.0:
+            x = self.prev_x[:n] + (x - self.prev_x[:n]) * alpha
+            y = self.prev_y[:n] + (y - self.prev_y[:n]) * alpha
+        draw_bullets(surface, x, y, self.radius[:n], self.color[:n], offset)
+
+# Снаряды в точках арены (x, y) массивами; offset - левый верхний угол вида
+def draw_bullets(surface, x, y, radius, colors, offset=(0, 0)):
+    # Рисуем только снаряды, попадающие в вид
+    x = x - offset[0]
+    y = y - offset[1]
+    view_width, view_height = surface.get_size()
+    visible = (x > -radius) & (x < view_width + radius) & (y > -radius) & (y < view_height + radius)
+    if not visible.all():
+        x, y, radius, colors = x[visible], y[visible], radius[visible], colors[visible]
+    
+    # Спрайт с эффектом свечения у каждого сочетания цвета и радиуса свой
+    radii = radius.astype(np.int32)
+    left = (x.astype(np.int32) - radii - 1).tolist()
+    top = (y.astype(np.int32) - radii - 1).tolist()
+    colors = colors.tolist()
+    sprites = {}
+    batch = []
+    for x, y, radius, color in zip(left, top, radii.tolist(), colors):
+        key = (color[0], color[1], color[2], radius)
+        sprite = sprites.get(key)
+        if sprite is None:
+            sprite = sprites[key] = sprite_cache.bullet(color, radius)
+        batch.append((sprite, (x, y)))
+    surface.blits(batch, False)
 
 # Класс препятствия
 class Obstacle:
@@ -549,9 +1087,10 @@ class Obstacle:
         self.height = height
         self.color = color
     
-    def draw(self, surface):
+    def draw(self, surface, offset=(0, 0)):
         # Основной прямоугольник
-        pygame.draw.rect(surface, self.color, (self.x, self.y, self.width, self.height))
+        rect = (self.x - offset[0], self.y - offset[1], self.width, self.height)
+        pygame.draw.rect(surface, self.color, rect)
         
         # Текстура препятствия (рамка)
         darker_color = (
@@ -559,73 +1098,148 @@ class Obstacle:
             max(0, self.color[1] - 40),
             max(0, self.color[2] - 40)
         )
-        pygame.draw.rect(surface, darker_color, (self.x, self.y, self.width, self.height), 3)
+        pygame.draw.rect(surface, darker_color, rect, 3)
+
+# Восприятие: дистанции между всеми бойцами одной матричной операцией за тик
+# Дальность видимости ботов
+VISION_RANGE = 400
+# Игрок кажется ботам ближе, чем другие боты
+PLAYER_PRIORITY = 0.7
+
+def positions(entities):
+    """Координаты объектов в виде массивов NumPy"""
+    count = len(entities)
+    xs = np.fromiter((e.x for e in entities), np.float64, count)
+    ys = np.fromiter((e.y for e in entities), np.float64, count)
+    return xs, ys
+
+def distance_matrix(sources, targets):
+    """Матрица расстояний: строки - sources, столбцы - targets"""
+    sx, sy = positions(sources)
+    tx, ty = positions(targets)
+    # Считаем на месте, без промежуточных матриц
+    dx = np.subtract.outer(sx, tx)
+    dy = np.subtract.outer(sy, ty)
+    dx *= dx
+    dy *= dy
+    dx += dy
+    return np.sqrt(dx, out=dx)
+
+def choose_targets(bots, fighters):
+    """Возвращает цель каждого бота (или None) и приоритетную дистанцию до неё"""
+    if not bots:
+        return [], []
+    priority = distance_matrix(bots, fighters)
+    hidden = priority >= VISION_RANGE
+    
+    # Игрок (player_type == 0) имеет высший приоритет, но атакуем и других ботов
+    favoured = [j for j, f in enumerate(fighters) if f.player_type == 0]
+    if favoured:
+        priority[:, favoured] *= PLAYER_PRIORITY
+    priority[hidden] = np.inf
+    
+    # Не атакуем себя
+    column = {id(f): j for j, f in enumerate(fighters)}
+    rows = [i for i, bot in enumerate(bots) if id(bot) in column]
+    priority[rows, [column[id(bots[i])] for i in rows]] = np.inf
+    
+    best = np.argmin(priority, axis=1)
+    best_priority = priority[np.arange(len(bots)), best].tolist()
+    targets = [fighters[j] if d != np.inf else None for j, d in zip(best.tolist(), best_priority)]
+    return targets, best_priority
+
+def nearest_in_range(sources, targets, max_range, sight=None):
+    """Ближайшая цель в пределах max_range для каждого источника (или None);
+    с sight (LineOfSight) - ближайшая из тех, что видны источнику"""
+    if not sources or not targets:
+        return [None] * len(sources)
+    distance = distance_matrix(sources, targets)
+    distance[distance >= max_range] = np.inf
+    if sight is None:
+        best = np.argmin(distance, axis=1)
+        best_distance = distance[np.arange(len(sources)), best].tolist()
+        return [targets[j] if d != np.inf else None for j, d in zip(best.tolist(), best_distance)]
+    
+    found = []
+    for source, row in zip(sources, distance):
+        nearest = None
+        for j in np.argsort(row, kind="stable").tolist():
+            if row[j] == np.inf:
+                break
+            target = targets[j]
+            if sight.visible(source.x, source.y, target.x, target.y):
+                nearest = target
+                break
+        found.append(nearest)
+    return found
 
 # Класс бота
 class Bot(Player):
-    def __init__(self, x, y, bot_type):
+    def __init__(self, x, y, bot_type, projectiles=None, rng=None):
         colors = [RED, GREEN, PURPLE]
-        super().__init__(x, y, colors[bot_type - 1], bot_type)
+        super().__init__(x, y, colors[bot_type - 1], bot_type, projectiles)
+        self.team = TEAM_BOTS
+        self.rng = rng if rng is not None else random  # генератор случайных чисел мира
         self.target = None
+        self.target_visible = False  # видел ли бот цель при последнем решении
         self.change_target_time = 0
         self.wander_time = 0
-        self.wander_direction = random.uniform(0, math.pi * 2)
+        self.wander_direction = self.rng.uniform(0, math.pi * 2)
+        # Последнее решение ИИ (см. think) и когда оно принято
+        self.move_x = 0
+        self.move_y = 0
+        self.fire_chance = 0
+        self.special_chance = 0
+        self.last_decision = None  # тик последнего решения
+        self.decision_owed = True  # решение нужно, но было отложено (или ещё не принималось)
     
-    def update_ai(self, players, obstacles):
+    def update_ai(self, target, closest_distance, obstacle_grid, think=True, heading=None, visible=True):
+        """Действия бота за тик; цель и дистанцию до неё выбирает choose_targets(),
+        heading - путь к цели в обход стен (NavigationGrid.heading), visible - видна ли цель.
+        Без think бот не принимает новых решений и продолжает выполнять прежнее"""
         # Обновляем перезарядку как у обычного игрока
         if self.cooldown > 0:
             self.cooldown -= 1
         if self.special_cooldown > 0:
             self.special_cooldown -= 1
         
-        # Ищем ближайшего противника (игрока или другого бота)
-        closest_enemy = None
-        closest_distance = float('inf')
-        
-        for player in players:
-            if player != self:  # Не атакуем себя
-                # Игрок (player_type == 0) имеет высший приоритет
-                # Но также атакуем и других ботов
-                distance = math.sqrt((self.x - player.x) ** 2 + (self.y - player.y) ** 2)
-                
-                # Даем приоритет игроку над ботами
-                if player.player_type == 0:  # Игрок
-                    priority_distance = distance * 0.7  # Игрок кажется ближе
-                else:  # Другой бот
-                    priority_distance = distance
-                
-                if priority_distance < closest_distance and distance < 400:  # Видимость 400 пикселей
-                    closest_distance = priority_distance
-                    closest_enemy = player
-        
-        self.target = closest_enemy
+        if think:
+            self.think(target, closest_distance, heading, visible)
+        self.act(obstacle_grid)
+    
+    def think(self, target, closest_distance, heading=None, visible=True):
+        """Решение: куда двигаться и как часто стрелять до следующего решения"""
+        self.target = target
+        self.target_visible = bool(target) and visible
         
         # Если нет противников в радиусе, блуждаем
         if not self.target:
             # Блуждание, если нет цели
             if self.wander_time <= 0:
-                self.wander_direction = random.uniform(0, math.pi * 2)
-                self.wander_time = random.randint(30, 90)
+                self.wander_direction = self.rng.uniform(0, math.pi * 2)
+                self.wander_time = self.rng.randint(30, 90)
             
-            dx = math.cos(self.wander_direction)
-            dy = math.sin(self.wander_direction)
-            self.move(dx, dy, obstacles)
-            self.wander_time -= 1
+            self.move_x = math.cos(self.wander_direction)
+            self.move_y = math.sin(self.wander_direction)
+            self.fire_chance = 0
+            self.special_chance = 0
             return
         
         # Поведение в зависимости от расстояния до цели
         # Поворачиваемся к цели
         self.direction = math.atan2(self.target.y - self.y, self.target.x - self.x)
+        self.special_chance = 0
+        # Идём к цели по полю направлений, если прямой путь закрыт стеной
+        approach = self.direction if heading is None else heading
         
         # Двигаемся к цели или от неё в зависимости от типа
         if self.player_type == 1:  # Стрелок держится на дистанции
             if closest_distance > 180:  # Увеличил дистанцию для лучшей атаки
                 # Приближаемся
-                dx = math.cos(self.direction)
-                dy = math.sin(self.direction)
+                dx = math.cos(approach)
+                dy = math.sin(approach)
                 # Стреляем при приближении
-                if random.random() < 0.08 and self.cooldown <= 0:
-                    self.shoot()
+                self.fire_chance = 0.08
             else:
                 # Отдаляемся или держим дистанцию
                 if closest_distance < 150:
@@ -635,60 +1249,65 @@ class Bot(Player):
                     dx = 0
                     dy = 0
                 # Активно стреляем
-                if random.random() < 0.15 and self.cooldown <= 0:
-                    self.shoot()
+                self.fire_chance = 0.15
                     
         elif self.player_type == 2:  # Танк идёт в ближний бой
             if closest_distance > 60:  # Идет в ближний бой
-                dx = math.cos(self.direction)
-                dy = math.sin(self.direction)
+                dx = math.cos(approach)
+                dy = math.sin(approach)
                 # Стреляет даже при движении
-                if random.random() < 0.1 and self.cooldown <= 0:
-                    self.shoot()
+                self.fire_chance = 0.1
             else:
                 dx = 0
                 dy = 0
                 # Активно стреляет в упор
-                if random.random() < 0.2 and self.cooldown <= 0:
-                    self.shoot()
+                self.fire_chance = 0.2
                     
         elif self.player_type == 3:  # Маг двигается зигзагом
             if self.wander_time <= 0:
-                self.wander_direction = random.uniform(0, math.pi * 2)
+                self.wander_direction = self.rng.uniform(0, math.pi * 2)
                 self.wander_time = 40  # Увеличил время зигзага
             
             # Комбинируем движение к цели и случайное движение
             move_toward = 0.6  # Больше движения к цели
-            dx = math.cos(self.direction) * move_toward + math.cos(self.wander_direction) * (1 - move_toward)
-            dy = math.sin(self.direction) * move_toward + math.sin(self.wander_direction) * (1 - move_toward)
-            
-            # Активно стреляет
-            if random.random() < 0.12 and self.cooldown <= 0:
-                self.shoot()
-            
-            self.wander_time -= 1
+            dx = math.cos(approach) * move_toward + math.cos(self.wander_direction) * (1 - move_toward)
+            dy = math.sin(approach) * move_toward + math.sin(self.wander_direction) * (1 - move_toward)
             
-            # Спец-атака
-            if random.random() < 0.015 and self.special_cooldown <= 0:
-                self.special_attack()
+            # Активно стреляет и иногда применяет спец-атаку
+            self.fire_chance = 0.12
+            self.special_chance = 0.015
         
-        self.move(dx, dy, obstacles)
+        self.move_x = dx
+        self.move_y = dy
+        
+        # Пули летят сквозь стены: за стеной бот идёт к цели, но не стреляет
+        if not visible:
+            self.fire_chance = 0
+            self.special_chance = 0
+    
+    def act(self, obstacle_grid):
+        """Выполнение последнего решения: выстрелы, спец-атаки и движение"""
+        if self.fire_chance and self.rng.random() < self.fire_chance and self.cooldown <= 0:
+            self.shoot()
+        if self.special_chance and self.rng.random() < self.special_chance and self.special_cooldown <= 0:
+            self.special_attack()
+        
+        self.move(self.move_x, self.move_y, obstacle_grid)
         
         # Случайная спец-атака для всех типов
-        if random.random() < 0.008 and self.special_cooldown <= 0:
+        if self.target_visible and self.rng.random() < 0.008 and self.special_cooldown <= 0:
             self.special_attack()
         
-        # Обновление пуль
-        for bullet in self.bullets[:]:
-            if not bullet.update():  # Если пуля вышла за границы
-                self.bullets.remove(bullet)
+        # Блуждание и зигзаг отсчитываются в тиках, а не в решениях
+        if not self.target or self.player_type == 3:
+            self.wander_time -= 1
 
-# Стартовый экран
-def start_screen():
-    font_large = pygame.font.SysFont(None, 60)
-    font_medium = pygame.font.SysFont(None, 36)
-    font_small = pygame.font.SysFont(None, 28)
-    font_tiny = pygame.font.SysFont(None, 24)
+# Стартовый экран; on_first_frame вызывается после первого показанного кадра
+def start_screen(on_first_frame=None):
+    font_large = get_font(60)
+    font_medium = get_font(36)
+    font_small = get_font(28)
+    font_tiny = get_font(24)
     
     # Позиции для кнопок
     play_button = pygame.Rect(WIDTH//2 - 100, HEIGHT//2 + 50, 200, 60)
@@ -717,19 +1336,19 @@ def start_screen():
         screen.fill(BACKGROUND)
         
         # Заголовок игры
-        title = font_large.render("super fighters", True, YELLOW)
+        title = render_text(font_large, "super fighters", YELLOW)
         screen.blit(title, (WIDTH//2 - title.get_width()//2, 100))
         
         # Кнопка Play
         pygame.draw.rect(screen, GREEN, play_button, border_radius=10)
         pygame.draw.rect(screen, WHITE, play_button, 3, border_radius=10)
-        play_text = font_medium.render("ИГРАТЬ", True, WHITE)
+        play_text = render_text(font_medium, "ИГРАТЬ", WHITE)
         screen.blit(play_text, (play_button.centerx - play_text.get_width()//2, 
                                play_button.centery - play_text.get_height()//2))
         
         # Кнопка Профиль
         pygame.draw.rect(screen, BLUE, profile_button, border_radius=5)
-        profile_text = font_tiny.render("ПРОФИЛЬ", True, WHITE)
+        profile_text = render_text(font_tiny, "ПРОФИЛЬ", WHITE)
         screen.blit(profile_text, (profile_button.centerx - profile_text.get_width()//2, 
                                   profile_button.centery - profile_text.get_height()//2))
         
@@ -738,28 +1357,32 @@ def start_screen():
             draw_stats_panel()
         
         # Управление
-        controls_text = font_small.render("Управление: WASD - движение, ЛКМ - выстрел, ПКМ - спец-атака", True, WHITE)
+        controls_text = render_text(font_small, "Управление: WASD - движение, ЛКМ - выстрел, ПКМ - спец-атака", WHITE)
         screen.blit(controls_text, (WIDTH//2 - controls_text.get_width()//2, HEIGHT - 50))
         
         # Подсказка
-        hint_text = font_tiny.render("Нажмите на ПРОФИЛЬ чтобы увидеть статистику", True, YELLOW)
+        hint_text = render_text(font_tiny, "Нажмите на ПРОФИЛЬ чтобы увидеть статистику", YELLOW)
         screen.blit(hint_text, (WIDTH//2 - hint_text.get_width()//2, HEIGHT - 100))
         
         pygame.display.flip()
+        if on_first_frame is not None:
+            on_first_frame()
+            on_first_frame = None
 
 # Функция для отрисовки панели статистики
 def draw_stats_panel():
+    stats = get_stats()
     # Полупрозрачная панель
     panel = pygame.Surface((600, 400), pygame.SRCALPHA)
     panel.fill((0, 0, 0, 200))
     screen.blit(panel, (WIDTH//2 - 300, HEIGHT//2 - 200))
     
-    font_title = pygame.font.SysFont(None, 40)
-    font_text = pygame.font.SysFont(None, 30)
-    font_small = pygame.font.SysFont(None, 24)
+    font_title = get_font(40)
+    font_text = get_font(30)
+    font_small = get_font(24)
     
     # Заголовок
-    title = font_title.render("СТАТИСТИКА ИГРЫ", True, YELLOW)
+    title = render_text(font_title, "СТАТИСТИКА ИГРЫ", YELLOW)
     screen.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//2 - 180))
     
     y_offset = HEIGHT//2 - 130
@@ -773,8 +1396,8 @@ def draw_stats_panel():
     ]
     
     for label, value, color in stats_data:
-        label_text = font_text.render(label, True, WHITE)
-        value_text = font_text.render(value, True, color)
+        label_text = render_text(font_text, label, WHITE)
+        value_text = render_text(font_text, value, color)
         screen.blit(label_text, (WIDTH//2 - 250, y_offset))
         screen.blit(value_text, (WIDTH//2 + 150 - value_text.get_width(), y_offset))
         y_offset += line_height
@@ -783,7 +1406,7 @@ def draw_stats_panel():
     
     # Прогресс разблокировки Гения
     unlock_progress = stats.get_unlock_progress()
-    progress_text = font_text.render(f"Разблокировка Гения: {unlock_progress}%", True, CYAN)
+    progress_text = render_text(font_text, f"Разблокировка Гения: {unlock_progress}%", CYAN)
     screen.blit(progress_text, (WIDTH//2 - progress_text.get_width()//2, y_offset))
     
     # Полоска прогресса
@@ -797,7 +1420,7 @@ def draw_stats_panel():
     y_offset += 60
     
     # Статистика по классам
-    classes_text = font_text.render("Статистика по классам:", True, WHITE)
+    classes_text = render_text(font_text, "Статистика по классам:", WHITE)
     screen.blit(classes_text, (WIDTH//2 - classes_text.get_width()//2, y_offset))
     y_offset += 40
     
@@ -821,9 +1444,10 @@ def draw_stats_panel():
             games = class_stat["games"]
             avg_kills = kills / games if games > 0 else 0
             
-            stat_text = font_small.render(
+            stat_text = render_text(
+                font_small,
                 f"{class_name}: {kills} убийств, {games} игр (среднее: {avg_kills:.1f})", 
-                True, WHITE if class_id != "4" or stats.stats["unlocked_genius"] else GRAY
+                WHITE if class_id != "4" or stats.stats["unlocked_genius"] else GRAY
             )
             screen.blit(stat_text, (WIDTH//2 - stat_text.get_width()//2, y_offset))
             y_offset += 25
@@ -831,7 +1455,7 @@ def draw_stats_panel():
     # Кнопка сброса статистики
     reset_button = pygame.Rect(WIDTH//2 - 80, y_offset + 20, 160, 40)
     pygame.draw.rect(screen, RED, reset_button, border_radius=5)
-    reset_text = font_text.render("СБРОСИТЬ", True, WHITE)
+    reset_text = render_text(font_text, "СБРОСИТЬ", WHITE)
     screen.blit(reset_text, (reset_button.centerx - reset_text.get_width()//2, 
                             reset_button.centery - reset_text.get_height()//2))
     
@@ -842,10 +1466,11 @@ def draw_stats_panel():
 
 # Экран выбора персонажа
 def character_selection():
+    stats = get_stats()
     selected = 0
-    font_large = pygame.font.SysFont(None, 50)
-    font_medium = pygame.font.SysFont(None, 30)
-    font_small = pygame.font.SysFont(None, 24)
+    font_large = get_font(50)
+    font_medium = get_font(30)
+    font_small = get_font(24)
     
     characters = [
         {"name": "СТРЕЛОК", "desc": "Быстрый, скорострельный", "color": BLUE, "type": 1, "unlocked": True},
@@ -871,12 +1496,12 @@ def character_selection():
         screen.fill(BACKGROUND)
         
         # Заголовок
-        title = font_large.render("ВЫБЕРИТЕ ПЕРСОНАЖА", True, WHITE)
+        title = render_text(font_large, "ВЫБЕРИТЕ ПЕРСОНАЖА", WHITE)
         screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 50))
         
         # Описание управления
-        controls1 = font_small.render("Управление: WASD - движение, ЛКМ - выстрел", True, WHITE)
-        controls2 = font_small.render("ПКМ - спец-атака, Q - мина (только Гений)", True, WHITE)
+        controls1 = render_text(font_small, "Управление: WASD - движение, ЛКМ - выстрел", WHITE)
+        controls2 = render_text(font_small, "ПКМ - спец-атака, Q - мина (только Гений)", WHITE)
         screen.blit(controls1, (WIDTH // 2 - controls1.get_width() // 2, HEIGHT - 80))
         screen.blit(controls2, (WIDTH // 2 - controls2.get_width() // 2, HEIGHT - 50))
         
@@ -897,32 +1522,32 @@ def character_selection():
             
             # Замок для заблокированных персонажей
             if not char["unlocked"]:
-                lock_text = font_medium.render("🔒", True, WHITE)
+                lock_text = render_text(font_medium, "🔒", WHITE)
                 screen.blit(lock_text, (x - lock_text.get_width()//2, y - lock_text.get_height()//2))
             
             # Имя
             name_color = WHITE if char["unlocked"] else GRAY
-            name_text = font_medium.render(char["name"], True, name_color)
+            name_text = render_text(font_medium, char["name"], name_color)
             screen.blit(name_text, (x - name_text.get_width() // 2, y + 60))
             
             # Описание
             desc_lines = split_text(char["desc"], font_small, 180)
             for j, line in enumerate(desc_lines):
                 desc_color = WHITE if char["unlocked"] else GRAY
-                desc_text = font_small.render(line, True, desc_color)
+                desc_text = render_text(font_small, line, desc_color)
                 screen.blit(desc_text, (x - desc_text.get_width() // 2, y + 90 + j * 25))
         
         # Информация о выбранном персонаже
         selected_char = characters[selected]
         if not selected_char["unlocked"]:
-            unlock_info = font_small.render(f"Разблокируется после 10 убийств", True, YELLOW)
+            unlock_info = render_text(font_small, f"Разблокируется после 10 убийств", YELLOW)
             screen.blit(unlock_info, (WIDTH // 2 - unlock_info.get_width() // 2, HEIGHT - 150))
             progress = stats.get_unlock_progress()
-            progress_text = font_small.render(f"Прогресс: {progress}%", True, YELLOW)
+            progress_text = render_text(font_small, f"Прогресс: {progress}%", YELLOW)
             screen.blit(progress_text, (WIDTH // 2 - progress_text.get_width() // 2, HEIGHT - 120))
         
         # Инструкция
-        instruct = font_small.render("Используйте A/D для выбора, ENTER для подтверждения", True, YELLOW)
+        instruct = render_text(font_small, "Используйте A/D для выбора, ENTER для подтверждения", YELLOW)
         screen.blit(instruct, (WIDTH // 2 - instruct.get_width() // 2, HEIGHT - 200))
         
         pygame.display.flip()
@@ -952,10 +1577,451 @@ def split_text(text, font, max_width):
     
     return lines
 
-# Основная игровая функция
-def main_game(player_type, player_color):
-    # Создание игрока
-    player = Player(WIDTH // 2, HEIGHT // 2, player_color, 0)
+# Равномерная сетка для быстрого поиска соседей (broadphase)
+class SpatialHash:
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy) -> список объектов
+        self.keys = {}  # объект -> ячейка
+        self.max_radius = 0  # самый большой радиус среди объектов
+    
+    def clear(self):
+        self.cells.clear()
+        self.keys.clear()
+        self.max_radius = 0
+    
+    def insert(self, obj):
+        """Добавляет объект в ячейку, где находится его центр"""
+        key = (int(obj.x // self.cell_size), int(obj.y // self.cell_size))
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [obj]
+        else:
+            cell.append(obj)
+        self.keys[obj] = key
+        if obj.radius > self.max_radius:
+            self.max_radius = obj.radius
+    
+    def remove(self, obj):
+        key = self.keys.pop(obj, None)
+        if key is not None:
+            self.cells[key].remove(obj)
+    
+    def query(self, x, y, radius):
+        """Возвращает объекты, которые могут касаться круга (x, y, radius)"""
+        reach = radius + self.max_radius
+        size = self.cell_size
+        min_cx = int((x - reach) // size)
+        max_cx = int((x + reach) // size)
+        min_cy = int((y - reach) // size)
+        max_cy = int((y + reach) // size)
+        
+        found = []
+        cells = self.cells
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                cell = cells.get((cx, cy))
+                if cell:
+                    found.extend(cell)
+        return found
+
+
+# Неподвижная арена: её размеры и сетка препятствий, где каждое препятствие
+# лежит во всех ячейках, которые задевает
+class ObstacleGrid:
+    def __init__(self, obstacles, width=WIDTH, height=HEIGHT, cell_size=64):
+        self.width = width  # размеры арены, за которые нельзя выйти
+        self.height = height
+        self.cell_size = cell_size
+        self.obstacles = list(obstacles)
+        self.cells = {}  # (cx, cy) -> индексы препятствий по возрастанию
+        for index, obstacle in enumerate(self.obstacles):
+            min_cx = int(obstacle.x // cell_size)
+            max_cx = int((obstacle.x + obstacle.width) // cell_size)
+            min_cy = int(obstacle.y // cell_size)
+            max_cy = int((obstacle.y + obstacle.height) // cell_size)
+            for cx in range(min_cx, max_cx + 1):
+                for cy in range(min_cy, max_cy + 1):
+                    self.cells.setdefault((cx, cy), []).append(index)
+    
+    def __iter__(self):
+        return iter(self.obstacles)
+    
+    def __len__(self):
+        return len(self.obstacles)
+    
+    def query(self, min_x, min_y, max_x, max_y):
+        """Препятствия, которые могут задевать прямоугольник, в исходном порядке"""
+        size = self.cell_size
+        min_cx = int(min_x // size)
+        max_cx = int(max_x // size)
+        min_cy = int(min_y // size)
+        max_cy = int(max_y // size)
+        cells = self.cells
+        obstacles = self.obstacles
+        
+        # Обычно прямоугольник помещается в одну ячейку
+        if min_cx == max_cx and min_cy == max_cy:
+            return [obstacles[i] for i in cells.get((min_cx, min_cy), ())]
+        
+        found = set()
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                cell = cells.get((cx, cy))
+                if cell:
+                    found.update(cell)
+        return [obstacles[i] for i in sorted(found)]
+
+
+# Проходит ли круг радиуса radius по прямой от (x0, y0) до (x1, y1), не задевая
+# препятствий; с radius=0 - видна ли одна точка из другой
+def segment_clear(obstacle_grid, x0, y0, x1, y1, radius=0):
+    dx = x1 - x0
+    dy = y1 - y0
+    nearby = obstacle_grid.query(min(x0, x1) - radius, min(y0, y1) - radius,
+                                 max(x0, x1) + radius, max(y0, y1) + radius)
+    for obstacle in nearby:
+        # Отрезок против препятствия, расширенного на радиус (метод плит)
+        enter, leave = 0.0, 1.0
+        for start, delta, low, high in (
+            (x0, dx, obstacle.x - radius, obstacle.x + obstacle.width + radius),
+            (y0, dy, obstacle.y - radius, obstacle.y + obstacle.height + radius),
+        ):
+            if delta == 0:
+                if start <= low or start >= high:
+                    break
+                continue
+            near = (low - start) / delta
+            far = (high - start) / delta
+            if near > far:
+                near, far = far, near
+            enter = max(enter, near)
+            leave = min(leave, far)
+            if enter >= leave:
+                break
+        else:
+            return False
+    return True
+
+# Какие точки сетки (строки centers_y, столбцы centers_x) ближе clearance к препятствиям
+def near_obstacles(obstacles, centers_x, centers_y, clearance):
+    near = np.zeros((len(centers_y), len(centers_x)), dtype=bool)
+    for obstacle in obstacles:
+        gap_x = np.maximum(np.maximum(obstacle.x - centers_x, centers_x - obstacle.x - obstacle.width), 0)
+        gap_y = np.maximum(np.maximum(obstacle.y - centers_y, centers_y - obstacle.y - obstacle.height), 0)
+        near |= gap_y[:, None] ** 2 + gap_x[None, :] ** 2 < clearance ** 2
+    return near
+
+# Навигация ботов: сетка проходимости арены и поля направлений к целям.
+# Поле строится поиском в ширину от клетки цели один раз и общее для всех
+# ботов, идущих к этой клетке; бот узнаёт направление за O(1) по своей клетке.
+# Препятствия неподвижны, поэтому построенное поле верно всю игру
+NAV_CELL = 40
+NAV_CLEARANCE = 32  # радиус самого крупного бойца: клетка закрыта, если его центр в ней задевает стену
+FLOW_CACHE_SIZE = 64  # сколько полей хранить (вытесняются давно не нужные)
+FLOW_BUILDS_PER_TICK = 2  # новых полей за тик; остальные боты пока идут напрямую
+FLOW_RANGE = 800  # радиус поля в пикселях пути: дальняя видимость цели (игрока) с запасом на обход
+
+class NavigationGrid:
+    # Соседние клетки: сначала по осям, затем по диагоналям
+    NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+    
+    def __init__(self, obstacle_grid, cell_size=NAV_CELL, clearance=NAV_CLEARANCE):
+        self.obstacle_grid = obstacle_grid
+        self.cell_size = cell_size
+        self.cols = math.ceil(obstacle_grid.width / cell_size)
+        self.rows = math.ceil(obstacle_grid.height / cell_size)
+        
+        # Клетка закрыта, если её центр ближе clearance к какому-нибудь препятствию
+        centers_x = (np.arange(self.cols) + 0.5) * cell_size
+        centers_y = (np.arange(self.rows) + 0.5) * cell_size
+        blocked = near_obstacles(obstacle_grid, centers_x, centers_y, clearance)
+        self.blocked = blocked
+        
+        # Сетка с рамкой из закрытых клеток: поиску не нужны проверки границ
+        self.stride = self.cols + 2
+        padded = np.zeros((self.rows + 2, self.cols + 2), dtype=bool)
+        padded[1:-1, 1:-1] = ~blocked
+        self.open = padded.ravel().tolist()
+        self.steps = tuple(dy * self.stride + dx for dx, dy in self.NEIGHBOURS)
+        # Для диагонального шага - два шага по осям, через которые он проходит
+        self.corners = tuple((dx, dy * self.stride) if dx and dy else None for dx, dy in self.NEIGHBOURS)
+        self.open_mask = padded.ravel()
+        # Открытые соседи каждой клетки; по диагонали - только если обе клетки
+        # по осям открыты (не срезаем угол стены)
+        open_ = self.open
+        self.links = [[] for _ in open_]
+        for i in np.flatnonzero(np.pad(np.ones_like(blocked), 1).ravel()).tolist():
+            for step, corner in zip(self.steps, self.corners):
+                if open_[i + step] and (not corner or (open_[i + corner[0]] and open_[i + corner[1]])):
+                    self.links[i].append(i + step)
+        # Дальше этого поле не строится: бот не видит цель дальше VISION_RANGE
+        self.range_steps = math.ceil(FLOW_RANGE / cell_size)
+        
+        self.fields = OrderedDict()  # клетка цели -> направление из каждой клетки
+        self.builds_left = FLOW_BUILDS_PER_TICK
+        self.lookups = 0  # запросов направления в обход
+        self.builds = 0  # построено полей
+        self.deferred = 0  # поле не построено из-за лимита на тик
+    
+    def cell(self, x, y):
+        """Индекс клетки с точкой (x, y) в сетке с рамкой"""
+        size = self.cell_size
+        col = min(max(int(x // size), 0), self.cols - 1)
+        row = min(max(int(y // size), 0), self.rows - 1)
+        return (row + 1) * self.stride + col + 1
+    
+    def new_tick(self):
+        self.builds_left = FLOW_BUILDS_PER_TICK
+    
+    def field(self, goal):
+        """Поле направлений к клетке goal (None, если лимит построений исчерпан)"""
+        directions = self.fields.get(goal)
+        if directions is not None:
+            self.fields.move_to_end(goal)
+            return directions
+        if self.builds_left <= 0:
+            self.deferred += 1
+            return None
+        self.builds_left -= 1
+        self.builds += 1
+        directions = self.build(goal)
+        self.fields[goal] = directions
+        if len(self.fields) > FLOW_CACHE_SIZE:
+            self.fields.popitem(last=False)
+        return directions
+    
+    def build(self, goal):
+        """Поиск в ширину от goal и выбор для каждой клетки соседа ближе к цели"""
+        links = self.links
+        limit = self.range_steps
+        dist = [-1] * len(self.open)
+        dist[goal] = 0
+        frontier = deque([goal])
+        while frontier:
+            i = frontier.popleft()
+            d = dist[i] + 1
+            if d > limit:
+                break
+            for j in links[i]:
+                if dist[j] < 0:
+                    dist[j] = d
+                    frontier.append(j)
+        
+        distance = np.array(dist, dtype=np.float64)
+        distance[distance < 0] = np.inf
+        # Клетки в пределах поля вокруг цели
+        row, col = divmod(goal, self.stride)
+        rows = np.arange(max(1, row - limit - 1), min(self.rows, row + limit + 1) + 1)
+        cols = np.arange(max(1, col - limit - 1), min(self.cols, col + limit + 1) + 1)
+        cells = (rows[:, None] * self.stride + cols[None, :]).ravel()
+        # Расстояние до цели через каждого соседа; из закрытой клетки (боец прижат к стене)
+        # тоже выводим к ближайшей открытой
+        through = np.stack([distance[cells + step] for step in self.steps])
+        for k, corner in enumerate(self.corners):
+            if corner:
+                cut = ~(self.open_mask[cells + corner[0]] & self.open_mask[cells + corner[1]])
+                through[k, cut] = np.inf
+        best = np.argmin(through, axis=0)
+        best_distance = through[best, np.arange(len(cells))]
+        directions = np.full(len(self.open), -1, dtype=np.int8)
+        useful = (best_distance < distance[cells]) & np.isfinite(best_distance)
+        directions[cells[useful]] = best[useful]
+        return directions
+    
+    def heading(self, bot, target):
+        """Угол движения бота к цели в обход стен (None - идти прямо)"""
+        if segment_clear(self.obstacle_grid, bot.x, bot.y, target.x, target.y, bot.radius):
+            return None
+        self.lookups += 1
+        directions = self.field(self.cell(target.x, target.y))
+        if directions is None:
+            return None
+        index = self.cell(bot.x, bot.y)
+        k = directions[index]
+        if k < 0:
+            return None
+        # Держим курс на центр следующей клетки, чтобы не цеплять углы стен
+        row, col = divmod(index + self.steps[k], self.stride)
+        size = self.cell_size
+        return math.atan2((row - 0.5) * size - bot.y, (col - 0.5) * size - bot.x)
+
+
+# Прямая видимость между точками арены (пули летят сквозь стены, поэтому боты
+# и турели стреляют, только видя цель). Для пары клеток запоминается, видна ли
+# из любой точки одной клетки любая точка другой: тогда точный отрезок не нужен.
+# Запросы одного тика дополнительно запоминаются целиком
+LOS_CELL = 20
+LOS_CACHE_SIZE = 65536  # пар клеток в кэше (переполненный кэш начинается заново)
+
+class LineOfSight:
+    def __init__(self, obstacle_grid, cell_size=LOS_CELL):
+        self.obstacle_grid = obstacle_grid
+        self.cell_size = cell_size
+        self.pairs = {}  # ((столбец, строка), (столбец, строка)) -> видны ли клетки целиком
+        self.memo = {}  # ответы за текущий тик
+        self.queries = 0
+        self.memo_hits = 0  # ответ уже был в этом тике
+        self.pair_hits = 0  # пара клеток уже была в кэше
+        self.exact = 0  # понадобилась точная проверка отрезка
+    
+    def new_tick(self):
+        self.memo.clear()
+    
+    def pair_clear(self, a, b):
+        """Видна ли из любой точки клетки a любая точка клетки b"""
+        # Все отрезки между двумя клетками лежат в следе квадрата клетки,
+        # протянутого от центра одной к центру другой: это отрезок между
+        # центрами против препятствий, расширенных на полклетки
+        size = self.cell_size
+        half = size / 2
+        return segment_clear(self.obstacle_grid,
+                             a[0] * size + half, a[1] * size + half,
+                             b[0] * size + half, b[1] * size + half, half)
+    
+    def visible(self, x0, y0, x1, y1):
+        """Видна ли точка (x1, y1) из точки (x0, y0)"""
+        self.queries += 1
+        key = (x0, y0, x1, y1)
+        result = self.memo.get(key)
+        if result is not None:
+            self.memo_hits += 1
+            return result
+        size = self.cell_size
+        a = (int(x0 // size), int(y0 // size))
+        b = (int(x1 // size), int(y1 // size))
+        pair = (a, b) if a <= b else (b, a)
+        clear = self.pairs.get(pair)
+        if clear is None:
+            clear = self.pair_clear(a, b)
+            if len(self.pairs) >= LOS_CACHE_SIZE:
+                self.pairs.clear()
+            self.pairs[pair] = clear
+        else:
+            self.pair_hits += 1
+        if clear:
+            result = True
+        else:
+            # Клетки видны друг другу лишь частично (или не видны) - проверяем сами точки
+            self.exact += 1
+            result = segment_clear(self.obstacle_grid, x0, y0, x1, y1)
+        self.memo[key] = result
+        self.memo[(x1, y1, x0, y0)] = result
+        return result
+    
+    def hit_rate(self):
+        """Доля запросов без точной проверки отрезка"""
+        return 1 - self.exact / self.queries if self.queries else 0.0
+
+
+# Места появления ботов: заранее найденные клетки, в которых бот целиком
+# помещается между стенами. Для клетки игрока они упорядочены по удалённости
+# от неё, поэтому место в нужной полосе расстояний выбирается за O(1),
+# без повторных попыток, и появление никогда не срывается
+SPAWN_CELL = 25
+SPAWN_MARGIN = 50  # отступ от краёв арены
+SPAWN_MIN_DISTANCE = 150  # не ближе этого к игроку
+SPAWN_CACHE_SIZE = 32  # сколько клеток игрока помнить
+
+class SpawnIndex:
+    def __init__(self, obstacle_grid, cell_size=SPAWN_CELL, clearance=NAV_CLEARANCE, margin=SPAWN_MARGIN):
+        self.cell_size = cell_size
+        cols = int((obstacle_grid.width - 2 * margin) // cell_size)
+        rows = int((obstacle_grid.height - 2 * margin) // cell_size)
+        centers_x = margin + (np.arange(cols) + 0.5) * cell_size
+        centers_y = margin + (np.arange(rows) + 0.5) * cell_size
+        # Бот может появиться в любой точке клетки, поэтому запас больше на полдиагонали
+        reach = clearance + cell_size * 0.7072
+        free = ~near_obstacles(obstacle_grid, centers_x, centers_y, reach)
+        rows_free, cols_free = np.nonzero(free)
+        self.xs = centers_x[cols_free]  # центры свободных клеток
+        self.ys = centers_y[rows_free]
+        self.points = list(zip(self.xs.tolist(), self.ys.tolist()))
+        # Клетка игрока -> (клетки по удалённости, их расстояния, найденные полосы)
+        self.by_cell = OrderedDict()
+    
+    def __len__(self):
+        return len(self.points)
+    
+    def ordered(self, x, y):
+        """Свободные клетки по удалённости от клетки с точкой (x, y)"""
+        size = self.cell_size
+        key = (int(x // size), int(y // size))
+        entry = self.by_cell.get(key)
+        if entry is not None:
+            self.by_cell.move_to_end(key)
+            return entry
+        center_x = (key[0] + 0.5) * size
+        center_y = (key[1] + 0.5) * size
+        distance = np.hypot(self.xs - center_x, self.ys - center_y)
+        order = np.argsort(distance, kind="stable")
+        points = self.points
+        entry = ([points[i] for i in order.tolist()], distance[order], {})
+        self.by_cell[key] = entry
+        if len(self.by_cell) > SPAWN_CACHE_SIZE:
+            self.by_cell.popitem(last=False)
+        return entry
+    
+    def band(self, distance, min_distance, max_distance):
+        """Границы среза отсортированных клеток для полосы расстояний"""
+        # Расстояния считаются между центрами клеток: запас на положение внутри клеток
+        slack = self.cell_size * 1.415
+        low = int(np.searchsorted(distance, min_distance + slack))
+        high = len(distance)
+        if max_distance is not None:
+            high = int(np.searchsorted(distance, max_distance - slack, side="right"))
+        if low >= high:
+            # Полоса пуста: берём самые дальние подходящие клетки
+            low = max(0, min(low, high) - 1)
+            high = max(high, low + 1)
+        return low, high
+    
+    def sample(self, rng, x, y, min_distance=SPAWN_MIN_DISTANCE, max_distance=None):
+        """Случайная свободная точка на расстоянии от min_distance до max_distance от (x, y)"""
+        points, distance, bands = self.ordered(x, y)
+        limits = bands.get((min_distance, max_distance))
+        if limits is None:
+            limits = bands[min_distance, max_distance] = self.band(distance, min_distance, max_distance)
+        center_x, center_y = points[rng.randrange(*limits)]
+        size = self.cell_size
+        return (center_x + (rng.random() - 0.5) * size,
+                center_y + (rng.random() - 0.5) * size)
+
+
+# Замер времени по фазам (тика симуляции или кадра)
+class PhaseTimer:
+    def __init__(self, track_memory=False):
+        self.totals = {}  # фаза -> суммарное время в секундах
+        self.allocated = {}  # фаза -> пик выделенной памяти в байтах (нужен tracemalloc)
+        self.track_memory = track_memory
+        self.last = 0.0
+        self.memory_mark = 0
+    
+    def start(self):
+        self.last = time.perf_counter()
+        if self.track_memory:
+            self.memory_mark = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+    
+    def mark(self, phase):
+        """Закрывает фазу phase, начатую предыдущей отметкой"""
+        now = time.perf_counter()
+        self.totals[phase] = self.totals.get(phase, 0.0) + now - self.last
+        if self.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            self.allocated[phase] = self.allocated.get(phase, 0) + peak - self.memory_mark
+            self.memory_mark = current
+            tracemalloc.reset_peak()
+        self.last = now
+    
+    def reset(self):
+        self.totals.clear()
+        self.allocated.clear()
+
+
+# Создание персонажа игрока выбранного класса
+def create_player(player_type, player_color, projectiles=None):
+    player = Player(WIDTH // 2, HEIGHT // 2, player_color, 0, projectiles)
     player.player_type = player_type
     
     # Установка характеристик в зависимости от выбранного типа
@@ -1004,36 +2070,1245 @@ def main_game(player_type, player_color):
         player.mines = []
         player.turrets = []
     
-    # Создание ботов
-    bots = []
-    bot_positions = [(200, 200), (WIDTH - 200, HEIGHT - 200), (WIDTH - 200, 200)]
-    for i, pos in enumerate(bot_positions):
-        bot_type = (player_type + i) % 3 + 1
-        bot = Bot(pos[0], pos[1], bot_type)
-        bots.append(bot)
-    
-    # Создание препятствий
-    obstacles = [
-        Obstacle(300, 300, 150, 30, GRID_COLOR),
-        Obstacle(WIDTH - 450, 300, 150, 30, GRID_COLOR),
-        Obstacle(400, 500, 200, 30, GRID_COLOR),
-        Obstacle(WIDTH - 600, 500, 200, 30, GRID_COLOR),
-        Obstacle(WIDTH // 2 - 100, 100, 30, 150, GRID_COLOR),
-        Obstacle(WIDTH // 2 - 100, HEIGHT - 250, 30, 150, GRID_COLOR),
-    ]
+    return player
+
+# Ввод игрока за один тик симуляции
+class PlayerInput:
+    # Запись одного тика: байт флагов и угол прицела в uint16
+    RECORD = struct.Struct("<BH")
+    SIZE = RECORD.size
     
-    # Шрифты для интерфейса
-    font = pygame.font.SysFont(None, 28)
-    font_large = pygame.font.SysFont(None, 50)
+    # Флаги
+    UP, DOWN, LEFT, RIGHT, SHOOT, SPECIAL, MINE, AIM = (1 << i for i in range(8))
+    
+    def __init__(self, dx=0, dy=0, aim=None, shoot=False, special=False, mine=False):
+        self.dx = dx  # -1, 0 или 1 по каждой оси
+        self.dy = dy
+        self.aim = aim  # угол прицела в радианах (None - не менять)
+        self.shoot = shoot
+        self.special = special
+        self.mine = mine
+    
+    def encode(self):
+        """Упаковывает ввод в 3 байта"""
+        flags = 0
+        if self.dy < 0:
+            flags |= self.UP
+        elif self.dy > 0:
+            flags |= self.DOWN
+        if self.dx < 0:
+            flags |= self.LEFT
+        elif self.dx > 0:
+            flags |= self.RIGHT
+        if self.shoot:
+            flags |= self.SHOOT
+        if self.special:
+            flags |= self.SPECIAL
+        if self.mine:
+            flags |= self.MINE
+        aim = 0
+        if self.aim is not None:
+            flags |= self.AIM
+            aim = round(self.aim % (math.pi * 2) / (math.pi * 2) * 65536) % 65536
+        return self.RECORD.pack(flags, aim)
+    
+    @classmethod
+    def decode(cls, data, offset=0):
+        """Восстанавливает ввод из записи, сделанной encode()"""
+        flags, aim = cls.RECORD.unpack_from(data, offset)
+        return cls(
+            (1 if flags & cls.RIGHT else 0) - (1 if flags & cls.LEFT else 0),
+            (1 if flags & cls.DOWN else 0) - (1 if flags & cls.UP else 0),
+            aim / 65536 * math.pi * 2 if flags & cls.AIM else None,
+            bool(flags & cls.SHOOT), bool(flags & cls.SPECIAL), bool(flags & cls.MINE)
+        )
+
+# Планировщик решений ботов: дальние боты думают реже, число решений за тик
+# ограничено. Между решениями бот продолжает двигаться и стрелять (Bot.act).
+# Бюджет считается в решениях, а не в миллисекундах, чтобы матч с тем же
+# вводом повторялся тик в тик
+AI_DECISION_BUDGET = 64
+
+class AIScheduler:
+    VIEW_MARGIN = 100  # запас вокруг вида, в котором бот считается видимым
+    FAR_RANGE = 1500  # дальше этого от игрока - самый редкий уровень
+    # Решение раз в столько тиков: видимые, невидимые, далёкие
+    PERIODS = (1, 4, 8)
+    
+    def __init__(self, budget=AI_DECISION_BUDGET, lod=True):
+        self.budget = budget  # None - без ограничения
+        self.lod = lod  # False - все боты думают каждый тик
+        self.decisions = 0  # решений за последний тик
+        self.deferred = 0  # отложено из-за бюджета за последний тик
+        self.total_decisions = 0
+        self.total_deferred = 0
+    
+    def plan(self, bots, player, tick, width, height):
+        """Для каждого бота - принимает ли он решение в этом тике"""
+        if not bots:
+            self.decisions = self.deferred = 0
+            return []
+        owed = np.fromiter((bot.decision_owed for bot in bots), dtype=bool, count=len(bots))
+        if self.lod:
+            xs, ys = positions(bots)
+            # Вид камеры, следующей за игроком (как в main_game)
+            left = max(0, min(player.x - WIDTH / 2, width - WIDTH))
+            top = max(0, min(player.y - HEIGHT / 2, height - HEIGHT))
+            margin = self.VIEW_MARGIN
+            on_screen = ((xs > left - margin) & (xs < left + WIDTH + margin) &
+                         (ys > top - margin) & (ys < top + HEIGHT + margin))
+            near = (xs - player.x) ** 2 + (ys - player.y) ** 2 < self.FAR_RANGE ** 2
+            visible, hidden, far = self.PERIODS
+            period = np.where(on_screen, visible, np.where(near, hidden, far))
+            # Сдвиг по номеру бота разносит решения дальних ботов по разным тикам
+            uids = np.fromiter((bot.uid for bot in bots), dtype=np.int64, count=len(bots))
+            due = owed | ((tick + uids) % period == 0)
+        else:
+            due = np.ones(len(bots), dtype=bool)
+        
+        candidates = np.flatnonzero(due)
+        deferred = 0
+        if self.budget is not None and len(candidates) > self.budget:
+            # Первыми думают те, кто дольше всех ждёт решения
+            waiting = np.array([
+                tick - bot.last_decision if bot.last_decision is not None else tick + 1
+                for bot in (bots[i] for i in candidates)
+            ])
+            order = np.argsort(-waiting, kind="stable")
+            deferred = len(candidates) - self.budget
+            candidates = np.sort(candidates[order[:self.budget]])
+        
+        thinks = np.zeros(len(bots), dtype=bool)
+        thinks[candidates] = True
+        for i, bot in enumerate(bots):
+            if thinks[i]:
+                bot.last_decision = tick
+                bot.decision_owed = False
+            elif due[i]:
+                bot.decision_owed = True
+        
+        self.decisions = len(candidates)
+        self.deferred = deferred
+        self.total_decisions += self.decisions
+        self.total_deferred += deferred
+        return thinks.tolist()
+
+
+# Препятствия арены: обычная раскладка повторяется на каждом участке размером с окно
+def arena_obstacles(width, height):
+    obstacles = []
+    for tile_x in range(max(1, width // WIDTH)):
+        for tile_y in range(max(1, height // HEIGHT)):
+            x = tile_x * WIDTH
+            y = tile_y * HEIGHT
+            obstacles += [
+                Obstacle(x + 300, y + 300, 150, 30, GRID_COLOR),
+                Obstacle(x + WIDTH - 450, y + 300, 150, 30, GRID_COLOR),
+                Obstacle(x + 400, y + 500, 200, 30, GRID_COLOR),
+                Obstacle(x + WIDTH - 600, y + 500, 200, 30, GRID_COLOR),
+                Obstacle(x + WIDTH // 2 - 100, y + 100, 30, 150, GRID_COLOR),
+                Obstacle(x + WIDTH // 2 - 100, y + HEIGHT - 250, 30, 150, GRID_COLOR),
+            ]
+    return obstacles
+
+# Игровой мир: все правила игры без окна, отрисовки и ограничения FPS.
+# Вся случайность идёт через собственный генератор мира, поэтому матч
+# с тем же зерном и тем же вводом повторяется тик в тик
+class World:
+    def __init__(self, player_type, player_color, seed=None, bot_types=None,
+                 width=WIDTH, height=HEIGHT, bot_count=3):
+        self.player_type = player_type
+        self.player_color = tuple(player_color)
+        # Размер арены не зависит от окна: большая арена повторяет обычную
+        # раскладку препятствий и просматривается через камеру
+        self.width = width
+        self.height = height
+        self.bot_count = bot_count
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        # Ввод игрока по тикам в сжатом виде (см. PlayerInput.encode)
+        self.input_log = bytearray()
+        
+        # Все снаряды мира хранятся вместе в заранее выделенных массивах
+        self.projectiles = ProjectileStore(PROJECTILE_CAPACITY, PROJECTILE_CAPACITY)
+        self.next_uid = 1
+        self.player = create_player(player_type, player_color, self.projectiles)
+        # Игрок и первые боты стоят в центральном участке арены
+        center_x = (width - WIDTH) // 2
+        center_y = (height - HEIGHT) // 2
+        self.player.x = self.player.prev_x = self.player.x + center_x
+        self.player.y = self.player.prev_y = self.player.y + center_y
+        
+        # Создание ботов; bot_types задаёт состав ботов (и тех, кто появится взамен)
+        self.bot_types = tuple(bot_types) if bot_types else None
+        self.bots = []
+        bot_positions = [(200, 200), (WIDTH - 200, HEIGHT - 200), (WIDTH - 200, 200)]
+        for i, pos in enumerate(bot_positions[:bot_count]):
+            if self.bot_types:
+                bot_type = self.bot_types[i % len(self.bot_types)]
+            else:
+                bot_type = (player_type + i) % 3 + 1
+            self.bots.append(self.create_bot(pos[0] + center_x, pos[1] + center_y, bot_type))
+        
+        # Создание препятствий
+        self.obstacles = arena_obstacles(width, height)
+        # Препятствия неподвижны: сетка строится один раз
+        self.obstacle_grid = ObstacleGrid(self.obstacles, width, height)
+        # Поля направлений к целям, общие для всех ботов
+        self.navigation = NavigationGrid(self.obstacle_grid)
+        # Прямая видимость для стрельбы ботов и турелей
+        self.sight = LineOfSight(self.obstacle_grid)
+        
+        # Сетка для поиска ботов рядом с пулями и минами
+        self.bot_hash = SpatialHash()
+        
+        # Остальные боты большой арены появляются в случайных свободных местах
+        self.spawns = SpawnIndex(self.obstacle_grid)
+        self.spawn_wave(bot_count - len(self.bots))
+        
+        self.kills = 0
+        self.damage_dealt = 0  # урон игрока, его турелей и мин по ботам
+        self.damage_taken = 0
+        self.tick = 0
+        self.over = False  # игрок погиб
+        self.timer = None  # PhaseTimer для замера фаз тика
+        self.ai = AIScheduler()
+    
+    def step(self, inputs):
+        """Продвигает симуляцию на один тик"""
+        if self.over:
+            return
+        player = self.player
+        timer = self.timer
+        if timer:
+            timer.start()
+        
+        # Ввод проходит через компактную запись, чтобы живая игра
+        # и её повтор видели одинаково округлённый прицел
+        record = inputs.encode()
+        self.input_log += record
+        inputs = PlayerInput.decode(record)
+        
+        # Запоминаем позиции до тика для плавной отрисовки
+        player.prev_x, player.prev_y = player.x, player.y
+        for bot in self.bots:
+            bot.prev_x, bot.prev_y = bot.x, bot.y
+        
+        # Действия игрока
+        if inputs.shoot:
+            player.shoot()
+        if inputs.special:
+            player.special_attack()
+        if inputs.mine and player.player_type == 4:
+            player.place_mine()
+        
+        # Обновление направления игрока
+        if inputs.aim is not None:
+            player.direction = inputs.aim
+        
+        # Нормализация диагонального движения
+        dx, dy = inputs.dx, inputs.dy
+        if dx != 0 and dy != 0:
+            dx *= 0.7071
+            dy *= 0.7071
+        if timer:
+            timer.mark("input")
+        
+        # Движение игрока
+        player.move(dx, dy, self.obstacle_grid)
+        
+        # Обновление игрока
+        self.sight.new_tick()
+        player.update(self.obstacles, self.bots, self.sight)
+        if timer:
+            timer.mark("player")
+        
+        # Какие боты принимают решения в этом тике и их цели за один проход
+        thinks = self.ai.plan(self.bots, player, self.tick, self.width, self.height)
+        thinking = [bot for bot, think in zip(self.bots, thinks) if think]
+        all_players = [player] + self.bots
+        targets, distances = choose_targets(thinking, all_players)
+        navigation = self.navigation
+        navigation.new_tick()
+        headings = [
+            navigation.heading(bot, target) if target else None
+            for bot, target in zip(thinking, targets)
+        ]
+        sight = self.sight
+        seen = [
+            sight.visible(bot.x, bot.y, target.x, target.y) if target else False
+            for bot, target in zip(thinking, targets)
+        ]
+        if timer:
+            timer.mark("perception")
+        
+        # Обновление ботов: остальные выполняют прежнее решение
+        decisions = iter(zip(targets, distances, headings, seen))
+        for bot, think in zip(self.bots, thinks):
+            if think:
+                target, distance, heading, visible = next(decisions)
+                bot.update_ai(target, distance, self.obstacle_grid, heading=heading, visible=visible)
+            else:
+                bot.update_ai(bot.target, None, self.obstacle_grid, think=False)
+        if timer:
+            timer.mark("bots")
+        
+        # Полёт всех снарядов
+        self.projectiles.update(self.width, self.height)
+        if timer:
+            timer.mark("projectiles")
+        
+        # Сетка ботов для проверки попаданий мин
+        self.update_broadphase()
+        
+        # Проверка столкновений пуль игрока и турелей с ботами
+        self.projectiles.collide(TEAM_PLAYER, list(self.bots), self.damage_bot)
+        
+        # Проверка столкновений пуль ботов с игроком
+        self.projectiles.collide(TEAM_BOTS, [player], self.damage_player)
+        
+        # Проверка столкновений с минами (если игрок ещё жив)
+        if not self.over and player.player_type == 4:
+            for mine in player.mines:
+                if not mine.active:
+                    continue
+                for bot in self.bot_hash.query(mine.x, mine.y, mine.radius):
+                    reach = mine.radius + bot.radius
+                    if (mine.x - bot.x) ** 2 + (mine.y - bot.y) ** 2 < reach * reach:
+                        mine.active = False
+                        self.damage_bot(bot, mine.damage)
+                        break
+        if timer:
+            timer.mark("collisions")
+        
+        self.tick += 1
+    
+    def update_broadphase(self):
+        """Перестраивает сетку ботов после их движения"""
+        self.bot_hash.clear()
+        for bot in self.bots:
+            self.bot_hash.insert(bot)
+    
+    def create_bot(self, x, y, bot_type):
+        bot = Bot(x, y, bot_type, self.projectiles, self.rng)
+        bot.uid = self.next_uid
+        self.next_uid += 1
+        return bot
+    
+    def damage_player(self, player, damage):
+        self.damage_taken += damage
+        player.health -= damage
+        if player.health <= 0:
+            self.over = True  # Конец игры
+    
+    def damage_bot(self, bot, damage):
+        """Наносит урон боту, при гибели засчитывает убийство и создаёт нового"""
+        self.damage_dealt += damage
+        bot.health -= damage
+        if bot.health <= 0:
+            self.kills += 1
+            self.bots.remove(bot)
+            self.bot_hash.remove(bot)
+            self.projectiles.remove_owner(bot.uid)  # пули погибшего исчезают вместе с ним
+            self.respawn_bot()
+    
+    def respawn_bot(self):
+        """Создаёт нового бота в безопасном месте"""
+        self.spawn_wave(1)
+    
+    def spawn_wave(self, count, min_distance=SPAWN_MIN_DISTANCE, max_distance=None):
+        """Создаёт сразу count ботов в свободных местах на расстоянии
+        от min_distance до max_distance от игрока"""
+        player = self.player
+        for _ in range(count):
+            if self.bot_types:
+                bot_type = self.rng.choice(self.bot_types)
+            else:
+                bot_type = self.rng.randint(1, 3)
+            spawn_x, spawn_y = self.spawns.sample(self.rng, player.x, player.y, min_distance, max_distance)
+            bot = self.create_bot(spawn_x, spawn_y, bot_type)
+            self.bots.append(bot)
+            self.bot_hash.insert(bot)
+
+# Автопилот игрока для матчей без человека: турниры, замеры, проверки
+class AutoPilot:
+    # Дистанция до ближайшего бота, которую старается держать автопилот
+    MIN_RANGE = 150
+    MAX_RANGE = 300
+    
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.strafe = 1  # направление обхода цели по кругу
+        self.strafe_time = 0
+    
+    def next_input(self, world):
+        """Ввод на следующий тик для мира world"""
+        player = world.player
+        if not world.bots:
+            return PlayerInput()
+        target = min(world.bots, key=lambda bot: (bot.x - player.x) ** 2 + (bot.y - player.y) ** 2)
+        to_x, to_y = target.x - player.x, target.y - player.y
+        distance = math.hypot(to_x, to_y) or 1
+        to_x, to_y = to_x / distance, to_y / distance
+        
+        # Время от времени меняем сторону обхода
+        if self.strafe_time <= 0:
+            self.strafe = self.rng.choice((-1, 1))
+            self.strafe_time = self.rng.randint(40, 120)
+        self.strafe_time -= 1
+        
+        # Отходим, приближаемся или кружим вокруг цели
+        if distance < self.MIN_RANGE:
+            move_x, move_y = -to_x, -to_y
+        elif distance > self.MAX_RANGE:
+            move_x, move_y = to_x, to_y
+        else:
+            move_x, move_y = -to_y * self.strafe, to_x * self.strafe
+        
+        # Направление превращаем в нажатые клавиши (8 направлений)
+        dx = (move_x > 0.38) - (move_x < -0.38)
+        dy = (move_y > 0.38) - (move_y < -0.38)
+        
+        mine = player.player_type == 4 and player.mine_cooldown <= 0 and distance < self.MIN_RANGE
+        return PlayerInput(dx, dy, math.atan2(to_y, to_x),
+                           shoot=player.cooldown <= 0,
+                           special=player.special_cooldown <= 0,
+                           mine=mine)
+
+# Файл с повтором последнего матча
+REPLAY_FILE = "last_match.sfr"
+# Файл быстрого сохранения (F5); продолжить: --resume FILE
+STATE_FILE = "quicksave.sfws"
+
+# Повтор матча: зерно мира, класс игрока и ввод по тикам
+class Replay:
+    MAGIC = b"SFRP"
+    VERSION = 2
+    # Заголовок: метка, версия, класс, цвет, зерно, число тиков,
+    # размеры арены и число ботов (с версии 2)
+    HEADER = struct.Struct("<4sBB3BIIHHH")
+    HEADER_V1 = struct.Struct("<4sBB3BII")
+    
+    def __init__(self, player_type, player_color, seed, inputs,
+                 width=WIDTH, height=HEIGHT, bot_count=3):
+        self.player_type = player_type
+        self.player_color = tuple(player_color)
+        self.seed = seed
+        self.inputs = bytes(inputs)  # записи PlayerInput.encode() подряд
+        self.width = width
+        self.height = height
+        self.bot_count = bot_count
+    
+    @classmethod
+    def from_world(cls, world):
+        return cls(world.player_type, world.player_color, world.seed, world.input_log,
+                   world.width, world.height, world.bot_count)
+    
+    @property
+    def ticks(self):
+        return len(self.inputs) // PlayerInput.SIZE
+    
+    def to_bytes(self):
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, self.player_type,
+                                  *self.player_color, self.seed, self.ticks,
+                                  self.width, self.height, self.bot_count)
+        return header + zlib.compress(self.inputs, 9)
+    
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, player_type, r, g, b, seed, ticks = cls.HEADER_V1.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError("Это не файл повтора")
+        if version == 1:  # обычная арена
+            header_size = cls.HEADER_V1.size
+            width, height, bot_count = WIDTH, HEIGHT, 3
+        elif version == cls.VERSION:
+            header_size = cls.HEADER.size
+            width, height, bot_count = cls.HEADER.unpack_from(data)[-3:]
+        else:
+            raise ValueError(f"Неподдерживаемая версия повтора: {version}")
+        inputs = zlib.decompress(data[header_size:])
+        if len(inputs) != ticks * PlayerInput.SIZE:
+            raise ValueError("Файл повтора повреждён")
+        return cls(player_type, (r, g, b), seed, inputs, width, height, bot_count)
+    
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+    
+    def play(self, until_tick=None):
+        """Проигрывает матч без отрисовки с максимальной скоростью и возвращает мир"""
+        world = World(self.player_type, self.player_color, self.seed,
+                      width=self.width, height=self.height, bot_count=self.bot_count)
+        ticks = self.ticks if until_tick is None else min(until_tick, self.ticks)
+        for tick in range(ticks):
+            world.step(PlayerInput.decode(self.inputs, tick * PlayerInput.SIZE))
+        return world
+
+# Снимок всего состояния мира в двоичном виде: сохранение и продолжение матча,
+# заготовки для проверок, воспроизводимые отчёты об ошибках. Неподвижная
+# часть мира (препятствия и построенные по ним сетки) не сохраняется, а
+# строится заново по размерам арены; поля путей сохраняются, потому что от
+# них зависит, как боты пойдут дальше
+class WorldState:
+    MAGIC = b"SFWS"
+    VERSION = 2
+    # Метка, версия, класс, цвет, зерно, тик, размеры арены, число ботов,
+    # следующий uid, убийства, урон игрока и по игроку, конец игры, число типов ботов
+    HEADER = struct.Struct("<4sBB3BIIHHHIIddBB")
+    COUNT = struct.Struct("<I")
+    # Игрок и боты; поля ИИ у игрока нулевые. target: uid цели, -1 - нет цели;
+    # last_decision: -1 - решений ещё не было
+    FIGHTER = np.dtype([
+        ("uid", "<i4"), ("type", "u1"), ("x", "<f8"), ("y", "<f8"), ("prev_x", "<f8"), ("prev_y", "<f8"),
+        ("direction", "<f8"), ("health", "<f8"), ("max_health", "<f8"),
+        ("cooldown", "<i4"), ("special_cooldown", "<i4"), ("turret_cooldown", "<i4"), ("mine_cooldown", "<i4"),
+        ("target", "<i4"), ("target_visible", "u1"), ("change_target_time", "<i4"),
+        ("wander_time", "<i4"), ("wander_direction", "<f8"), ("move_x", "<f8"), ("move_y", "<f8"),
+        ("fire_chance", "<f8"), ("special_chance", "<f8"), ("last_decision", "<i4"), ("decision_owed", "u1"),
+    ])
+    TURRET = np.dtype([
+        ("x", "<f8"), ("y", "<f8"), ("damage", "<f8"), ("health", "<f8"),
+        ("cooldown", "<i4"), ("owner", "<i4"), ("color", "u1", 3),
+    ])
+    MINE = np.dtype([
+        ("x", "<f8"), ("y", "<f8"), ("damage", "<f8"), ("active", "u1"), ("blink_timer", "<i4"), ("color", "u1", 3),
+    ])
+    RNG = struct.Struct("<625I")
+    
+    @classmethod
+    def fighter_record(cls, fighter):
+        if isinstance(fighter, Bot):
+            target = fighter.target.uid if fighter.target else -1
+            last_decision = -1 if fighter.last_decision is None else fighter.last_decision
+            ai = (target, fighter.target_visible, fighter.change_target_time, fighter.wander_time,
+                  fighter.wander_direction, fighter.move_x, fighter.move_y, fighter.fire_chance,
+                  fighter.special_chance, last_decision, fighter.decision_owed)
+        else:
+            ai = (-1, 0, 0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, -1, 0)
+        return (fighter.uid, fighter.player_type, fighter.x, fighter.y, fighter.prev_x, fighter.prev_y,
+                fighter.direction, fighter.health, fighter.max_health, fighter.cooldown,
+                fighter.special_cooldown, getattr(fighter, "turret_cooldown", 0),
+                getattr(fighter, "mine_cooldown", 0)) + ai
+    
+    @classmethod
+    def to_bytes(cls, world):
+        player = world.player
+        bot_types = bytes(world.bot_types or ())
+        parts = [cls.HEADER.pack(
+            cls.MAGIC, cls.VERSION, world.player_type, *world.player_color, world.seed, world.tick,
+            world.width, world.height, world.bot_count, world.next_uid, world.kills,
+            world.damage_dealt, world.damage_taken, world.over, len(bot_types)
+        ), bot_types]
+        
+        # Генератор случайных чисел мира (Mersenne Twister: 624 слова и позиция)
+        version, internal, gauss = world.rng.getstate()
+        parts.append(cls.RNG.pack(*internal))
+        
+        fighters = np.array([cls.fighter_record(f) for f in [player] + world.bots], dtype=cls.FIGHTER)
+        turrets = np.array([(t.x, t.y, t.damage, t.health, t.cooldown, t.owner, t.color)
+                            for t in getattr(player, "turrets", ())], dtype=cls.TURRET)
+        mines = np.array([(m.x, m.y, m.damage, m.active, m.blink_timer, m.color)
+                          for m in getattr(player, "mines", ())], dtype=cls.MINE)
+        for records in (fighters, turrets, mines):
+            parts.append(cls.COUNT.pack(len(records)))
+            parts.append(records.tobytes())
+        
+        store = world.projectiles
+        n = store.count
+        parts.append(cls.COUNT.pack(store.next_id))
+        parts.append(cls.COUNT.pack(n))
+        for name in store.FIELDS:
+            parts.append(getattr(store, name)[:n].tobytes())
+        
+        # Поля путей в порядке вытеснения
+        fields = world.navigation.fields
+        parts.append(cls.COUNT.pack(len(fields)))
+        parts.append(np.array(list(fields), dtype="<i4").tobytes())
+        parts.extend(directions.tobytes() for directions in fields.values())
+        
+        parts.append(cls.COUNT.pack(len(world.input_log)))
+        parts.append(bytes(world.input_log))
+        return b"".join(parts)
+    
+    @classmethod
+    def from_bytes(cls, data, world=None):
+        """Восстанавливает мир; world с той же ареной и классом игрока переиспользуется"""
+        header = cls.HEADER.unpack_from(data)
+        (magic, version, player_type, r, g, b, seed, tick, width, height, bot_count,
+         next_uid, kills, damage_dealt, damage_taken, over, type_count) = header
+        if magic != cls.MAGIC:
+            raise ValueError("Это не снимок мира")
+        if version != cls.VERSION:
+            raise ValueError(f"Неподдерживаемая версия снимка мира: {version}")
+        offset = cls.HEADER.size
+        bot_types = tuple(data[offset:offset + type_count]) or None
+        offset += type_count
+        
+        if world is None or (world.width, world.height, world.player_type, world.player_color) != \
+                (width, height, player_type, (r, g, b)):
+            world = World(player_type, (r, g, b), seed, bot_types, width, height, bot_count=0)
+        world.seed = seed
+        world.bot_types = bot_types
+        world.bot_count = bot_count
+        world.tick = tick
+        world.next_uid = next_uid
+        world.kills = kills
+        world.damage_dealt = whole(damage_dealt)
+        world.damage_taken = whole(damage_taken)
+        world.over = bool(over)
+        
+        internal = cls.RNG.unpack_from(data, offset)
+        offset += cls.RNG.size
+        
+        def records(dtype):
+            nonlocal offset
+            (count,) = cls.COUNT.unpack_from(data, offset)
+            offset += cls.COUNT.size
+            array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += count * dtype.itemsize
+            return array
+        
+        fighters = records(cls.FIGHTER).tolist()
+        turrets = records(cls.TURRET).tolist()
+        mines = records(cls.MINE).tolist()
+        
+        # Боты создаются заново (их конструктор берёт число из генератора,
+        # поэтому состояние генератора восстанавливается после)
+        store = world.projectiles
+        player = world.player
+        world.bots = [Bot(record[2], record[3], record[1], store, world.rng) for record in fighters[1:]]
+        by_uid = {0: player}
+        for fighter, record in zip([player] + world.bots, fighters):
+            (fighter.uid, _, fighter.x, fighter.y, fighter.prev_x, fighter.prev_y, fighter.direction,
+             health, max_health, fighter.cooldown, fighter.special_cooldown) = record[:11]
+            fighter.health = whole(health)
+            fighter.max_health = whole(max_health)
+            if fighter is player:
+                if hasattr(player, "turret_cooldown"):
+                    player.turret_cooldown, player.mine_cooldown = record[11:13]
+            else:
+                by_uid[fighter.uid] = fighter
+        for bot, record in zip(world.bots, fighters[1:]):
+            (target, visible, bot.change_target_time, bot.wander_time, bot.wander_direction,
+             bot.move_x, bot.move_y, bot.fire_chance, bot.special_chance, last_decision, owed) = record[13:]
+            bot.target = by_uid.get(target)  # погибшая цель: бот всё равно выберет новую при решении
+            bot.target_visible = bool(visible)
+            bot.last_decision = None if last_decision < 0 else last_decision
+            bot.decision_owed = bool(owed)
+        world.rng.setstate((3, internal, None))
+        
+        # Турели и мины есть только у Гения
+        if player.player_type == 4:
+            player.turrets = []
+            player.mines = []
+        for x, y, damage, health, cooldown, owner, color in turrets:
+            turret = Turret(x, y, whole(damage), tuple(color), store, owner)
+            turret.health = whole(health)
+            turret.cooldown = cooldown
+            player.turrets.append(turret)
+        for x, y, damage, active, blink_timer, color in mines:
+            mine = Mine(x, y, whole(damage), tuple(color))
+            mine.active = bool(active)
+            mine.blink_timer = blink_timer
+            player.mines.append(mine)
+        
+        (store.next_id,) = cls.COUNT.unpack_from(data, offset)
+        offset += cls.COUNT.size
+        (count,) = cls.COUNT.unpack_from(data, offset)
+        offset += cls.COUNT.size
+        if count > store.capacity:
+            store.count = 0
+            store.allocate(max(count, store.capacity * 2))
+        for name, (dtype, width) in store.FIELDS.items():
+            size = count * np.dtype(dtype).itemsize * width
+            array = np.frombuffer(data, dtype=dtype, count=count * width, offset=offset)
+            getattr(store, name)[:count] = array.reshape(-1, width) if width > 1 else array
+            offset += size
+        store.count = count
+        
+        navigation = world.navigation
+        (count,) = cls.COUNT.unpack_from(data, offset)
+        offset += cls.COUNT.size
+        goals = np.frombuffer(data, dtype="<i4", count=count, offset=offset).tolist()
+        offset += count * 4
+        cells = len(navigation.open)
+        navigation.fields = OrderedDict()
+        for goal in goals:
+            navigation.fields[goal] = np.frombuffer(data, dtype=np.int8, count=cells, offset=offset).copy()
+            offset += cells
+        
+        (count,) = cls.COUNT.unpack_from(data, offset)
+        offset += cls.COUNT.size
+        world.input_log = bytearray(data[offset:offset + count])
+        if len(world.input_log) != count:
+            raise ValueError("Снимок мира повреждён")
+        
+        world.update_broadphase()
+        return world
+    
+    @classmethod
+    def save(cls, world, path):
+        with open(path, 'wb') as f:
+            f.write(cls.to_bytes(world))
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+# Числа, сохранённые как double: целые возвращаются целыми, как были в игре
+def whole(value):
+    return int(value) if value.is_integer() else value
+
+# Камера: какая часть арены видна в окне
+class Camera:
+    def __init__(self, width=WIDTH, height=HEIGHT):
+        self.width = width  # размер вида
+        self.height = height
+        self.x = 0  # левый верхний угол вида на арене
+        self.y = 0
+    
+    @property
+    def offset(self):
+        return (self.x, self.y)
+    
+    def follow(self, x, y, world_width, world_height):
+        """Ставит точку (x, y) в центр вида, не выходя за края арены"""
+        self.x = int(max(0, min(x - self.width / 2, world_width - self.width)))
+        self.y = int(max(0, min(y - self.height / 2, world_height - self.height)))
+    
+    def visible(self, x, y, margin):
+        """Попадает ли в вид круг (x, y, margin)"""
+        return (self.x - margin < x < self.x + self.width + margin and
+                self.y - margin < y < self.y + self.height + margin)
+    
+    def to_world(self, pos):
+        """Точка окна (например, курсор) в координатах арены"""
+        return pos[0] + self.x, pos[1] + self.y
+
+# Заранее отрисованный фон арены: сетка и препятствия кусками chunk_size.
+# Куски рисуются при первом появлении в виде, дальше только копируются
+class ArenaLayer:
+    def __init__(self, grid_size=50, chunk_size=512):
+        self.grid_size = grid_size
+        self.chunk_size = chunk_size
+        self.arena = None  # ObstacleGrid, для которой нарисованы куски
+        self.chunks = {}  # (cx, cy) -> Surface
+        self.builds = 0  # сколько кусков фона нарисовано
+    
+    def draw(self, surface, arena, offset=(0, 0)):
+        """Копирует на surface видимые куски фона арены arena (ObstacleGrid)"""
+        if arena is not self.arena:
+            self.chunks.clear()
+            self.arena = arena
+        size = self.chunk_size
+        view_width, view_height = surface.get_size()
+        if arena.width < view_width or arena.height < view_height:
+            surface.fill(BACKGROUND)
+        
+        left, top = offset
+        last_cx = (min(left + view_width, arena.width) - 1) // size
+        last_cy = (min(top + view_height, arena.height) - 1) // size
+        batch = []
+        for cx in range(max(0, left // size), last_cx + 1):
+            for cy in range(max(0, top // size), last_cy + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is None:
+                    chunk = self.chunks[(cx, cy)] = self.build(arena, cx, cy)
+                batch.append((chunk, (cx * size - left, cy * size - top)))
+        surface.blits(batch, False)
+    
+    def build(self, arena, cx, cy):
+        size = self.chunk_size
+        left = cx * size
+        top = cy * size
+        width = min(size, arena.width - left)
+        height = min(size, arena.height - top)
+        surface = pygame.Surface((width, height))
+        surface.fill(BACKGROUND)
+        
+        # Сетка на фоне (линии кратны grid_size в координатах арены)
+        grid = self.grid_size
+        for x in range(-(-left // grid) * grid, left + width, grid):
+            pygame.draw.line(surface, GRID_COLOR, (x - left, 0), (x - left, height), 1)
+        for y in range(-(-top // grid) * grid, top + height, grid):
+            pygame.draw.line(surface, GRID_COLOR, (0, y - top), (width, y - top), 1)
+        
+        # Препятствия, задевающие кусок
+        for obstacle in arena.query(left, top, left + width, top + height):
+            obstacle.draw(surface, (left, top))
+        self.builds += 1
+        
+        # Формат экрана ускоряет копирование, если окно уже открыто
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+        return surface
+
+# Глобальный кэш фона арены
+arena_layer = ArenaLayer()
+
+# Запас вокруг бойца для полоски здоровья и имени при отсечении по виду
+FIGHTER_DRAW_MARGIN = 50
+
+# Отрисовка игрового мира; alpha - доля пути от предыдущего тика к текущему.
+# camera задаёт видимую часть арены (без неё - левый верхний угол)
+def draw_world(surface, world, alpha=1.0, camera=None):
+    if camera is None:
+        camera = Camera(*surface.get_size())
+    offset = camera.offset
+    
+    # Фон, сетка и препятствия готовыми кусками
+    arena_layer.draw(surface, world.obstacle_grid, offset)
+    
+    # Отрисовка ботов в виде
+    for bot in world.bots:
+        if camera.visible(bot.x, bot.y, bot.radius + FIGHTER_DRAW_MARGIN):
+            bot.draw(surface, alpha, offset)
+    
+    # Отрисовка игрока
+    world.player.draw(surface, alpha, offset)
+    
+    # Снаряды, мины и турели
+    world.projectiles.draw(surface, alpha, offset)
+    world.player.draw_gadgets(surface, offset)
+
+# Отрисовка интерфейса
+def draw_hud(surface, world, font):
+    player = world.player
+    
+    # Здоровье игрока
+    health_text = render_text(font, f"Здоровье: {player.health}/{player.max_health}", WHITE)
+    surface.blit(health_text, (20, 20))
     
     # Счётчик убийств
-    kills = 0
+    kills_text = render_text(font, f"Убийств: {world.kills}", WHITE)
+    surface.blit(kills_text, (20, 60))
+    
+    # Количество ботов
+    bots_text = render_text(font, f"Ботов осталось: {len(world.bots)}", WHITE)
+    surface.blit(bots_text, (20, 100))
+    
+    # Перезарядка
+    if player.cooldown > 0:
+        cooldown_text = render_text(font, f"Перезарядка: {player.cooldown}", YELLOW)
+        surface.blit(cooldown_text, (20, 140))
+    else:
+        cooldown_text = render_text(font, "Оружие готово!", GREEN)
+        surface.blit(cooldown_text, (20, 140))
+    
+    # Спец-атака
+    if player.special_cooldown > 0:
+        special_text = render_text(font, f"Спец-атака: {player.special_cooldown}", PURPLE)
+        surface.blit(special_text, (20, 180))
+    else:
+        special_text = render_text(font, "Спец-атака готова! (ПКМ)", GREEN)
+        surface.blit(special_text, (20, 180))
+    
+    # Информация о персонаже (в правом верхнем углу)
+    player_info = render_text(font, f"Персонаж: {player.name}", WHITE)
+    surface.blit(player_info, (WIDTH - player_info.get_width() - 20, 20))
+    
+    # Дополнительная информация для Гения
+    if player.player_type == 4:
+        mines_text = render_text(font, f"Мины: {len(player.mines)}/{player.max_mines}", CYAN)
+        surface.blit(mines_text, (20, 220))
+        
+        turrets_text = render_text(font, f"Турели: {len(player.turrets)}/{player.max_turrets}", CYAN)
+        surface.blit(turrets_text, (20, 260))
+        
+        gen_hint = render_text(font, "Q - поставить мину", CYAN)
+        surface.blit(gen_hint, (WIDTH - gen_hint.get_width() - 20, 60))
+    
+    # Управление (внизу по центру) - разделяем на две строки
+    if player.player_type == 4:
+        controls_line1 = render_text(font, "WASD - движение, ЛКМ - выстрел, Q - мина", WHITE)
+    else:
+        controls_line1 = render_text(font, "WASD - движение, ЛКМ - выстрел", WHITE)
+    controls_line2 = render_text(font, "ПКМ - спец-атака", WHITE)
+    surface.blit(controls_line1, (WIDTH // 2 - controls_line1.get_width() // 2, HEIGHT - 60))
+    surface.blit(controls_line2, (WIDTH // 2 - controls_line2.get_width() // 2, HEIGHT - 30))
+
+# Оверлей профилировщика кадра (F3): фазы кадра и тика, перцентили и график
+class ProfilerOverlay:
+    HISTORY = 240  # сколько последних кадров хранить
+    REFRESH = 15  # текст пересчитывается раз в столько кадров
+    FRAME_PHASES = ("events", "simulation", "draw", "hud", "overlay", "flip")
+    TICK_PHASES = ("input", "player", "perception", "bots", "projectiles", "collisions")
+    WIDTH = 300
+    GRAPH_HEIGHT = 60
+    GRAPH_SCALE = 50.0  # мс на всю высоту графика
+    
+    def __init__(self, killcam=None):
+        self.visible = False
+        self.frame_timer = PhaseTimer()
+        self.tick_timer = PhaseTimer()
+        self.frame_times = deque(maxlen=self.HISTORY)
+        self.phase_history = deque(maxlen=self.HISTORY)
+        self.last_frame = None
+        self.frames = 0
+        self.lines = []
+        self.panel = None  # полупрозрачная подложка
+        self.killcam = killcam  # запись повтора матча, если она идёт
+    
+    def toggle(self, world):
+        """Показывает или скрывает оверлей; скрытый не замеряет ничего"""
+        self.visible = not self.visible
+        world.timer = self.tick_timer if self.visible else None
+        self.frame_times.clear()
+        self.phase_history.clear()
+        self.frame_timer.reset()
+        self.tick_timer.reset()
+        self.last_frame = None
+        self.lines = []
+        # Кадр, в котором нажали F3, замеряется с этого момента
+        self.frame_timer.start()
+    
+    def begin_frame(self):
+        if self.visible:
+            self.frame_timer.start()
+    
+    def mark(self, phase):
+        if self.visible:
+            self.frame_timer.mark(phase)
+    
+    def end_frame(self):
+        """Сохраняет время кадра и фаз в скользящую историю"""
+        if not self.visible:
+            return
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.frame_times.append(now - self.last_frame)
+        self.last_frame = now
+        record = dict(self.frame_timer.totals)
+        record.update(self.tick_timer.totals)
+        self.phase_history.append(record)
+        self.frame_timer.reset()
+        self.tick_timer.reset()
+    
+    def build_lines(self, world):
+        """Строки оверлея: средние времена фаз за историю, перцентили и счётчики"""
+        frames = len(self.phase_history) or 1
+        rows = []
+        if self.frame_times:
+            p50, p95, p99 = np.percentile(np.array(self.frame_times) * 1000, (50, 95, 99))
+            rows.append(("кадр p50/p95/p99", f"{p50:.1f} / {p95:.1f} / {p99:.1f} мс", WHITE))
+        for phase in self.FRAME_PHASES:
+            total = sum(record.get(phase, 0.0) for record in self.phase_history)
+            rows.append((phase, f"{total / frames * 1000:.2f} мс", WHITE))
+            if phase == "simulation":
+                for tick_phase in self.TICK_PHASES:
+                    total = sum(record.get(tick_phase, 0.0) for record in self.phase_history)
+                    rows.append(("    " + tick_phase, f"{total / frames * 1000:.2f} мс", GRAY))
+        player = world.player
+        rows.append(("ботов / снарядов", f"{len(world.bots)} / {len(world.projectiles)}", YELLOW))
+        turrets = getattr(player, "turrets", ())
+        mines = getattr(player, "mines", ())
+        rows.append(("турелей / мин", f"{len(turrets)} / {len(mines)}", YELLOW))
+        ai = world.ai
+        rows.append(("решений ИИ / отложено", f"{ai.decisions} / {ai.deferred}", YELLOW))
+        navigation = world.navigation
+        rows.append(("полей путей / построено", f"{len(navigation.fields)} / {navigation.builds}", YELLOW))
+        rows.append(("видимость без отрезка", f"{world.sight.hit_rate():.0%}", YELLOW))
+        killcam = self.killcam
+        if killcam is not None:
+            rows.append(("повтор, КБ / с", f"{killcam.bytes / 1024:.0f} / {killcam.seconds:.1f}", YELLOW))
+            rows.append(("запись повтора", f"{killcam.capture_cost() * 1e6:.0f} мкс/тик", YELLOW))
+        font = get_font(20)
+        # Подписи постоянны и берутся из кэша; числа меняются каждый раз,
+        # поэтому рисуются мимо text_cache, чтобы не вытеснять его
+        self.lines = [
+            (render_text(font, label, color), font.render(value, True, color))
+            for label, value, color in rows
+        ]
+    
+    def draw(self, surface, world):
+        if not self.visible:
+            return
+        if self.frames % self.REFRESH == 0 or not self.lines:
+            self.build_lines(world)
+        self.frames += 1
+        
+        line_height = 20
+        height = len(self.lines) * line_height + self.GRAPH_HEIGHT + 20
+        x = WIDTH - self.WIDTH - 10
+        y = 100
+        if self.panel is None or self.panel.get_height() != height:
+            self.panel = pygame.Surface((self.WIDTH, height))
+            self.panel.set_alpha(200)
+            self.panel.fill(BLACK)
+        surface.blit(self.panel, (x, y))
+        for i, (label, value) in enumerate(self.lines):
+            line_y = y + 6 + i * line_height
+            surface.blit(label, (x + 8, line_y))
+            surface.blit(value, (x + self.WIDTH - 8 - value.get_width(), line_y))
+        
+        # График времени кадра с отметками 60 и 30 кадров в секунду
+        graph_top = y + height - self.GRAPH_HEIGHT - 8
+        graph_bottom = graph_top + self.GRAPH_HEIGHT
+        for budget, color in ((1000 / 60, GREEN), (1000 / 30, RED)):
+            level = graph_bottom - budget / self.GRAPH_SCALE * self.GRAPH_HEIGHT
+            pygame.draw.line(surface, color, (x + 8, level), (x + self.WIDTH - 8, level), 1)
+        if len(self.frame_times) > 1:
+            step = (self.WIDTH - 16) / (self.HISTORY - 1)
+            points = [
+                (x + 8 + i * step,
+                 graph_bottom - min(frame * 1000 / self.GRAPH_SCALE, 1.0) * self.GRAPH_HEIGHT)
+                for i, frame in enumerate(self.frame_times)
+            ]
+            pygame.draw.lines(surface, WHITE, False, points, 1)
+
+# Повтор последних секунд матча (killcam) для экрана окончания игры.
+# Тики лежат в кольцевом буфере с ограничением по памяти: каждый тик - только
+# то, что нужно для отрисовки (целые пиксели, доли здоровья). Тики идут
+# группами: первый хранится целиком, остальные - разницей с предыдущим, и всё
+# сжимается zlib. При просмотре подряд каждый тик восстанавливается одной
+# распаковкой, без пересчёта симуляции. Старые группы вытесняются целиком -
+# по длине повтора и по бюджету байтов
+KILLCAM_SECONDS = 5
+KILLCAM_BUDGET = 4 * 1024 * 1024  # байтов на сжатые тики
+KILLCAM_SPEEDS = (0.25, 0.5, 1, 2)  # скорости просмотра
+KILLCAM_HOLD = 1.0  # секунд на последнем тике перед повтором сначала
+
+class KillCam:
+    KEY_EVERY = 30  # тиков в группе: ключевой тик и разницы
+    # Тик, убийства, число бойцов, снарядов, турелей и мин
+    HEADER = struct.Struct("<IHHIBB")
+    # Записи - строки матриц int16 по видам. back_x, back_y - сдвиг к позиции
+    # на прошлом тике (для плавной отрисовки). Первый боец - игрок с type 0,
+    # остальные - боты своего типа. У мины lit: 0 - сработала, 1 - погасла, 2 - горит
+    FIGHTER = ("x", "y", "back_x", "back_y", "direction", "health", "type")
+    BULLET = ("x", "y", "back_x", "back_y", "radius", "red", "green", "blue")
+    TURRET = ("x", "y", "radius", "health", "red", "green", "blue")
+    MINE = ("x", "y", "radius", "lit", "red", "green", "blue")
+    KINDS = (FIGHTER, BULLET, TURRET, MINE)
+    # Множители столбцов бойца перед округлением: взгляд в 1/256 оборота, здоровье в 1/255
+    FIGHTER_SCALE = np.array([1, 1, 1, 1, 256 / math.tau, 255, 1])
+    NO_TURRETS = np.zeros((0, len(TURRET)), np.int16)
+    NO_MINES = np.zeros((0, len(MINE)), np.int16)
+    
+    def __init__(self, seconds=KILLCAM_SECONDS, budget=KILLCAM_BUDGET):
+        self.max_ticks = int(seconds * TICK_RATE)
+        self.budget = budget
+        self.groups = deque()  # группы сжатых тиков: ключевой, затем разницы с предыдущим
+        self.frames = 0  # тиков в буфере
+        self.bytes = 0  # сжатых байтов в буфере
+        self.last = None  # записи последнего тика по видам (для разницы со следующим)
+        self.arena = None  # ObstacleGrid матча
+        self.looks = {}  # type -> (цвет, радиус, очки Гения, имя)
+        # Последний распакованный тик: группа, место в ней, заголовок, записи
+        self.decoded = (None, 0, None, None)
+        # Замер записи за всё время
+        self.captures = 0
+        self.capture_time = 0.0
+        self.captured_bytes = 0
+        self.captured_raw = 0  # те же тики без сжатия
+    
+    def __len__(self):
+        return self.frames
+    
+    @property
+    def seconds(self):
+        return self.frames / TICK_RATE
+    
+    @staticmethod
+    def quantize(values):
+        """Округляет матрицу; сдвиги (столбцы 2 и 3) считаются от позиций (0 и 1).
+        Арена намного меньше 32767 пикселей, поэтому значения входят в int16"""
+        np.rint(values, out=values)
+        values[:, 2:4] -= values[:, :2]
+        return values.astype(np.int16)
+    
+    def capture(self, world):
+        """Записывает текущий тик мира (вызывается после каждого World.step)"""
+        start = time.perf_counter()
+        self.arena = world.obstacle_grid
+        player = world.player
+        bots = world.bots
+        
+        values = np.array([(f.x, f.y, f.prev_x, f.prev_y, f.direction, f.health / f.max_health, f.player_type)
+                           for f in [player] + bots], dtype=np.float64)
+        values *= self.FIGHTER_SCALE
+        fighters = self.quantize(values)
+        fighters[:, 4] &= 255
+        fighters[0, 6] = 0
+        # Внешность каждого типа запоминается один раз
+        looks = self.looks
+        if 0 not in looks:
+            looks[0] = (player.color, player.radius, player.player_type == 4, player.name)
+        if len(looks) < 4:
+            for bot in bots:
+                if bot.player_type not in looks:
+                    looks[bot.player_type] = (bot.color, bot.radius, False, bot.name)
+        
+        store = world.projectiles
+        n = store.count
+        values = np.empty((n, len(self.BULLET)))
+        for column, array in enumerate((store.x, store.y, store.prev_x, store.prev_y, store.radius)):
+            values[:, column] = array[:n]
+        values[:, 5:] = store.color[:n]
+        bullets = self.quantize(values)
+        
+        turrets = getattr(player, "turrets", None)
+        mines = getattr(player, "mines", None)
+        if turrets or mines:
+            turrets = np.array([(round(t.x), round(t.y), t.radius, round(t.health / t.max_health * 255), *t.color)
+                                for t in turrets], dtype=np.int16).reshape(-1, len(self.TURRET))
+            mines = np.array([(round(m.x), round(m.y), m.radius,
+                               (2 if m.blink_timer < 15 else 1) if m.active else 0, *m.color)
+                              for m in mines], dtype=np.int16).reshape(-1, len(self.MINE))
+            kinds = [fighters, bullets, turrets, mines]
+        else:
+            kinds = [fighters, bullets, self.NO_TURRETS, self.NO_MINES]
+        header = self.HEADER.pack(world.tick, world.kills, *map(len, kinds))
+        if not self.groups or len(self.groups[-1]) == self.KEY_EVERY:
+            # Новая группа начинается с ключевого тика
+            self.groups.append([])
+            self.last = kinds
+        else:
+            previous = self.last
+            self.last = [records.copy() for records in kinds]
+            for records, base in zip(kinds, previous):
+                common = min(len(records), len(base))
+                if common:
+                    records[:common] -= base[:common]
+        raw = header + b"".join(records.tobytes() for records in kinds)
+        blob = zlib.compress(raw, 1)
+        self.groups[-1].append(blob)
+        self.frames += 1
+        self.bytes += len(blob)
+        
+        # Вытесняем старые группы: сверх длины повтора и сверх бюджета
+        groups = self.groups
+        while len(groups) > 1 and (self.frames - len(groups[0]) >= self.max_ticks or self.bytes > self.budget):
+            group = groups.popleft()
+            self.frames -= len(group)
+            self.bytes -= sum(map(len, group))
+        
+        self.captures += 1
+        self.captured_bytes += len(blob)
+        self.captured_raw += len(raw)
+        self.capture_time += time.perf_counter() - start
+    
+    def decode(self, blob, previous=None):
+        """Заголовок тика и матрицы записей по видам; previous - записи прошлого тика группы"""
+        data = zlib.decompress(blob)
+        header = self.HEADER.unpack_from(data)
+        offset = self.HEADER.size
+        kinds = []
+        for i, (columns, count) in enumerate(zip(self.KINDS, header[2:])):
+            width = len(columns)
+            records = np.frombuffer(data, "<i2", count * width, offset).reshape(count, width)
+            offset += records.nbytes
+            if previous is not None:
+                records = records.copy()
+                common = min(count, len(previous[i]))
+                records[:common] += previous[i][:common]
+            kinds.append(records)
+        return header, kinds
+    
+    def frame(self, index):
+        """Тик буфера по номеру (0 - самый старый): тик, убийства и записи по видам.
+        Следующий тик после уже показанного восстанавливается одной распаковкой"""
+        group = self.groups[index // self.KEY_EVERY]
+        position = index % self.KEY_EVERY
+        decoded_group, decoded_position, header, kinds = self.decoded
+        if decoded_group is not group or decoded_position > position:
+            decoded_position = 0
+            header, kinds = self.decode(group[0])
+        while decoded_position < position:
+            decoded_position += 1
+            header, kinds = self.decode(group[decoded_position], kinds)
+        self.decoded = (group, position, header, kinds)
+        return (header[0], header[1], *kinds)
+    
+    def draw(self, surface, position, camera):
+        """Рисует повтор в момент position - номер тика буфера, дробная часть
+        сглаживает путь к следующему тику. Камера следует за игроком"""
+        index = int(position)
+        alpha = position - index
+        if index + 1 < self.frames:
+            index += 1
+        else:
+            alpha = 1.0
+        tick, kills, fighters, bullets, turrets, mines = self.frame(index)
+        rest = 1.0 - alpha
+        
+        fx = fighters[:, 0] + fighters[:, 2] * rest
+        fy = fighters[:, 1] + fighters[:, 3] * rest
+        camera.follow(fx[0], fy[0], self.arena.width, self.arena.height)
+        offset = camera.offset
+        arena_layer.draw(surface, self.arena, offset)
+        
+        # Боты, затем игрок поверх них
+        directions = (fighters[:, 4] * (math.tau / 256)).tolist()
+        health = (fighters[:, 5] / 255).tolist()
+        fighters = list(zip(fx.tolist(), fy.tolist(), directions, health, fighters[:, 6].tolist()))
+        for x, y, direction, ratio, kind in fighters[1:] + fighters[:1]:
+            color, radius, genius, name = self.looks[kind]
+            if camera.visible(x, y, radius + FIGHTER_DRAW_MARGIN):
+                draw_fighter(surface, x - offset[0], y - offset[1], color, radius, genius, direction, ratio, name)
+        
+        draw_bullets(surface, bullets[:, 0] + bullets[:, 2] * rest, bullets[:, 1] + bullets[:, 3] * rest,
+                     bullets[:, 4].astype(np.float64), bullets[:, 5:8], offset)
+        
+        # Мины и турели рисуют сами себя
+        for x, y, radius, lit, *color in mines.tolist():
+            if lit:
+                mine = Mine(x, y, 0, tuple(color))
+                mine.radius = radius
+                mine.blink_timer = 0 if lit == 2 else 15
+                mine.draw(surface, offset)
+        for x, y, radius, ratio, *color in turrets.tolist():
+            turret = Turret(x, y, 0, tuple(color), None)
+            turret.radius = radius
+            turret.health = ratio / 255 * turret.max_health
+            turret.draw(surface, offset)
+    
+    def capture_cost(self):
+        """Среднее время записи тика в секундах"""
+        return self.capture_time / max(self.captures, 1)
+    
+    def report(self):
+        ratio = self.captured_raw / max(self.captured_bytes, 1)
+        return (f"{self.seconds:.1f} с, {self.bytes / 1024:.0f} из {self.budget / 1024:.0f} КБ "
+                f"(сжатие {ratio:.1f}x), запись {self.capture_cost() * 1e6:.0f} мкс/тик")
+
+# Основная игровая функция: ввод и отрисовка поверх World.
+# Возвращает мир закончившегося матча (счёт - world.kills).
+# Симуляция идёт фиксированными тиками TICK_RATE раз в секунду независимо
+# от частоты кадров: за кадр выполняется столько тиков, сколько накопилось
+# времени, а отрисовка сглаживается между двумя последними тиками
+def main_game(player_type, player_color, render_fps=RENDER_FPS, arena_scale=1, world=None, killcam=None):
+    init_display()
+    # Арена arena_scale x arena_scale окон, ботов - по три на каждый участок;
+    # world - продолжение сохранённого матча, killcam записывает тики для повтора
+    if world is None:
+        world = World(player_type, player_color, width=WIDTH * arena_scale, height=HEIGHT * arena_scale,
+                      bot_count=3 * arena_scale * arena_scale)
+    player = world.player
+    camera = Camera(WIDTH, HEIGHT)
+    
+    # Шрифт для интерфейса
+    font = get_font(28)
     
     # Основной игровой цикл
     clock = pygame.time.Clock()
-    running = True
+    accumulator = 0.0
+    # Нажатия ждут ближайшего тика, даже если кадр обошёлся без тиков
+    shoot = special = mine = False
+    profiler = ProfilerOverlay(killcam)
     
-    while running:
+    while not world.over:
+        # Время с прошлого кадра; после долгой паузы не пытаемся догнать всё сразу
+        accumulator += min(clock.tick(render_fps) / 1000, MAX_FRAME_TIME)
+        profiler.begin_frame()
+        
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
@@ -1042,18 +3317,21 @@ def main_game(player_type, player_color):
             # Управление мышью
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:  # ЛКМ
-                    player.shoot()
+                    shoot = True
                 elif event.button == 3:  # ПКМ
-                    player.special_attack()
+                    special = True
             
             # Управление клавишами для Гения
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_q and player.player_type == 4:  # Q - мина для Гения
-                    player.place_mine()
-        
-        # Обновление направления игрока
-        mouse_pos = pygame.mouse.get_pos()
-        player.update_direction(mouse_pos)
+                if event.key == pygame.K_q:  # Q - мина для Гения
+                    mine = True
+                elif event.key == pygame.K_F3:  # F3 - профилировщик
+                    profiler.toggle(world)
+                elif event.key == pygame.K_F5:  # F5 - быстрое сохранение
+                    try:
+                        WorldState.save(world, STATE_FILE)
+                    except OSError:
+                        print("Ошибка быстрого сохранения")
         
         # Управление с клавиатуры
         keys = pygame.key.get_pressed()
@@ -1066,206 +3344,61 @@ def main_game(player_type, player_color):
             dx -= 1
         if keys[pygame.K_d]:
             dx += 1
+        profiler.mark("events")
         
-        # Нормализация диагонального движения
-        if dx != 0 and dy != 0:
-            dx *= 0.7071
-            dy *= 0.7071
-        
-        # Движение игрока
-        player.move(dx, dy, obstacles)
-        
-        # Обновление игрока
-        player.update(obstacles, bots)
-        
-        # Обновление ботов
-        all_players = [player] + bots
-        for bot in bots:
-            bot.update_ai(all_players, obstacles)
-        
-        # Проверка столкновений пуль игрока с ботами
-        for bullet in player.bullets[:]:
-            for bot in bots[:]:
-                distance = math.sqrt((bullet.x - bot.x) ** 2 + (bullet.y - bot.y) ** 2)
-                if distance < bullet.radius + bot.radius:
-                    bot.health -= bullet.damage
-                    if bullet in player.bullets:
-                        player.bullets.remove(bullet)
-                    
-                    if bot.health <= 0:
-                        kills += 1
-                        bots.remove(bot)
-                        # Создаем нового бота в безопасном месте
-                        spawn_attempts = 0
-                        while spawn_attempts < 10:
-                            bot_type = random.randint(1, 3)
-                            spawn_x = random.randint(50, WIDTH - 50)
-                            spawn_y = random.randint(50, HEIGHT - 50)
-                            
-                            # Проверяем, чтобы бот не появился слишком близко к игроку
-                            distance_to_player = math.sqrt((spawn_x - player.x) ** 2 + (spawn_y - player.y) ** 2)
-                            if distance_to_player > 150:
-                                bots.append(Bot(spawn_x, spawn_y, bot_type))
-                                break
-                            spawn_attempts += 1
-                    break
-        
-        # Проверка столкновений пуль ботов с игроком
-        for bot in bots:
-            for bullet in bot.bullets[:]:
-                distance = math.sqrt((bullet.x - player.x) ** 2 + (bullet.y - player.y) ** 2)
-                if distance < bullet.radius + player.radius:
-                    player.health -= bullet.damage
-                    if bullet in bot.bullets:
-                        bot.bullets.remove(bullet)
-                    
-                    if player.health <= 0:
-                        # Сохраняем статистику перед выходом
-                        stats.add_kills(kills, player_type)
-                        return kills  # Конец игры
-        
-        # Проверка столкновений пуль турелей с ботами
-        if player.player_type == 4:
-            for turret in player.turrets:
-                for bullet in turret.bullets[:]:
-                    for bot in bots[:]:
-                        distance = math.sqrt((bullet.x - bot.x) ** 2 + (bullet.y - bot.y) ** 2)
-                        if distance < bullet.radius + bot.radius:
-                            bot.health -= bullet.damage
-                            if bullet in turret.bullets:
-                                turret.bullets.remove(bullet)
-                            
-                            if bot.health <= 0:
-                                kills += 1
-                                bots.remove(bot)
-                                # Создаем нового бота
-                                spawn_attempts = 0
-                                while spawn_attempts < 10:
-                                    bot_type = random.randint(1, 3)
-                                    spawn_x = random.randint(50, WIDTH - 50)
-                                    spawn_y = random.randint(50, HEIGHT - 50)
-                                    
-                                    distance_to_player = math.sqrt((spawn_x - player.x) ** 2 + (spawn_y - player.y) ** 2)
-                                    if distance_to_player > 150:
-                                        bots.append(Bot(spawn_x, spawn_y, bot_type))
-                                        break
-                                    spawn_attempts += 1
-                            break
-        
-        # Проверка столкновений с минами (для Гения)
-        if player.player_type == 4:
-            for mine in player.mines[:]:
-                for bot in bots[:]:
-                    distance = math.sqrt((mine.x - bot.x) ** 2 + (mine.y - bot.y) ** 2)
-                    if distance < mine.radius + bot.radius and mine.active:
-                        bot.health -= mine.damage
-                        mine.active = False
-                        
-                        if bot.health <= 0:
-                            kills += 1
-                            bots.remove(bot)
-                            # Создаем нового бота
-                            spawn_attempts = 0
-                            while spawn_attempts < 10:
-                                bot_type = random.randint(1, 3)
-                                spawn_x = random.randint(50, WIDTH - 50)
-                                spawn_y = random.randint(50, HEIGHT - 50)
-                                
-                                distance_to_player = math.sqrt((spawn_x - player.x) ** 2 + (spawn_y - player.y) ** 2)
-                                if distance_to_player > 150:
-                                    bots.append(Bot(spawn_x, spawn_y, bot_type))
-                                    break
-                                spawn_attempts += 1
-                        break
-        
-        # Отрисовка
-        screen.fill(BACKGROUND)
-        
-        # Сетка на фоне
-        grid_size = 50
-        for x in range(0, WIDTH, grid_size):
-            pygame.draw.line(screen, GRID_COLOR, (x, 0), (x, HEIGHT), 1)
-        for y in range(0, HEIGHT, grid_size):
-            pygame.draw.line(screen, GRID_COLOR, (0, y), (WIDTH, y), 1)
-        
-        # Отрисовка препятствий
-        for obstacle in obstacles:
-            obstacle.draw(screen)
-        
-        # Отрисовка ботов
-        for bot in bots:
-            bot.draw(screen)
-            bot.draw_bullets(screen)
-        
-        # Отрисовка игрока
-        player.draw(screen)
-        player.draw_bullets(screen)
-        
-        # Интерфейс
-        # Здоровье игрока
-        health_text = font.render(f"Здоровье: {player.health}/{player.max_health}", True, WHITE)
-        screen.blit(health_text, (20, 20))
-        
-        # Счётчик убийств
-        kills_text = font.render(f"Убийств: {kills}", True, WHITE)
-        screen.blit(kills_text, (20, 60))
-        
-        # Количество ботов
-        bots_text = font.render(f"Ботов осталось: {len(bots)}", True, WHITE)
-        screen.blit(bots_text, (20, 100))
-        
-        # Перезарядка
-        if player.cooldown > 0:
-            cooldown_text = font.render(f"Перезарядка: {player.cooldown}", True, YELLOW)
-            screen.blit(cooldown_text, (20, 140))
-        else:
-            cooldown_text = font.render("Оружие готово!", True, GREEN)
-            screen.blit(cooldown_text, (20, 140))
-        
-        # Спец-атака
-        if player.special_cooldown > 0:
-            special_text = font.render(f"Спец-атака: {player.special_cooldown}", True, PURPLE)
-            screen.blit(special_text, (20, 180))
-        else:
-            special_text = font.render("Спец-атака готова! (ПКМ)", True, GREEN)
-            screen.blit(special_text, (20, 180))
-        
-        # Информация о персонаже (в правом верхнем углу)
-        player_info = font.render(f"Персонаж: {player.name}", True, WHITE)
-        screen.blit(player_info, (WIDTH - player_info.get_width() - 20, 20))
-        
-        # Дополнительная информация для Гения
-        if player.player_type == 4:
-            mines_text = font.render(f"Мины: {len(player.mines)}/{player.max_mines}", True, CYAN)
-            screen.blit(mines_text, (20, 220))
-            
-            turrets_text = font.render(f"Турели: {len(player.turrets)}/{player.max_turrets}", True, CYAN)
-            screen.blit(turrets_text, (20, 260))
+        # Тики симуляции, накопившиеся за кадр
+        while accumulator >= TICK_SECONDS and not world.over:
+            # Направление игрока на курсор
+            mouse_x, mouse_y = camera.to_world(pygame.mouse.get_pos())
+            aim = math.atan2(mouse_y - player.y, mouse_x - player.x)
             
-            gen_hint = font.render("Q - поставить мину", True, CYAN)
-            screen.blit(gen_hint, (WIDTH - gen_hint.get_width() - 20, 60))
-        
-        # Управление (внизу по центру) - разделяем на две строки
-        if player.player_type == 4:
-            controls_line1 = font.render("WASD - движение, ЛКМ - выстрел, Q - мина", True, WHITE)
-        else:
-            controls_line1 = font.render("WASD - движение, ЛКМ - выстрел", True, WHITE)
-        controls_line2 = font.render("ПКМ - спец-атака", True, WHITE)
-        screen.blit(controls_line1, (WIDTH // 2 - controls_line1.get_width() // 2, HEIGHT - 60))
-        screen.blit(controls_line2, (WIDTH // 2 - controls_line2.get_width() // 2, HEIGHT - 30))
+            world.step(PlayerInput(dx, dy, aim, shoot, special, mine))
+            if killcam is not None:
+                killcam.capture(world)
+            shoot = special = mine = False
+            accumulator -= TICK_SECONDS
+        if world.over:
+            break
+        profiler.mark("simulation")
+        
+        # Отрисовка между предыдущим и текущим тиком; камера следует за игроком
+        alpha = accumulator / TICK_SECONDS
+        camera.follow(player.prev_x + (player.x - player.prev_x) * alpha,
+                      player.prev_y + (player.y - player.prev_y) * alpha,
+                      world.width, world.height)
+        draw_world(screen, world, alpha, camera)
+        profiler.mark("draw")
+        draw_hud(screen, world, font)
+        profiler.mark("hud")
+        profiler.draw(screen, world)
+        profiler.mark("overlay")
         
         pygame.display.flip()
-        clock.tick(60)
+        profiler.mark("flip")
+        profiler.end_frame()
     
-    return kills
+    return world
 
 # Экран окончания игры
-def game_over_screen(kills):
-    font_large = pygame.font.SysFont(None, 70)
-    font_medium = pygame.font.SysFont(None, 40)
-    font_small = pygame.font.SysFont(None, 30)
+# За надписями идёт повтор последних секунд матча из killcam (по кругу)
+def game_over_screen(kills, killcam=None):
+    font_large = get_font(70)
+    font_medium = get_font(40)
+    font_small = get_font(30)
+    font_tiny = get_font(20)
+    
+    clock = pygame.time.Clock()
+    replay = killcam is not None and len(killcam) > 1
+    camera = Camera(WIDTH, HEIGHT)
+    speed = KILLCAM_SPEEDS.index(0.5)
+    position = 0.0  # тик повтора
+    # Затемнение под надписями, чтобы их было видно поверх повтора
+    shade = pygame.Surface((WIDTH, 340))
+    shade.set_alpha(170)
+    shade.fill(BLACK)
     
     while True:
+        elapsed = clock.tick(RENDER_FPS) / 1000
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
@@ -1275,52 +3408,117 @@ def game_over_screen(kills):
                     return True  # Начать заново
                 elif event.key == pygame.K_ESCAPE:
                     return False  # Выйти
-        
-        screen.fill(BACKGROUND)
+                elif event.key == pygame.K_LEFT:  # Медленнее
+                    speed = max(speed - 1, 0)
+                elif event.key == pygame.K_RIGHT:  # Быстрее
+                    speed = min(speed + 1, len(KILLCAM_SPEEDS) - 1)
+        
+        if replay:
+            # На тике гибели повтор ненадолго замирает и начинается сначала
+            last = len(killcam) - 1
+            position += elapsed * TICK_RATE * KILLCAM_SPEEDS[speed]
+            if position > last + KILLCAM_HOLD * TICK_RATE:
+                position = 0.0
+            killcam.draw(screen, min(position, last), camera)
+            screen.blit(shade, (0, 130))
+            
+            # Скорость, запись повтора и полоска времени
+            label = render_text(font_small, f"Повтор x{KILLCAM_SPEEDS[speed]:g} (стрелки - скорость)", WHITE)
+            screen.blit(label, (20, HEIGHT - 80))
+            info = render_text(font_tiny, killcam.report(), GRAY)
+            screen.blit(info, (WIDTH - info.get_width() - 20, HEIGHT - 75))
+            pygame.draw.rect(screen, BLACK, (20, HEIGHT - 35, WIDTH - 40, 10))
+            pygame.draw.rect(screen, RED, (20, HEIGHT - 35, (WIDTH - 40) * min(position / last, 1.0), 10))
+        else:
+            screen.fill(BACKGROUND)
         
         # Заголовок
-        title = font_large.render("ИГРА ОКОНЧЕНА", True, RED)
+        title = render_text(font_large, "ИГРА ОКОНЧЕНА", RED)
         screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 150))
         
         # Счёт
-        score_text = font_medium.render(f"Ваш счёт: {kills} убийств", True, WHITE)
+        score_text = render_text(font_medium, f"Ваш счёт: {kills} убийств", WHITE)
         screen.blit(score_text, (WIDTH // 2 - score_text.get_width() // 2, 250))
         
         # Общий счет
-        total_text = font_medium.render(f"Всего убийств: {stats.stats['total_kills']}", True, YELLOW)
+        total_text = render_text(font_medium, f"Всего убийств: {get_stats().stats['total_kills']}", YELLOW)
         screen.blit(total_text, (WIDTH // 2 - total_text.get_width() // 2, 300))
         
         # Инструкция
-        restart_text = font_small.render("Нажмите ENTER для повторной игры", True, YELLOW)
+        restart_text = render_text(font_small, "Нажмите ENTER для повторной игры", YELLOW)
         screen.blit(restart_text, (WIDTH // 2 - restart_text.get_width() // 2, 380))
         
-        exit_text = font_small.render("Нажмите ESC для выхода", True, YELLOW)
+        exit_text = render_text(font_small, "Нажмите ESC для выхода", YELLOW)
         screen.blit(exit_text, (WIDTH // 2 - exit_text.get_width() // 2, 420))
         
         pygame.display.flip()
 
 # Главная функция
-def main():
+def main(on_first_frame=None, arena_scale=1, resume=None):
+    init_display()
     while True:
-        # Стартовый экран
-        if not start_screen():
-            break
-        
-        # Выбор персонажа
-        player_type, player_color = character_selection()
+        # Последние секунды матча для экрана окончания игры
+        killcam = KillCam()
+        if resume is not None:
+            # Продолжение сохранённого матча сразу, без меню
+            player_type, player_color = resume.player_type, resume.player_color
+            world = main_game(player_type, player_color, world=resume, killcam=killcam)
+            resume = None
+        else:
+            # Стартовый экран
+            if not start_screen(on_first_frame):
+                break
+            on_first_frame = None
+            
+            # Выбор персонажа
+            player_type, player_color = character_selection()
+            
+            # Основная игра
+            world = main_game(player_type, player_color, arena_scale=arena_scale, killcam=killcam)
+        kills = world.kills
         
-        # Основная игра
-        kills = main_game(player_type, player_color)
+        # Сохраняем повтор матча
+        try:
+            Replay.from_world(world).save(REPLAY_FILE)
+        except OSError:
+            print("Ошибка сохранения повтора")
         
         # Сохраняем статистику
-        stats.add_kills(kills, player_type)
+        get_stats().add_kills(kills, player_type)
         
         # Экран окончания игры
-        if not game_over_screen(kills):
+        if not game_over_screen(kills, killcam):
             break
     
     pygame.quit()
     sys.exit()
 
+# Проигрывание повтора без окна с замером скорости
+def run_replay(path):
+    replay = Replay.load(path)
+    start = time.perf_counter()
+    world = replay.play()
+    elapsed = time.perf_counter() - start
+    print(f"Тиков: {world.tick}, убийств: {world.kills}, игрок погиб: {'да' if world.over else 'нет'}")
+    print(f"Время: {elapsed:.3f} с, {world.tick / max(elapsed, 1e-9):.0f} тиков/с "
+          f"({world.tick / TICK_RATE / max(elapsed, 1e-9):.0f}x быстрее реального времени)")
+
+# Сообщение для замера запуска: процесс дошёл до первого кадра меню
+STARTUP_MARKER = "first-frame"
+
+def report_first_frame():
+    print(STARTUP_MARKER, flush=True)
+    pygame.quit()
+    sys.exit()
+
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) == 3 and sys.argv[1] == "--replay":
+        run_replay(sys.argv[2])
+    elif len(sys.argv) == 2 and sys.argv[1] == "--startup-probe":
+        main(report_first_frame)
+    elif len(sys.argv) == 3 and sys.argv[1] == "--arena":
+        main(arena_scale=max(1, int(sys.argv[2])))
+    elif len(sys.argv) == 3 and sys.argv[1] == "--resume":
+        main(resume=WorldState.load(sys.argv[2]))
+    else:
+        main()
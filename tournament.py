@@ -0,0 +1,152 @@
+import os
+import csv
+import json
+import math
+import time
+import argparse
+import itertools
+import multiprocessing
+
+# Запуск без окна (переменные наследуют и процессы-исполнители)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import super_fighters as sf
+
+# Классы игрока: Стрелок, Танк, Маг, Гений
+PLAYER_CLASSES = (1, 2, 3, 4)
+CLASS_NAMES = {1: "Стрелок", 2: "Танк", 3: "Маг", 4: "Гений"}
+# Все составы из трёх ботов (Стрелок, Танк, Маг) без учёта порядка
+BOT_MIXES = tuple(itertools.combinations_with_replacement((1, 2, 3), 3))
+# Ограничение длины матча в тиках (3 минуты игрового времени)
+MAX_TICKS = 3 * 60 * sf.TICK_RATE
+
+
+def run_match(task):
+    """Играет один матч автопилотом без окна и возвращает его итоги"""
+    player_type, bot_types, seed, max_ticks = task
+    world = sf.World(player_type, sf.BLUE, seed, bot_types)
+    pilot = sf.AutoPilot(seed)
+    while not world.over and world.tick < max_ticks:
+        world.step(pilot.next_input(world))
+    return {
+        "player_type": player_type,
+        "bot_mix": "".join(map(str, bot_types)),
+        "seed": seed,
+        "kills": world.kills,
+        "ticks": world.tick,
+        "died": world.over,
+        "damage_dealt": world.damage_dealt,
+        "damage_taken": world.damage_taken,
+    }
+
+
+def mean_ci(values):
+    """Среднее и полуширина 95% доверительного интервала"""
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return mean, 0.0
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1)
+    return mean, 1.96 * math.sqrt(variance / n)
+
+
+def summarize(group, results):
+    """Сводка по группе матчей"""
+    row = dict(group)
+    row["matches"] = len(results)
+    row["death_rate"] = sum(r["died"] for r in results) / len(results)
+    for field in ("kills", "ticks", "damage_dealt", "damage_taken"):
+        mean, ci = mean_ci([r[field] for r in results])
+        row[f"{field}_mean"] = round(mean, 3)
+        row[f"{field}_ci95"] = round(ci, 3)
+    # Время до гибели в секундах - только по матчам, где игрок погиб;
+    # дожившие до лимита тиков считаются отдельно
+    deaths = [r["ticks"] for r in results if r["died"]]
+    row["survivors"] = len(results) - len(deaths)
+    row["seconds_alive_mean"] = round(sum(deaths) / len(deaths) / sf.TICK_RATE, 3) if deaths else None
+    return row
+
+
+def aggregate(results):
+    """Сводки по каждой паре (класс, состав ботов) и по каждому классу"""
+    by_pairing = {}
+    by_class = {}
+    for r in results:
+        by_pairing.setdefault((r["player_type"], r["bot_mix"]), []).append(r)
+        by_class.setdefault(r["player_type"], []).append(r)
+    pairings = [
+        summarize({"class": CLASS_NAMES[pt], "player_type": pt, "bot_mix": mix}, group)
+        for (pt, mix), group in sorted(by_pairing.items())
+    ]
+    classes = [
+        summarize({"class": CLASS_NAMES[pt], "player_type": pt, "bot_mix": "all"}, group)
+        for pt, group in sorted(by_class.items())
+    ]
+    return pairings, classes
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Турнир классов: матчи без окна на всех ядрах")
+    parser.add_argument("--matches", type=int, default=20,
+                        help="матчей на каждую пару (класс, состав ботов)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="число процессов (по умолчанию все ядра)")
+    parser.add_argument("--seed", type=int, default=0, help="начальное зерно")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS, help="максимальная длина матча")
+    parser.add_argument("--classes", default="1234", help="классы игрока, например 13")
+    parser.add_argument("--csv", default="tournament.csv", help="сводка в CSV")
+    parser.add_argument("--json", default="tournament.json", help="сводка и все матчи в JSON")
+    args = parser.parse_args()
+
+    classes = [int(c) for c in args.classes if int(c) in PLAYER_CLASSES]
+    tasks = []
+    for player_type in classes:
+        for mix in BOT_MIXES:
+            for i in range(args.matches):
+                seed = args.seed + len(tasks)
+                tasks.append((player_type, mix, seed, args.max_ticks))
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        results = []
+        for result in pool.imap_unordered(run_match, tasks, chunksize=4):
+            results.append(result)
+            if len(results) % 100 == 0:
+                print(f"Сыграно {len(results)}/{len(tasks)}")
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda r: r["seed"])
+    total_ticks = sum(r["ticks"] for r in results)
+
+    pairings, class_rows = aggregate(results)
+    write_csv(args.csv, class_rows + pairings)
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump({
+            "workers": args.workers,
+            "seconds": round(elapsed, 3),
+            "matches": len(results),
+            "ticks_per_second": round(total_ticks / elapsed),
+            "classes": class_rows,
+            "pairings": pairings,
+            "results": results,
+        }, f, ensure_ascii=False, indent=2)
+
+    print(f"{len(results)} матчей за {elapsed:.1f} с на {args.workers} процессах "
+          f"({len(results) / elapsed:.1f} матчей/с, {total_ticks / elapsed:.0f} тиков/с)")
+    for row in class_rows:
+        alive = row["seconds_alive_mean"]
+        alive = f"{alive:6.1f} с" if alive is not None else "     -  "
+        print(f"{row['class']:8} убийств {row['kills_mean']:6.2f} ± {row['kills_ci95']:.2f}, "
+              f"жизнь до гибели {alive} (выжили {row['survivors']} из {row['matches']}), "
+              f"урон {row['damage_dealt_mean']:7.1f} ± {row['damage_dealt_ci95']:.1f}")
+
+
+if __name__ == "__main__":
+    main()